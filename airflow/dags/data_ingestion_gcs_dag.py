@@ -1,75 +1,1015 @@
 import os
+import io
+import re
+import csv
 import datetime, json
 import logging
+import zipfile
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import contextmanager
 
 from airflow import DAG
+from airflow.exceptions import AirflowSkipException
 from airflow.utils.dates import days_ago
 from airflow.operators.bash import BashOperator
-from airflow.operators.python import PythonOperator
+from airflow.operators.python import PythonOperator, ShortCircuitOperator
 
-from google.cloud import storage
 from airflow.providers.google.cloud.operators.bigquery import BigQueryCreateExternalTableOperator
 from airflow.providers.google.cloud.operators.bigquery import BigQueryExecuteQueryOperator
-from airflow.providers.http.operators.http import SimpleHttpOperator
-import pandas as pd
-import pyarrow.csv as pv
-import pyarrow.parquet as pq
+from airflow.models.baseoperator import chain
+from airflow.utils.task_group import TaskGroup
+
+from f1_tables import CHECKS, TABLES
+from dbt_job import DbtJobRunOperator
+from staging import STAGING_BACKEND, get_staging
+from scheduling import UPLOAD_POOL, get_chain_weights, read_cached_history, read_history
+from release_diff import release_diff
 
 PROJECT_ID = os.environ.get("GCP_PROJECT_ID")
 BUCKET = os.environ.get("GCP_GCS_BUCKET")
 
 zip_file = "f1db_csv.zip"
-dataset_url = f"http://ergast.com/downloads/f1db_csv.zip"
+dataset_url = os.environ.get("F1DB_URL", "http://ergast.com/downloads/f1db_csv.zip")
 path_to_local_home = os.environ.get("AIRFLOW_HOME", "/opt/airflow/")
 csv_folder_name = "csv_data"
 parquet_file = zip_file.replace('.csv', '.parquet')
+manifest_object = "raw/manifest.json"
+# CSVs are streamed straight out of the archive unless it is asked to be extracted to csv_folder_name first.
+# Extracted CSVs are not staged, so the archive is only extracted when all tasks run on one host
+unzip_archive = os.environ.get("UNZIP_ARCHIVE", "false").lower() == "true" and STAGING_BACKEND == "local"
+# Fact tables with partitioning in f1_tables are written as year=YYYY/ Hive partitions instead of one object
+hive_partitioning = os.environ.get("HIVE_PARTITIONING", "false").lower() == "true"
+# "external" creates external tables over the GCS objects, "native" loads them into partitioned, clustered tables
+bigquery_load_mode = os.environ.get("BIGQUERY_LOAD_MODE", "external")
+# Convert and upload each table in one task, streaming the Parquet straight to GCS with no local copy
+fused_convert_upload = os.environ.get("FUSED_CONVERT_UPLOAD", "false").lower() == "true"
+# Convert all tables in one task from a process pool instead of one format_to_parquet task per table
+batch_convert = os.environ.get("BATCH_CONVERT", "false").lower() == "true"
+BATCH_CONVERT_WORKERS = int(os.environ.get("BATCH_CONVERT_WORKERS", os.cpu_count() or 1))
+skip_unchanged_tables = os.environ.get("SKIP_UNCHANGED_TABLES", "true").lower() == "true"
 BIGQUERY_DATASET = os.environ.get("BIGQUERY_DATASET", 'f1_data_all')
+# f1_backfill_dag loads archived f1db snapshots, one per run with {"snapshot_url": ..., "version": ...} as conf,
+# into gs://<bucket>/<prefix>/<version>/raw/ and the external tables of dataset <BIGQUERY_DATASET>_<version>.
+# Its runs take a slot of BACKFILL_POOL, which bounds the snapshots processed at once on all workers
+BACKFILL_POOL = os.environ.get("BACKFILL_POOL", "default_pool")
+BACKFILL_MAX_RUNS = int(os.environ.get("BACKFILL_MAX_RUNS", 4))
+BACKFILL_PREFIX = os.environ.get("BACKFILL_PREFIX", "backfill")
+BACKFILL_CONVERT_WORKERS = int(os.environ.get("BACKFILL_CONVERT_WORKERS", 2))
+BACKFILL_UPLOAD_THREADS = int(os.environ.get("BACKFILL_UPLOAD_THREADS", 8))
+# version and prefix of a backfill run conf name a local folder and a GCS prefix, one path segment each
+BACKFILL_NAME_PATTERN = re.compile(r"^[A-Za-z0-9._-]+$")
 
+# The dbt Cloud API token is the password of the dbt_api connection
 dbt_header = {
     'Content-Type': 'application/json',
-    'Authorization': 'Token *****'
 }
 dbt_account_id = 55357
 dbt_job_id = 74147
+# "cloud" triggers the dbt Cloud job, "core" runs dbt Core on the worker
+dbt_runner = os.environ.get("DBT_RUNNER", "cloud")
+dbt_project_dir = os.environ.get("DBT_PROJECT_DIR", "/opt/airflow/dbt")
+dbt_profiles_dir = os.environ.get("DBT_PROFILES_DIR")
+# Base URL of serving/f1_mart_api.py, reloaded after dbt has rebuilt f1_mart. Not set: no refresh
+MART_SERVICE_URL = os.environ.get("MART_SERVICE_URL")
+# Bearer token of its POST /refresh, set to the MART_REFRESH_TOKEN of the service
+MART_REFRESH_TOKEN = os.environ.get("MART_REFRESH_TOKEN")
+
+
+# Upper bound for the CSV bytes held in memory at once while converting to Parquet
+CSV_BLOCK_SIZE = int(os.environ.get("CSV_BLOCK_SIZE", 64 * 1024 * 1024))  # 64 MB
+# Parquet output settings, zstd gives the smallest objects to upload and scan
+PARQUET_COMPRESSION = os.environ.get("PARQUET_COMPRESSION", "zstd")
+PARQUET_ROW_GROUP_SIZE = int(os.environ.get("PARQUET_ROW_GROUP_SIZE", 1024 * 1024))  # rows
+PARQUET_WRITE_STATISTICS = os.environ.get("PARQUET_WRITE_STATISTICS", "true").lower() == "true"
+# Fused conversion of a partitioned table (format_to_gcs): bytes buffered by the upload streams of all years
+# together, and rows of all years held back to be written as full row groups
+PARTITION_UPLOAD_BUFFER = int(os.environ.get("PARTITION_UPLOAD_BUFFER", 32 * 1024 * 1024))  # 32 MB
+PARTITION_BUFFER_ROWS = int(os.environ.get("PARTITION_BUFFER_ROWS", 1024 * 1024))
+# Ergast marks missing values with \N, an empty field is missing in the other columns but kept as "" in the
+# string columns, as the pandas converter did
+CSV_NULL_MARKER = "\\N"
+CSV_NULL_VALUES = [CSV_NULL_MARKER, ""]
+
+
+def open_csv_source(src_file, member=None):
+    """
+    :param src_file: source CSV path & file-name, or the archive path & file-name if member is set
+    :param member: CSV name in the src_file archive
+    :return: binary stream of the CSV file
+    """
+    if member is None:
+        return open(src_file, 'rb')
+    with zipfile.ZipFile(src_file) as archive:
+        return archive.open(member)
+
+
+def get_arrow_types(schema):
+    """
+    :param schema: column name -> type name, as in f1_tables
+    :return: column name -> Arrow type
+    """
+    import pyarrow as pa
+
+    arrow_types = {
+        "int8": pa.int8(),
+        "int16": pa.int16(),
+        "int32": pa.int32(),
+        "float32": pa.float32(),
+        "float64": pa.float64(),
+        "string": pa.string(),
+        "dictionary": pa.dictionary(pa.int32(), pa.string()),
+        "date32": pa.date32(),
+        "time32": pa.time32('s'),
+    }
+    return {column: arrow_types[type_name] for column, type_name in (schema or {}).items()}
+
+
+def read_csv_header(src_file, member=None):
+    """
+    Reads the header and the number of fields in the first data row of a CSV file
+    :param src_file: source path & file-name
+    :param member: CSV name in the src_file archive
+    :return: header column names, number of fields in the first data row
+    """
+    with io.TextIOWrapper(open_csv_source(src_file, member), newline='') as f:
+        reader = csv.reader(f)
+        header = next(reader, [])
+        first_row = next(reader, header)
+    return header, len(first_row)
+
+
+@contextmanager
+def open_csv_batches(src_file, block_size=CSV_BLOCK_SIZE, member=None, schema=None, race_years=None,
+                     use_threads=True):
+    """
+    Streams a CSV file as Arrow record batches, one block at a time.
+    A header with fewer names than data fields is padded with positional names,
+    a header with extra names gets those columns filled with nulls.
+    The source file is never rewritten.
+    :param src_file: source path & file-name, or the archive path & file-name if member is set
+    :param block_size: CSV bytes parsed per block, bounds the memory used by the conversion
+    :param member: CSV name in the src_file archive, read without extracting it
+    :param schema: column name -> type name, columns that are not listed are inferred
+    :param race_years: raceId -> year table, see read_race_years. If set, a year column is added
+    :param use_threads: parse the CSV blocks on the Arrow thread pool
+    :return: schema of the batches, iterator of the batches
+    """
+    import pyarrow as pa
+    import pyarrow.csv as pv
+    import pyarrow.compute as pc
+
+    header, fields_number = read_csv_header(src_file, member)
+    column_names = header[:fields_number] + [str(i) for i in range(len(header), fields_number)]
+    missing_columns = header[fields_number:]
+    if len(header) != fields_number:
+        logging.warning("Header columns number doesn`t equal table column number!")
+
+    column_types = get_arrow_types(schema)
 
+    with open_csv_source(src_file, member) as source:
+        reader = pv.open_csv(
+            source,
+            read_options=pv.ReadOptions(skip_rows=1, column_names=column_names, block_size=block_size,
+                                        use_threads=use_threads),
+            convert_options=pv.ConvertOptions(
+                column_types={name: column_types[name] for name in column_names if name in column_types},
+                null_values=CSV_NULL_VALUES,
+                strings_can_be_null=False,
+            ),
+        )
+        batch_schema = reader.schema
+        string_columns = [index for index, field in enumerate(batch_schema)
+                          if pa.types.is_string(field.type) or pa.types.is_dictionary(field.type)]
+        for name in missing_columns:
+            batch_schema = batch_schema.append(pa.field(name, column_types.get(name, pa.null())))
+        if race_years is not None:
+            race_ids = race_years.column('raceId').combine_chunks()
+            years = race_years.column('year').combine_chunks()
+            batch_schema = batch_schema.append(race_years.schema.field('year'))
 
-def format_to_parquet(src_file, dest_file):
-    if not src_file.endswith('.csv'):
+        def read_batches():
+            for batch in reader:
+                columns = batch.columns
+                for index in string_columns:
+                    column = columns[index]
+                    columns[index] = pc.if_else(pc.equal(column, CSV_NULL_MARKER), None, column)
+                for name in missing_columns:
+                    columns.append(pa.nulls(batch.num_rows, column_types.get(name, pa.null())))
+                if race_years is not None:
+                    columns.append(pc.take(years, pc.index_in(batch.column('raceId'), value_set=race_ids)))
+                yield pa.RecordBatch.from_arrays(columns, schema=batch_schema)
+
+        yield batch_schema, read_batches()
+
+
+def format_to_parquet(src_file, dest_file, block_size=CSV_BLOCK_SIZE, member=None, schema=None,
+                      compression=PARQUET_COMPRESSION, row_group_size=PARQUET_ROW_GROUP_SIZE,
+                      write_statistics=PARQUET_WRITE_STATISTICS, race_years=None, use_threads=True, checker=None):
+    """
+    Streams a CSV file into a Parquet file one block at a time, see open_csv_batches
+    :param src_file: source path & file-name, or the archive path & file-name if member is set
+    :param dest_file: target path & file-name, the target folder if race_years is set
+    :param block_size: CSV bytes parsed per block, bounds the memory used by the conversion
+    :param member: CSV name in the src_file archive, read without extracting it
+    :param schema: column name -> type name, columns that are not listed are inferred
+    :param compression: Parquet compression codec, e.g. zstd or snappy
+    :param row_group_size: maximum rows in a Parquet row group
+    :param write_statistics: write min/max statistics of the columns for scan pruning
+    :param race_years: raceId -> year table, see read_race_years. If set, the table is written
+                       to dest_file as year=YYYY/part-0.parquet Hive partitions
+    :param use_threads: parse the CSV blocks on the Arrow thread pool
+    :param checker: data_quality.TableChecker run on every batch
+    :return: number of rows written
+    """
+    import pyarrow as pa
+    import pyarrow.dataset as ds
+    import pyarrow.parquet as pq
+
+    if not (member or src_file).endswith('.csv'):
         logging.error("Can only accept source files in CSV format, for the moment")
         return
-    head_table = pd.read_csv(src_file, header=None, nrows=1)
-    table = pd.read_csv(src_file, header=None, skiprows=1)
-    if len(head_table.columns) != len(table.columns):
-        logging.warning("Header columns number doesn`t equal table column number!")
-        table = pd.read_csv(src_file, names=head_table.columns)
-        table.columns = table.columns.astype(str)
-        table.to_csv(src_file, header=None, index=None)
-        # table.to_parquet(dest_file)
-    
-    table = pv.read_csv(src_file)
-    pq.write_table(table, dest_file)
+
+    os.makedirs(os.path.dirname(dest_file), exist_ok=True)
+    rows = 0
+    with open_csv_batches(src_file, block_size, member, schema, race_years, use_threads) as (batch_schema, batches):
+
+        def count_rows():
+            nonlocal rows
+            for batch in batches:
+                rows += batch.num_rows
+                if checker is not None:
+                    checker.check_batch(batch)
+                yield batch
+
+        if race_years is not None:
+            ds.write_dataset(
+                count_rows(),
+                dest_file,
+                schema=batch_schema,
+                format='parquet',
+                partitioning=ds.partitioning(pa.schema([batch_schema.field('year')]), flavor='hive'),
+                basename_template='part-{i}.parquet',
+                existing_data_behavior='delete_matching',
+                max_rows_per_group=row_group_size,
+                file_options=ds.ParquetFileFormat().make_write_options(
+                    compression=compression, write_statistics=write_statistics),
+            )
+            return rows
+
+        with pq.ParquetWriter(dest_file, batch_schema, compression=compression,
+                              write_statistics=write_statistics) as writer:
+            for batch in count_rows():
+                writer.write_table(pa.Table.from_batches([batch]), row_group_size=row_group_size)
+    return rows
+
+
+def format_to_gcs(src_file, bucket, object_name, block_size=CSV_BLOCK_SIZE, member=None, schema=None,
+                  compression=PARQUET_COMPRESSION, row_group_size=PARQUET_ROW_GROUP_SIZE,
+                  write_statistics=PARQUET_WRITE_STATISTICS, race_years=None, checker=None,
+                  upload_buffer=PARTITION_UPLOAD_BUFFER, buffer_rows=PARTITION_BUFFER_ROWS):
+    """
+    Streams a CSV file into Parquet objects in GCS with no local Parquet copy.
+    Row groups are written into resumable upload streams, so encoding overlaps the network transfer.
+    With race_years every year=YYYY/part-0.parquet partition has its own stream,
+    objects left under the prefix from an earlier run are deleted.
+    The rows of every year are buffered and written as full row groups of row_group_size rows;
+    when more than buffer_rows rows are buffered, the year with the most rows is written early.
+    The streams of all years share upload_buffer bytes, at least 256 KB each, so a partitioned
+    conversion holds at most max(upload_buffer, years * 256 KB) + buffer_rows rows + one CSV block in memory.
+    :param src_file: source path & file-name, or the archive path & file-name if member is set
+    :param bucket: GCS bucket name
+    :param object_name: target path & file-name, the target prefix if race_years is set
+    :param block_size: CSV bytes parsed per block, bounds the memory used by the conversion
+    :param member: CSV name in the src_file archive, read without extracting it
+    :param schema: column name -> type name, columns that are not listed are inferred
+    :param compression: Parquet compression codec, e.g. zstd or snappy
+    :param row_group_size: maximum rows in a Parquet row group
+    :param write_statistics: write min/max statistics of the columns for scan pruning
+    :param race_years: raceId -> year table, see read_race_years
+    :param checker: data_quality.TableChecker run on every batch, failed checks abort the uploads
+                    before any object is replaced
+    :param upload_buffer: bytes buffered by the upload streams of all partitions together
+    :param buffer_rows: rows of all partitions buffered before the largest buffer is written
+    :return: number of rows written, uploaded object name -> size
+    """
+    import pyarrow as pa
+    import pyarrow.compute as pc
+    import pyarrow.parquet as pq
+    from data_quality import enforce
+    from gcs_uploader import UPLOAD_CHUNK_SIZE, get_shared_chunk_size, get_storage_client, open_upload_stream
+
+    rows = 0
+    writers = {}
+    chunk_size = UPLOAD_CHUNK_SIZE
+    if race_years is not None:
+        # A stream per year of the races and one for the rows of unknown races
+        chunk_size = get_shared_chunk_size(len(pc.unique(race_years.column('year'))) + 1, upload_buffer)
+    # partition -> buffered tables of its rows, partition -> number of buffered rows
+    buffers, buffered = {}, {}
+
+    def get_writer(name, writer_schema):
+        if name not in writers:
+            stream = open_upload_stream(bucket, name, chunk_size)
+            writers[name] = (stream, pq.ParquetWriter(stream, writer_schema, compression=compression,
+                                                      write_statistics=write_statistics))
+        return writers[name][1]
+
+    def flush(partition, full_row_groups=False):
+        table = pa.concat_tables(buffers.pop(partition))
+        del buffered[partition]
+        written = table.num_rows // row_group_size * row_group_size if full_row_groups else table.num_rows
+        if written:
+            get_writer(partition, table.schema).write_table(table.slice(0, written), row_group_size=row_group_size)
+        if written < table.num_rows:
+            buffers[partition], buffered[partition] = [table.slice(written)], table.num_rows - written
+
+    try:
+        with open_csv_batches(src_file, block_size, member, schema, race_years) as (batch_schema, batches):
+            if race_years is None:
+                get_writer(object_name, batch_schema)
+            for batch in batches:
+                rows += batch.num_rows
+                if checker is not None:
+                    checker.check_batch(batch)
+                if race_years is None:
+                    get_writer(object_name, batch_schema).write_table(pa.Table.from_batches([batch]),
+                                                                      row_group_size=row_group_size)
+                    continue
+                # The partition column is kept in the object path only, as in the Hive partitions of write_dataset
+                table = pa.Table.from_batches([batch]).select(batch_schema.names[:-1])
+                year_column = batch.column('year')
+                for year in pc.unique(year_column).to_pylist():
+                    if year is None:
+                        year_rows, year = table.filter(pc.is_null(year_column)), "__HIVE_DEFAULT_PARTITION__"
+                    else:
+                        year_rows = table.filter(pc.equal(year_column, year))
+                    partition = f"{object_name.rstrip('/')}/year={year}/part-0.parquet"
+                    buffers.setdefault(partition, []).append(year_rows)
+                    buffered[partition] = buffered.get(partition, 0) + year_rows.num_rows
+                    if buffered[partition] >= row_group_size:
+                        flush(partition, full_row_groups=True)
+                while buffered and sum(buffered.values()) > buffer_rows:
+                    flush(max(buffered, key=buffered.get))
+            for partition in sorted(buffers):
+                flush(partition)
+        if checker is not None:
+            enforce(checker.report())
+        for stream, writer in writers.values():
+            writer.close()
+            stream.close()
+    except Exception:
+        for stream, _ in writers.values():
+            stream.abort()
+        raise
+
+    uploaded = {name: stream.size for name, (stream, _) in writers.items()}
+    if race_years is not None:
+        for blob in get_storage_client().bucket(bucket).list_blobs(prefix=f"{object_name.rstrip('/')}/"):
+            if blob.name not in uploaded:
+                logging.info(f"Deleting {blob.name}, it was not written by this run")
+                blob.delete()
+    return rows, uploaded
+
+
+def read_race_years(src_file, member=None):
+    """
+    :param src_file: races CSV path & file-name, or the archive path & file-name if member is set
+    :param member: races CSV name in the src_file archive
+    :return: raceId -> year table used to partition the fact tables by season
+    """
+    import pyarrow.csv as pv
+
+    with open_csv_source(src_file, member) as source:
+        return pv.read_csv(source, convert_options=pv.ConvertOptions(
+            include_columns=['raceId', 'year'],
+            column_types=get_arrow_types({'raceId': 'int32', 'year': 'int16'}),
+        ))
+
+
+def read_table_keys(src_file, member=None, table=None):
+    """
+    :param src_file: dimension CSV path & file-name, or the archive path & file-name if member is set
+    :param member: dimension CSV name in the src_file archive
+    :param table: dimension table name, its first CHECKS key column is read
+    :return: Arrow array of the dimension keys, for the foreign key checks
+    """
+    import pyarrow.csv as pv
+
+    column, column_type = get_table_key(table)
+    with open_csv_source(src_file, member) as source:
+        keys = pv.read_csv(source, convert_options=pv.ConvertOptions(
+            include_columns=[column],
+            column_types={column: column_type},
+        ))
+    return keys.column(column).combine_chunks()
+
+
+def get_table_key(table):
+    """
+    :param table: dimension table name
+    :return: name and Arrow type of its first CHECKS key column
+    """
+    column = CHECKS[table]["key"][0]
+    schema = next(entry["schema"] for entry in TABLES if entry["name"] == table)
+    return column, get_arrow_types({column: schema[column]})[column]
+
+
+def download_dataset_if_modified(url, dest_file, dag_run=None, ti=None):
+    """
+    Short-circuits the run when the dataset is not modified since the last successful run
+    :param url: dataset url
+    :param dest_file: target path & file-name, kept as the download cache
+    :param dag_run: current DAG run
+    :param ti: current task instance
+    :return: True if the tables have to be loaded
+    """
+    from dataset_download import download_dataset
+    from pipeline_metrics import measure_stage
+
+    # The archive and its validators are the download cache of every worker
+    staging = get_staging(dag_run)
+    staging.pull(dest_file, shared=True)
+    staging.pull(f"{dest_file}.meta.json", shared=True)
+    with measure_stage("download", "dataset", ti) as metrics:
+        modified = download_dataset(url, dest_file)
+        metrics["output_bytes"] = os.path.getsize(dest_file) if modified else 0
+    if modified:
+        staging.push(dest_file, shared=True)
+        staging.push(f"{dest_file}.meta.json", shared=True)
+    previous_run = dag_run.get_previous_dagrun() if dag_run else None
+    if not modified and previous_run is not None and previous_run.state != "success":
+        logging.info("Dataset is not modified, but the previous run didn`t succeed")
+        return True
+    return modified
 
 
 # NOTE: takes 20 mins, at an upload speed of 800kbps. Faster if your internet has a better upload speed
-def upload_to_gcs(bucket, object_name, local_file):
+def upload_to_gcs(bucket, object_name, local_file, table=None, convert_task_id=None, dag_run=None, ti=None):
     """
     Ref: https://cloud.google.com/storage/docs/uploading-objects#storage-upload-object-python
+    Large files are sent as resumable chunks or parallel slices, see gcs_uploader
+    :param bucket: GCS bucket name
+    :param object_name: target path & file-name, the target prefix for a partitioned table folder
+    :param local_file: source path & file-name, or the folder of a partitioned table
+    :param table: table name the upload metrics are reported for
+    :param convert_task_id: batch conversion task, the upload is skipped if it skipped the table
+    :param dag_run: current DAG run
+    :param ti: current task instance
+    :return: names of the uploaded objects
+    """
+    from gcs_uploader import upload_file, upload_folder
+    from pipeline_metrics import measure_stage
+
+    if convert_task_id and (ti.xcom_pull(task_ids=convert_task_id, key=table) or {}).get("skipped"):
+        raise AirflowSkipException(f"{table} is unchanged since the last run")
+    get_staging(dag_run).pull(local_file)
+    if release_diff and table in CHECKS:
+        from release_diff import diff_release
+
+        # Before the upload, while the previous release is still in GCS
+        diff = diff_release(bucket, object_name, local_file, table, CHECKS[table]["key"],
+                            release=dag_run.execution_date.strftime("%Y%m%dT%H%M%S"))
+        if diff is not None:
+            ti.xcom_push(key="diff", value=diff)
+
+    with measure_stage("upload", table or object_name, ti) as metrics:
+        if os.path.isdir(local_file):
+            uploaded = upload_folder(bucket, object_name, local_file)
+            prefix_length = len(object_name.rstrip('/')) + 1
+            metrics["output_bytes"] = sum(os.path.getsize(os.path.join(local_file, name[prefix_length:]))
+                                          for name in uploaded)
+        else:
+            upload_file(bucket, object_name, local_file)
+            uploaded = [object_name]
+            metrics["output_bytes"] = os.path.getsize(local_file)
+    return uploaded
+
+
+def load_to_bigquery(bucket, object_name, table_id, partitioning=None, clustering=None, upload_task_id=None, ti=None):
+    """
+    Loads a table object into a native BigQuery table, an alternative to the external tables.
+    A partitioned table is range partitioned by year and only the uploaded year=YYYY/ partitions
+    are reloaded, each one truncating its own partition. A table that doesn't exist yet
+    (e.g. the first run after switching from external tables) is loaded from all its partitions.
+    :param bucket: GCS bucket name
+    :param object_name: table object path & file-name, the prefix of a partitioned table
+    :param table_id: target project.dataset.table
+    :param partitioning: "year" for a table uploaded as year=YYYY/ partitions
+    :param clustering: columns to cluster the table by
+    :param upload_task_id: local_to_gcs task, its XCom lists the objects uploaded in this run
+    :param ti: current task instance
+    :return:
+    """
+    from google.api_core.exceptions import NotFound
+    from google.cloud import bigquery
+
+    client = bigquery.Client(project=PROJECT_ID)
+    job_config = bigquery.LoadJobConfig(
+        source_format=bigquery.SourceFormat.PARQUET,
+        write_disposition=bigquery.WriteDisposition.WRITE_TRUNCATE,
+        clustering_fields=clustering or None,
+    )
+    if partitioning != "year":
+        client.load_table_from_uri(f"gs://{bucket}/{object_name}", table_id, job_config=job_config).result()
+        return
+
+    job_config.range_partitioning = bigquery.RangePartitioning(
+        field="year", range_=bigquery.PartitionRange(start=1950, end=2100, interval=1))
+    job_config.hive_partitioning = bigquery.external_config.HivePartitioningOptions()
+    job_config.hive_partitioning.mode = "AUTO"
+    job_config.hive_partitioning.source_uri_prefix = f"gs://{bucket}/{object_name}/"
+    try:
+        client.get_table(table_id)
+    except NotFound:
+        # upload_folder only lists the partitions it uploaded, not the ones already in GCS
+        logging.info(f"{table_id} doesn`t exist yet, loading all its partitions")
+        client.load_table_from_uri(f"gs://{bucket}/{object_name}/*", table_id, job_config=job_config).result()
+        return
+    uploaded_objects = ti.xcom_pull(task_ids=upload_task_id) or []
+    years = sorted({uploaded_object.split("year=")[1].split("/")[0] for uploaded_object in uploaded_objects})
+    for year in years:
+        logging.info(f"Loading {table_id} partition {year}")
+        client.load_table_from_uri(f"gs://{bucket}/{object_name}/year={year}/*", f"{table_id}${year}",
+                                   job_config=job_config).result()
+
+
+def get_table_partitioning(table):
+    """
+    :param table: f1_tables entry
+    :return: partitioning the table is written with, None for a single object
+    """
+    return table["partitioning"] if hive_partitioning else None
+
+
+def get_table_fingerprints(zip_path):
+    """
+    Fingerprints every CSV member of the dataset archive by its CRC, size and column layout,
+    together with the Parquet settings it is converted with and the BigQuery load mode
+    :param zip_path: dataset archive path & file-name
+    :return: dict of member name -> fingerprint
+    """
+    schemas = {table["member"]: table["schema"] for table in TABLES}
+    partitionings = {table["member"]: get_table_partitioning(table) for table in TABLES}
+    with zipfile.ZipFile(zip_path) as archive:
+        return {
+            info.filename: {
+                "crc": info.CRC,
+                "size": info.file_size,
+                "columns": list(read_csv_header(zip_path, info.filename)),
+                "schema": schemas.get(info.filename),
+                "compression": PARQUET_COMPRESSION,
+                "partitioning": partitionings.get(info.filename),
+                "load_mode": bigquery_load_mode,
+            }
+            for info in archive.infolist()
+            if info.filename.endswith('.csv')
+        }
+
+
+def read_manifest(bucket, object_name=manifest_object):
+    """
+    :param bucket: GCS bucket name
+    :param object_name: manifest path & file-name
+    :return: fingerprints saved by the last successful run, empty if there is no manifest yet
+    """
+    from gcs_uploader import get_storage_client
+
+    blob = get_storage_client().bucket(bucket).blob(object_name)
+    if not blob.exists():
+        return {}
+    return json.loads(blob.download_as_text())
+
+
+def update_manifest(bucket, zip_path, object_name=manifest_object, dag_run=None):
+    """
+    Saves the fingerprints of the archive that was just loaded next to the table objects
+    :param bucket: GCS bucket name
+    :param zip_path: dataset archive path & file-name
+    :param object_name: manifest path & file-name
+    :param dag_run: current DAG run
+    :return:
+    """
+    from gcs_uploader import get_storage_client
+
+    get_staging(dag_run).pull(zip_path, shared=True)
+    blob = get_storage_client().bucket(bucket).blob(object_name)
+    blob.upload_from_string(json.dumps(get_table_fingerprints(zip_path), indent=2),
+                            content_type='application/json')
+
+
+def skip_if_unchanged(bucket, object_name, zip_path, member):
+    """
+    Skips the task (and so the tasks of the table after it) when the table is unchanged
+    since the last successful run and its object is in GCS
+    :param bucket: GCS bucket name
+    :param object_name: table object path & file-name
+    :param zip_path: dataset archive path & file-name
+    :param member: table CSV name in the archive
+    :return:
+    """
+    if not skip_unchanged_tables:
+        return
+    from gcs_uploader import object_exists
+
+    fingerprint = get_table_fingerprints(zip_path).get(member)
+    if read_manifest(bucket).get(member) == fingerprint and object_exists(bucket, object_name):
+        raise AirflowSkipException(f"{member} is unchanged since the last run")
+
+
+def get_race_years(src_file, zip_path, partitioning):
+    """
+    :param src_file: extracted CSV path & file-name, None to read races.csv from the archive
+    :param zip_path: dataset archive path & file-name
+    :param partitioning: partitioning of the table
+    :return: raceId -> year table for a table partitioned by year, otherwise None
+    """
+    if partitioning != "year":
+        return None
+    if src_file is None:
+        return read_race_years(zip_path, member="races.csv")
+    return read_race_years(os.path.join(os.path.dirname(src_file), "races.csv"))
+
+
+def read_checker_inputs(src_file, zip_path, members, bucket):
+    """
+    Reads what the data quality checks of the tables compare with, once for all of them
+    :param src_file: extracted CSV path & file-name of one of the tables, None to read the dimension tables
+                     from the archive
+    :param zip_path: dataset archive path & file-name
+    :param members: table CSV names in the archive
+    :param bucket: GCS bucket of the manifest with the column layout of the last loaded archive
+    :return: dimension table name -> list of its keys, member -> CSV layout in the last loaded archive.
+             Plain values, so they can be handed to the processes converting the tables
+    """
+    from data_quality import DATA_QUALITY
+
+    tables = [os.path.splitext(member)[0] for member in members]
+    if DATA_QUALITY == "off" or not any(table in CHECKS for table in tables):
+        return {}, {}
+    key_sets = {}
+    for dimension in sorted({dimension for table in tables
+                             for dimension in CHECKS.get(table, {}).get("references", {}).values()}):
+        if src_file is None:
+            keys = read_table_keys(zip_path, f"{dimension}.csv", dimension)
+        else:
+            keys = read_table_keys(os.path.join(os.path.dirname(src_file), f"{dimension}.csv"), table=dimension)
+        key_sets[dimension] = keys.to_pylist()
+    manifest = read_manifest(bucket)
+    return key_sets, {member: manifest.get(member, {}).get("columns") for member in members}
+
+
+def get_table_checker(zip_path, member, key_sets, previous_columns):
+    """
+    :param zip_path: dataset archive path & file-name
+    :param member: table CSV name in the archive
+    :param key_sets: dimension table name -> list of its keys, see read_checker_inputs
+    :param previous_columns: CSV layout of the table in the last loaded archive, None if unknown
+    :return: data_quality.TableChecker of the table, None if it has no checks or they are off
+    """
+    import pyarrow as pa
+    from data_quality import DATA_QUALITY, TableChecker
+
+    table = os.path.splitext(member)[0]
+    if DATA_QUALITY == "off" or table not in CHECKS:
+        return None
+    key_arrays = {}
+    for dimension in set(CHECKS[table].get("references", {}).values()):
+        key_arrays[dimension] = pa.array(key_sets[dimension], type=get_table_key(dimension)[1])
+    return TableChecker(table, CHECKS[table], key_arrays,
+                        columns=get_table_fingerprints(zip_path)[member]["columns"],
+                        previous_columns=previous_columns)
+
+
+def convert_table(src_file, dest_file, zip_path, member, schema=None, partitioning=None, use_threads=True,
+                  checker_inputs=None, ti=None):
+    """
+    :param src_file: extracted CSV path & file-name, None to read the member from the archive
+    :param dest_file: target path & file-name
+    :param zip_path: dataset archive path & file-name
+    :param member: table CSV name in the archive
+    :param schema: column name -> type name of the table
+    :param partitioning: "year" to write the table as year=YYYY/ partitions into the dest_file folder
+    :param use_threads: parse the CSV blocks on the Arrow thread pool
+    :param checker_inputs: dimension keys and previous CSV layout of the table, see read_checker_inputs.
+                           The data quality checks run on the batches when it is set
+    :param ti: current task instance
+    :return: stage metrics of the conversion, with the data quality report under "quality"
+    """
+    from data_quality import enforce
+    from pipeline_metrics import get_path_size, measure_stage
+
+    race_years = get_race_years(src_file, zip_path, partitioning)
+    checker = get_table_checker(zip_path, member, *checker_inputs) if checker_inputs is not None else None
+    with measure_stage("convert", os.path.splitext(member)[0], ti) as metrics:
+        if src_file is None:
+            metrics["rows"] = format_to_parquet(zip_path, dest_file, member=member, schema=schema,
+                                                race_years=race_years, use_threads=use_threads, checker=checker)
+            metrics["input_bytes"] = get_table_fingerprints(zip_path)[member]["size"]
+        else:
+            metrics["rows"] = format_to_parquet(src_file, dest_file, schema=schema, race_years=race_years,
+                                                use_threads=use_threads, checker=checker)
+            metrics["input_bytes"] = os.path.getsize(src_file)
+        metrics["output_bytes"] = get_path_size(dest_file) if os.path.exists(dest_file) else 0
+    if checker is not None:
+        metrics["quality"] = checker.report()
+        if ti is not None:
+            ti.xcom_push(key="quality", value=metrics["quality"])
+        enforce(metrics["quality"])
+    return metrics
+
+
+def format_to_parquet_if_changed(src_file, dest_file, bucket, object_name, zip_path, member, schema=None,
+                                 partitioning=None, dag_run=None, ti=None):
+    """
+    Converts the table unless it is unchanged since the last successful run, see skip_if_unchanged
+    :param src_file: extracted CSV path & file-name, None to read the member from the archive
+    :param dest_file: target path & file-name
     :param bucket: GCS bucket name
-    :param object_name: target path & file-name
-    :param local_file: source path & file-name
+    :param object_name: table object path & file-name
+    :param zip_path: dataset archive path & file-name
+    :param member: table CSV name in the archive
+    :param schema: column name -> type name of the table
+    :param partitioning: "year" to write the table as year=YYYY/ partitions into the dest_file folder
+    :param dag_run: current DAG run
+    :param ti: current task instance
     :return:
     """
-    # WORKAROUND to prevent timeout for files > 6 MB on 800 kbps upload speed.
-    # (Ref: https://github.com/googleapis/python-storage/issues/74)
-    storage.blob._MAX_MULTIPART_SIZE = 5 * 1024 * 1024  # 5 MB
-    storage.blob._DEFAULT_CHUNKSIZE = 5 * 1024 * 1024  # 5 MB
-    # End of Workaround
+    staging = get_staging(dag_run)
+    staging.pull(zip_path, shared=True)
+    skip_if_unchanged(bucket, object_name, zip_path, member)
+    key_sets, previous_columns = read_checker_inputs(src_file, zip_path, [member], bucket)
+    convert_table(src_file, dest_file, zip_path, member, schema, partitioning,
+                  checker_inputs=(key_sets, previous_columns.get(member)), ti=ti)
+    staging.push(dest_file)
 
-    client = storage.Client()
-    bucket = client.bucket(bucket)
 
-    blob = bucket.blob(object_name)
-    blob.upload_from_filename(local_file)
+def reset_storage_client():
+    """
+    Initializer of the forked conversion processes: the storage client inherited from the task process
+    is dropped, so its connection pool is never used by two processes
+    """
+    from gcs_uploader import get_storage_client
+
+    get_storage_client.cache_clear()
+
+
+def batch_format_to_parquet(tables, bucket, zip_path, workers=BATCH_CONVERT_WORKERS, dag_run=None, ti=None):
+    """
+    Converts all tables from one process pool, paying the task start-up and the pyarrow import once.
+    The largest tables are submitted first, so they don't end up last on one core,
+    and only tables larger than one CSV block parse their blocks on the Arrow thread pool.
+    Every table result is pushed to XCom under the table name for its local_to_gcs task.
+    :param tables: format_to_parquet_if_changed kwargs of every table, with its name
+    :param bucket: GCS bucket name
+    :param zip_path: dataset archive path & file-name
+    :param workers: pool processes, the worker's cores by default
+    :param dag_run: current DAG run
+    :param ti: current task instance
+    :return:
+    """
+    import time
+
+    start = time.perf_counter()
+    staging = get_staging(dag_run)
+    staging.pull(zip_path, shared=True)
+    sizes = {member: fingerprint["size"] for member, fingerprint in get_table_fingerprints(zip_path).items()}
+    results, pending = {}, []
+    for table in tables:
+        try:
+            skip_if_unchanged(bucket, table["object_name"], zip_path, table["member"])
+            pending.append(table)
+        except AirflowSkipException as skip:
+            logging.info(skip)
+            results[table["name"]] = {"skipped": True}
+    pending.sort(key=lambda table: sizes.get(table["member"], 0), reverse=True)
+    # The manifest and the dimension keys are read once here, the pool processes never call GCS
+    key_sets, previous_columns = {}, {}
+    if bucket and pending:
+        key_sets, previous_columns = read_checker_inputs(pending[0]["src_file"], zip_path,
+                                                         [table["member"] for table in pending], bucket)
+
+    # fork keeps the pool processes cheap. The Arrow thread pools restart in the forked processes,
+    # and every process drops the storage client it inherited, so no connection is shared with this one
+    errors = {}
+    with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("fork"),
+                             initializer=reset_storage_client) as pool:
+        futures = {
+            table["name"]: pool.submit(convert_table, table["src_file"], table["dest_file"], zip_path,
+                                       table["member"], table["schema"], table["partitioning"],
+                                       sizes.get(table["member"], 0) > CSV_BLOCK_SIZE,
+                                       (key_sets, previous_columns.get(table["member"])) if bucket else None)
+            for table in pending
+        }
+        for name, future in futures.items():
+            try:
+                results[name] = future.result()
+            except Exception as error:
+                logging.exception(f"Conversion of {name} failed")
+                errors[name] = error
+    if errors:
+        raise RuntimeError(f"Conversion failed for {', '.join(sorted(errors))}")
+
+    for table in pending:
+        staging.push(table["dest_file"])
+    for name, result in results.items():
+        ti.xcom_push(key=name, value=result)
+    stages = [result for result in results.values() if not result.get("skipped")]
+    ti.xcom_push(key="quality", value=[stage.pop("quality") for stage in stages if "quality" in stage])
+    ti.xcom_push(key="metrics", value=stages)
+    wall_seconds = time.perf_counter() - start
+    logging.info(f"Converted {len(stages)} tables in {wall_seconds:.2f} s with {workers} processes, "
+                 f"the table conversions took {sum(result['wall_seconds'] for result in stages):.2f} s in total")
+
+
+def format_to_gcs_if_changed(src_file, bucket, object_name, zip_path, member, schema=None, partitioning=None,
+                             dag_run=None, ti=None):
+    """
+    Fused format_to_parquet and local_to_gcs: streams the table into GCS in one task, see format_to_gcs
+    :param src_file: extracted CSV path & file-name, None to read the member from the archive
+    :param bucket: GCS bucket name
+    :param object_name: table object path & file-name, the prefix of a partitioned table
+    :param zip_path: dataset archive path & file-name
+    :param member: table CSV name in the archive
+    :param schema: column name -> type name of the table
+    :param partitioning: "year" to write the table as year=YYYY/ partitions under the object_name prefix
+    :param dag_run: current DAG run
+    :param ti: current task instance
+    :return: names of the uploaded objects
+    """
+    from pipeline_metrics import measure_stage
+
+    table = os.path.splitext(member)[0]
+    if release_diff and table in CHECKS:
+        logging.warning(f"RELEASE_DIFF is not supported with FUSED_CONVERT_UPLOAD, the release of {table} "
+                        f"is not diffed: the Parquet is streamed to GCS with no local copy to compare")
+    get_staging(dag_run).pull(zip_path, shared=True)
+    skip_if_unchanged(bucket, object_name, zip_path, member)
+    race_years = get_race_years(src_file, zip_path, partitioning)
+    key_sets, previous_columns = read_checker_inputs(src_file, zip_path, [member], bucket)
+    checker = get_table_checker(zip_path, member, key_sets, previous_columns.get(member))
+    try:
+        with measure_stage("convert_upload", table, ti) as metrics:
+            if src_file is None:
+                metrics["rows"], uploaded = format_to_gcs(zip_path, bucket, object_name, member=member,
+                                                          schema=schema, race_years=race_years, checker=checker)
+                metrics["input_bytes"] = get_table_fingerprints(zip_path)[member]["size"]
+            else:
+                metrics["rows"], uploaded = format_to_gcs(src_file, bucket, object_name, schema=schema,
+                                                          race_years=race_years, checker=checker)
+                metrics["input_bytes"] = os.path.getsize(src_file)
+            metrics["output_bytes"] = sum(uploaded.values())
+    finally:
+        if checker is not None and checker.result is not None:
+            ti.xcom_push(key="quality", value=checker.result)
+    return sorted(uploaded)
+
+
+def get_backfill_dataset(dataset, version):
+    """
+    :param dataset: BigQuery dataset of the run conf, empty for the default one
+    :param version: snapshot version
+    :return: dataset of the snapshot's external tables
+    """
+    return dataset or f"{BIGQUERY_DATASET}_{''.join(c if c.isalnum() else '_' for c in version)}"
+
+
+def validate_backfill_names(version, prefix):
+    """
+    The run conf names the folder the snapshot is downloaded to and removed from,
+    so anything but one plain path segment (e.g. "../dags") is rejected before it is used
+    :param version: snapshot version of the run conf
+    :param prefix: GCS prefix of the run conf
+    :return:
+    """
+    for name, value in (("version", version), ("prefix", prefix)):
+        if not BACKFILL_NAME_PATTERN.match(value or "") or value in (".", ".."):
+            raise ValueError(f"{name} {value!r} of the run conf must match {BACKFILL_NAME_PATTERN.pattern} "
+                             f"and not be . or ..")
+
+
+def get_backfill_tables(members):
+    """
+    :param members: CSV names in the snapshot archive
+    :return: f1_tables entries of the tables in the snapshot, older snapshots miss the newer tables
+    """
+    return [table for table in TABLES if table["member"] in members]
+
+
+def backfill_snapshot(url, version, bucket, prefix=BACKFILL_PREFIX, workers=BACKFILL_CONVERT_WORKERS,
+                      upload_threads=BACKFILL_UPLOAD_THREADS):
+    """
+    Loads one archived snapshot into its own versioned prefix in one task: the archive is downloaded
+    to a folder of the version, the tables are converted from a process pool and uploaded from a thread pool
+    sharing the worker's storage client and its connection pool
+    :param url: snapshot archive url
+    :param version: snapshot version, e.g. its release date
+    :param bucket: GCS bucket name
+    :param prefix: the tables are written to <prefix>/<version>/raw/
+    :param workers: conversion processes of the snapshot
+    :param upload_threads: uploads of the snapshot running at once
+    :return: summary of the snapshot load
+    """
+    import time
+    import shutil
+    from concurrent.futures import ThreadPoolExecutor
+    from dataset_download import download_dataset
+    from gcs_uploader import get_storage_client, upload_file, upload_folder
+
+    if not url or not version:
+        raise ValueError("snapshot_url and version are required in the run conf")
+    validate_backfill_names(version, prefix)
+    start = time.perf_counter()
+    work_dir = os.path.join(path_to_local_home, "backfill", version)
+    zip_path = os.path.join(work_dir, zip_file)
+    object_prefix = f"{prefix}/{version}"
+    os.makedirs(work_dir, exist_ok=True)
+    try:
+        download_dataset(url, zip_path)
+        fingerprints = get_table_fingerprints(zip_path)
+        sizes = {member: fingerprint["size"] for member, fingerprint in fingerprints.items()}
+        tables = get_backfill_tables(fingerprints)
+        missing = sorted(table["name"] for table in TABLES if table not in tables)
+        if missing:
+            logging.info(f"Snapshot {version} has no {', '.join(missing)}")
+        local_files = {}
+        with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("fork"),
+                                 initializer=reset_storage_client) as pool:
+            futures = []
+            for table in sorted(tables, key=lambda table: sizes[table["member"]], reverse=True):
+                partitioning = get_table_partitioning(table)
+                table_path = table['name'] if partitioning else f"{table['name']}.parquet"
+                local_files[f"{object_prefix}/raw/{table_path}"] = os.path.join(work_dir, table_path)
+                futures.append(pool.submit(convert_table, None, os.path.join(work_dir, table_path), zip_path,
+                                           table["member"], table["schema"], partitioning,
+                                           sizes.get(table["member"], 0) > CSV_BLOCK_SIZE))
+            stages = [future.result() for future in futures]
+
+        def upload(item):
+            object_name, local_file = item
+            if os.path.isdir(local_file):
+                return upload_folder(bucket, object_name, local_file)
+            upload_file(bucket, object_name, local_file)
+            return [object_name]
+
+        with ThreadPoolExecutor(max_workers=upload_threads) as pool:
+            uploaded = [name for names in pool.map(upload, local_files.items()) for name in names]
+        get_storage_client().bucket(bucket).blob(f"{object_prefix}/manifest.json").upload_from_string(
+            json.dumps(fingerprints, indent=2), content_type='application/json')
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+    summary = {
+        "version": version,
+        "prefix": object_prefix,
+        "tables": len(stages),
+        "missing_tables": missing,
+        "rows": sum(stage["rows"] for stage in stages),
+        "input_bytes": sum(stage["input_bytes"] for stage in stages),
+        "output_bytes": sum(stage["output_bytes"] for stage in stages),
+        "objects": len(uploaded),
+        "wall_seconds": round(time.perf_counter() - start, 3),
+    }
+    logging.info(f"Backfilled snapshot {version}: {json.dumps(summary)}")
+    return summary
+
+
+def create_backfill_tables(bucket, version, prefix=BACKFILL_PREFIX, dataset=None):
+    """
+    Creates the external tables of a backfilled snapshot, in the location of the main dataset,
+    for the tables of its manifest only
+    :param bucket: GCS bucket name
+    :param version: snapshot version
+    :param prefix: the tables were written to <prefix>/<version>/raw/
+    :param dataset: BigQuery dataset of the tables, <BIGQUERY_DATASET>_<version> by default
+    :return:
+    """
+    from google.cloud import bigquery
+
+    validate_backfill_names(version, prefix)
+    # backfill_snapshot writes the manifest after the last table is uploaded
+    manifest = read_manifest(bucket, f"{prefix}/{version}/manifest.json")
+    if not manifest:
+        raise ValueError(f"gs://{bucket}/{prefix}/{version}/ has no manifest, the snapshot is not backfilled")
+    client = bigquery.Client(project=PROJECT_ID)
+    dataset_id = f"{PROJECT_ID}.{get_backfill_dataset(dataset, version)}"
+    backfill_dataset = bigquery.Dataset(dataset_id)
+    backfill_dataset.location = client.get_dataset(f"{PROJECT_ID}.{BIGQUERY_DATASET}").location
+    client.create_dataset(backfill_dataset, exists_ok=True)
+    for table in get_backfill_tables(manifest):
+        partitioning = get_table_partitioning(table)
+        table_path = table['name'] if partitioning else f"{table['name']}.parquet"
+        source_uri = f"gs://{bucket}/{prefix}/{version}/raw/{table_path}"
+        external_config = bigquery.ExternalConfig("PARQUET")
+        external_config.source_uris = [f"{source_uri}/*" if partitioning else source_uri]
+        if partitioning:
+            external_config.hive_partitioning = bigquery.external_config.HivePartitioningOptions()
+            external_config.hive_partitioning.mode = "AUTO"
+            external_config.hive_partitioning.source_uri_prefix = f"{source_uri}/"
+        external_table = bigquery.Table(f"{dataset_id}.external_table_{table['name']}")
+        external_table.external_data_configuration = external_config
+        client.delete_table(external_table, not_found_ok=True)
+        client.create_table(external_table)
+    logging.info(f"Created the external tables of snapshot {version} in {dataset_id}")
 
 
 default_args = {
@@ -79,22 +1019,117 @@ default_args = {
     "retries": 1,
 }
 
-def getDbtMessage(message):
-    return {'cause': message}
-    
-    
-def getDbtApiLink(jobId, accountId):
-    return 'accounts/{0}/jobs/{1}/run/'.format(accountId, jobId)
-  
-  
+def cleanup_run_files(paths, dag_run=None):
+    """
+    Removes the local files of the run and its staged artifacts
+    :param paths: local files and folders of the run
+    :param dag_run: current DAG run
+    :return:
+    """
+    get_staging(dag_run).cleanup(paths)
+
+
+def refresh_mart_service(service_url, token=MART_REFRESH_TOKEN, timeout=60):
+    """
+    Makes the serving API reload f1_mart and drop its cache
+    :param service_url: base URL of the serving API
+    :param token: bearer token of POST /refresh, None for a service on the same host without a token
+    :param timeout: seconds to wait for the reload
+    :return:
+    """
+    import requests
+
+    if not service_url:
+        raise AirflowSkipException("MART_SERVICE_URL is not set")
+    headers = {"Authorization": f"Bearer {token}"} if token else {}
+    response = requests.post(f"{service_url.rstrip('/')}/refresh", headers=headers, timeout=timeout)
+    response.raise_for_status()
+    logging.info(f"Mart service reloaded {response.json()['seasons']} seasons")
+
+
+def get_makespan(dag_run, task_ids):
+    """
+    :param dag_run: current DAG run
+    :param task_ids: tasks the makespan is measured over
+    :return: seconds from the first start to the last end of the tasks, None if none of them ran
+    """
+    task_instances = [task_instance for task_instance in dag_run.get_task_instances()
+                      if task_instance.task_id in task_ids and task_instance.start_date and task_instance.end_date]
+    if not task_instances:
+        return None
+    return round((max(task_instance.end_date for task_instance in task_instances)
+                  - min(task_instance.start_date for task_instance in task_instances)).total_seconds(), 3)
+
+
+def collect_pipeline_metrics(table_task_ids=(), ti=None, dag_run=None):
+    """
+    Collects the stage metrics, data quality reports and release diffs pushed by the tasks of the run
+    into one JSON summary, compares the makespan of the table tasks with the one expected from the task history
+    and adds the task durations of the run to the history
+    :param table_task_ids: tasks of the table chains
+    :param ti: current task instance
+    :param dag_run: current DAG run
+    :return: per-run summary, kept in XCom to track the trends by table
+    """
+    from pipeline_metrics import summarize_metrics
+    from scheduling import UPLOAD_POOL_SLOTS, estimate_makespan, save_history, update_history
+
+    dag = ti.task.dag
+    stages, quality, diffs, input_bytes = [], [], [], {}
+    for task_id in dag.task_ids:
+        metrics = ti.xcom_pull(task_ids=task_id, key="metrics")
+        reports = ti.xcom_pull(task_ids=task_id, key="quality")
+        diff = ti.xcom_pull(task_ids=task_id, key="diff")
+        if diff:
+            diffs.append(diff)
+        # batch_format_to_parquet pushes the metrics and the reports of all its tables as lists
+        stages.extend(metrics if isinstance(metrics, list) else [metrics] if metrics else [])
+        quality.extend(reports if isinstance(reports, list) else [reports] if reports else [])
+        if isinstance(metrics, dict) and metrics.get("input_bytes") is not None:
+            input_bytes[task_id] = metrics["input_bytes"]
+    summary = summarize_metrics(stages)
+    summary["run_id"] = dag_run.run_id
+    summary["quality"] = quality
+    summary["diff"] = diffs
+
+    history = read_history()
+    durations = {task_instance.task_id: task_instance.duration for task_instance in dag_run.get_task_instances()
+                 if task_instance.task_id in table_task_ids and task_instance.state == "success"}
+    expected = None
+    if all(task_id in history for task_id in table_task_ids):
+        expected = estimate_makespan(
+            {
+                task_id: {
+                    "duration": history[task_id]["duration"],
+                    "priority": dag.get_task(task_id).priority_weight,
+                    "upstream": dag.get_task(task_id).upstream_task_ids,
+                    "pool": dag.get_task(task_id).pool,
+                }
+                for task_id in table_task_ids
+            },
+            pool_slots={UPLOAD_POOL: UPLOAD_POOL_SLOTS} if UPLOAD_POOL != "default_pool" else None,
+        )
+    summary["makespan"] = {"expected_seconds": expected, "actual_seconds": get_makespan(dag_run, table_task_ids)}
+    save_history(update_history(history, durations, input_bytes))
+    logging.info(f"Pipeline metrics: {json.dumps(summary['totals'])}")
+    logging.info(f"Table tasks makespan: {json.dumps(summary['makespan'])}")
+    failed_tables = [report["table"] for report in quality if not report["passed"]]
+    if failed_tables:
+        logging.warning(f"Data quality checks failed for {', '.join(failed_tables)}")
+    return summary
+
+
 def getDbtApiOperator(task_id, jobId, message='Triggered by Airflow', accountId=dbt_account_id):
-  return SimpleHttpOperator(
+  return DbtJobRunOperator(
     task_id=task_id,
-    method='POST',
-    data=json.dumps(getDbtMessage(message)),
+    job_id=jobId,
+    account_id=accountId,
+    message=message,
     http_conn_id='dbt_api', # https://cloud.getdbt.com/api/v2/
-    endpoint=getDbtApiLink(jobId, accountId),
-    headers=dbt_header
+    headers=dbt_header,
+    runner=dbt_runner,
+    project_dir=dbt_project_dir,
+    profiles_dir=dbt_profiles_dir,
   )
 
 with DAG(
@@ -106,515 +1141,221 @@ with DAG(
     tags=['dtc-de'],
 ) as dag:
 
-    download_dataset_task = BashOperator(
+    download_dataset_task = ShortCircuitOperator(
         task_id="download_dataset_task",
-        bash_command=f"curl -sSLf {dataset_url} > {path_to_local_home}/{zip_file}"
-    )
-
-    unzip_files = BashOperator(
-        task_id="unzip_files",
-        bash_command=f"unzip -o {path_to_local_home}/{zip_file} -d {path_to_local_home}/{csv_folder_name}"
-    )
-
-    format_to_parquet_circuits = PythonOperator(
-        task_id="format_to_parquet_circuits",
-        python_callable=format_to_parquet,
-        op_kwargs={
-            "src_file": f"{path_to_local_home}/{csv_folder_name}/circuits.csv",
-            "dest_file": f"{path_to_local_home}/{csv_folder_name}/circuits.parquet",
-        },
-    )
-    
-    format_to_parquet_constructor_results = PythonOperator(
-        task_id="format_to_parquet_constructor_results",
-        python_callable=format_to_parquet,
+        python_callable=download_dataset_if_modified,
         op_kwargs={
-            "src_file": f"{path_to_local_home}/{csv_folder_name}/constructor_results.csv",
-            "dest_file": f"{path_to_local_home}/{csv_folder_name}/constructor_results.parquet",
-        },
-    )
-    
-    format_to_parquet_constructor_standings = PythonOperator(
-        task_id="format_to_parquet_constructor_standings",
-        python_callable=format_to_parquet,
-        op_kwargs={
-            "src_file": f"{path_to_local_home}/{csv_folder_name}/constructor_standings.csv",
-            "dest_file": f"{path_to_local_home}/{csv_folder_name}/constructor_standings.parquet",
-        },
-    )
-    
-    format_to_parquet_constructors = PythonOperator(
-        task_id="format_to_parquet_constructors",
-        python_callable=format_to_parquet,
-        op_kwargs={
-            "src_file": f"{path_to_local_home}/{csv_folder_name}/constructors.csv",
-            "dest_file": f"{path_to_local_home}/{csv_folder_name}/constructors.parquet",
-        },
-    )
-    
-    format_to_parquet_driver_standings = PythonOperator(
-        task_id="format_to_parquet_driver_standings",
-        python_callable=format_to_parquet,
-        op_kwargs={
-            "src_file": f"{path_to_local_home}/{csv_folder_name}/driver_standings.csv",
-            "dest_file": f"{path_to_local_home}/{csv_folder_name}/driver_standings.parquet",
-        },
-    )
-    
-    format_to_parquet_drivers = PythonOperator(
-        task_id="format_to_parquet_drivers",
-        python_callable=format_to_parquet,
-        op_kwargs={
-            "src_file": f"{path_to_local_home}/{csv_folder_name}/drivers.csv",
-            "dest_file": f"{path_to_local_home}/{csv_folder_name}/drivers.parquet",
-        },
-    )
-    
-    format_to_parquet_lap_times = PythonOperator(
-        task_id="format_to_parquet_lap_times",
-        python_callable=format_to_parquet,
-        op_kwargs={
-            "src_file": f"{path_to_local_home}/{csv_folder_name}/lap_times.csv",
-            "dest_file": f"{path_to_local_home}/{csv_folder_name}/lap_times.parquet",
-        },
-    )
-    
-    format_to_parquet_pit_stops = PythonOperator(
-        task_id="format_to_parquet_pit_stops",
-        python_callable=format_to_parquet,
-        op_kwargs={
-            "src_file": f"{path_to_local_home}/{csv_folder_name}/pit_stops.csv",
-            "dest_file": f"{path_to_local_home}/{csv_folder_name}/pit_stops.parquet",
-        },
-    )
-    
-    format_to_parquet_qualifying = PythonOperator(
-        task_id="format_to_parquet_qualifying",
-        python_callable=format_to_parquet,
-        op_kwargs={
-            "src_file": f"{path_to_local_home}/{csv_folder_name}/qualifying.csv",
-            "dest_file": f"{path_to_local_home}/{csv_folder_name}/qualifying.parquet",
-        },
-    )
-    
-    format_to_parquet_races = PythonOperator(
-        task_id="format_to_parquet_races",
-        python_callable=format_to_parquet,
-        op_kwargs={
-            "src_file": f"{path_to_local_home}/{csv_folder_name}/races.csv",
-            "dest_file": f"{path_to_local_home}/{csv_folder_name}/races.parquet",
-        },
-    )
-    
-    format_to_parquet_results = PythonOperator(
-        task_id="format_to_parquet_results",
-        python_callable=format_to_parquet,
-        op_kwargs={
-            "src_file": f"{path_to_local_home}/{csv_folder_name}/results.csv",
-            "dest_file": f"{path_to_local_home}/{csv_folder_name}/results.parquet",
-        },
-    )
-    
-    format_to_parquet_seasons = PythonOperator(
-        task_id="format_to_parquet_seasons",
-        python_callable=format_to_parquet,
-        op_kwargs={
-            "src_file": f"{path_to_local_home}/{csv_folder_name}/seasons.csv",
-            "dest_file": f"{path_to_local_home}/{csv_folder_name}/seasons.parquet",
-        },
-    )
-    
-    format_to_parquet_sprint_results = PythonOperator(
-        task_id="format_to_parquet_sprint_results",
-        python_callable=format_to_parquet,
-        op_kwargs={
-            "src_file": f"{path_to_local_home}/{csv_folder_name}/sprint_results.csv",
-            "dest_file": f"{path_to_local_home}/{csv_folder_name}/sprint_results.parquet",
-        },
-    )
-    
-    format_to_parquet_status = PythonOperator(
-        task_id="format_to_parquet_status",
-        python_callable=format_to_parquet,
-        op_kwargs={
-            "src_file": f"{path_to_local_home}/{csv_folder_name}/status.csv",
-            "dest_file": f"{path_to_local_home}/{csv_folder_name}/status.parquet",
+            "url": dataset_url,
+            "dest_file": f"{path_to_local_home}/{zip_file}",
         },
     )
 
-    local_to_gcs_circuits = PythonOperator(
-        task_id="local_to_gcs_circuits",
-        python_callable=upload_to_gcs,
-        op_kwargs={
-            "bucket": BUCKET,
-            "object_name": f"raw/circuits.parquet",
-            "local_file": f"{path_to_local_home}/{csv_folder_name}/circuits.parquet",
-        },
-    )
+    csv_source_task = download_dataset_task
+    if unzip_archive:
+        unzip_files = BashOperator(
+            task_id="unzip_files",
+            bash_command=f"unzip -o {path_to_local_home}/{zip_file} -d {path_to_local_home}/{csv_folder_name}"
+        )
+        download_dataset_task >> unzip_files
+        csv_source_task = unzip_files
 
-    local_to_gcs_constructor_results = PythonOperator(
-        task_id="local_to_gcs_constructor_results",
-        python_callable=upload_to_gcs,
-        op_kwargs={
-            "bucket": BUCKET,
-            "object_name": f"raw/constructor_results.parquet",
-            "local_file": f"{path_to_local_home}/{csv_folder_name}/constructor_results.parquet",
-        },
-    )
+    table_groups = []
+    batch_tables = []
+    table_task_ids = []
+    task_history = read_cached_history()
 
-    local_to_gcs_constructor_standings = PythonOperator(
-        task_id="local_to_gcs_constructor_standings",
-        python_callable=upload_to_gcs,
-        op_kwargs={
-            "bucket": BUCKET,
-            "object_name": f"raw/constructor_standings.parquet",
-            "local_file": f"{path_to_local_home}/{csv_folder_name}/constructor_standings.parquet",
-        },
-    )
+    for table in TABLES:
+        partitioning = get_table_partitioning(table)
+        # A partitioned table is a folder of year=YYYY/ partitions locally and a prefix in GCS
+        table_path = table['name'] if partitioning else f"{table['name']}.parquet"
+        external_data_configuration = {
+            "sourceFormat": "PARQUET",
+            "sourceUris": [f"gs://{BUCKET}/raw/{table_path}/*" if partitioning else f"gs://{BUCKET}/raw/{table_path}"],
+        }
+        if partitioning:
+            external_data_configuration["hivePartitioningOptions"] = {
+                "mode": "AUTO",
+                "sourceUriPrefix": f"gs://{BUCKET}/raw/{table_path}/",
+            }
 
-    local_to_gcs_constructors = PythonOperator(
-        task_id="local_to_gcs_constructors",
-        python_callable=upload_to_gcs,
-        op_kwargs={
-            "bucket": BUCKET,
-            "object_name": f"raw/constructors.parquet",
-            "local_file": f"{path_to_local_home}/{csv_folder_name}/constructors.parquet",
-        },
-    )
-
-    local_to_gcs_driver_standings = PythonOperator(
-        task_id="local_to_gcs_driver_standings",
-        python_callable=upload_to_gcs,
-        op_kwargs={
-            "bucket": BUCKET,
-            "object_name": f"raw/driver_standings.parquet",
-            "local_file": f"{path_to_local_home}/{csv_folder_name}/driver_standings.parquet",
-        },
-    )
+        with TaskGroup(group_id=table["name"], prefix_group_id=False) as table_group:
+            if fused_convert_upload:
+                format_to_gcs_task = PythonOperator(
+                    task_id=f"format_to_gcs_{table['name']}",
+                    python_callable=format_to_gcs_if_changed,
+                    pool=UPLOAD_POOL,
+                    op_kwargs={
+                        "src_file": f"{path_to_local_home}/{csv_folder_name}/{table['member']}" if unzip_archive else None,
+                        "bucket": BUCKET,
+                        "object_name": f"raw/{table_path}",
+                        "zip_path": f"{path_to_local_home}/{zip_file}",
+                        "member": table["member"],
+                        "schema": table["schema"],
+                        "partitioning": partitioning,
+                    },
+                )
+                upload_tasks = [format_to_gcs_task]
+            else:
+                format_to_parquet_kwargs = {
+                    "src_file": f"{path_to_local_home}/{csv_folder_name}/{table['member']}" if unzip_archive else None,
+                    "dest_file": f"{path_to_local_home}/{csv_folder_name}/{table_path}",
+                    "bucket": BUCKET,
+                    "object_name": f"raw/{table_path}",
+                    "zip_path": f"{path_to_local_home}/{zip_file}",
+                    "member": table["member"],
+                    "schema": table["schema"],
+                    "partitioning": partitioning,
+                }
+                local_to_gcs_task = PythonOperator(
+                    task_id=f"local_to_gcs_{table['name']}",
+                    python_callable=upload_to_gcs,
+                    pool=UPLOAD_POOL,
+                    op_kwargs={
+                        "bucket": BUCKET,
+                        "object_name": f"raw/{table_path}",
+                        "local_file": f"{path_to_local_home}/{csv_folder_name}/{table_path}",
+                        "table": table["name"],
+                        "convert_task_id": "format_to_parquet_all" if batch_convert else None,
+                    },
+                )
+                if batch_convert:
+                    batch_tables.append({"name": table["name"], **format_to_parquet_kwargs})
+                    upload_tasks = [local_to_gcs_task]
+                else:
+                    format_to_parquet_task = PythonOperator(
+                        task_id=f"format_to_parquet_{table['name']}",
+                        python_callable=format_to_parquet_if_changed,
+                        op_kwargs=format_to_parquet_kwargs,
+                    )
+                    upload_tasks = [format_to_parquet_task, local_to_gcs_task]
+            upload_task_id = upload_tasks[-1].task_id
 
-    local_to_gcs_drivers = PythonOperator(
-        task_id="local_to_gcs_drivers",
-        python_callable=upload_to_gcs,
-        op_kwargs={
-            "bucket": BUCKET,
-            "object_name": f"raw/drivers.parquet",
-            "local_file": f"{path_to_local_home}/{csv_folder_name}/drivers.parquet",
-        },
-    )
+            if bigquery_load_mode == "native":
+                bigquery_table_task = PythonOperator(
+                    task_id=f"bigquery_native_table_{table['name']}",
+                    python_callable=load_to_bigquery,
+                    op_kwargs={
+                        "bucket": BUCKET,
+                        "object_name": f"raw/{table_path}",
+                        "table_id": f"{PROJECT_ID}.{BIGQUERY_DATASET}.native_table_{table['name']}",
+                        "partitioning": partitioning,
+                        "clustering": table["clustering"],
+                        "upload_task_id": upload_task_id,
+                    },
+                )
+            else:
+                bigquery_table_task = BigQueryCreateExternalTableOperator(
+                    task_id=f"bigquery_external_table_{table['name']}",
+                    table_resource={
+                        "tableReference": {
+                            "projectId": PROJECT_ID,
+                            "datasetId": BIGQUERY_DATASET,
+                            "tableId": f"external_table_{table['name']}",
+                        },
+                        "externalDataConfiguration": external_data_configuration,
+                    },
+                )
 
-    local_to_gcs_lap_times = PythonOperator(
-        task_id="local_to_gcs_lap_times",
-        python_callable=upload_to_gcs,
-        op_kwargs={
-            "bucket": BUCKET,
-            "object_name": f"raw/lap_times.parquet",
-            "local_file": f"{path_to_local_home}/{csv_folder_name}/lap_times.parquet",
-        },
-    )
+            chain(*upload_tasks, bigquery_table_task)
+            # The longest chains by the durations of earlier runs start first
+            chain_weights = get_chain_weights([task.task_id for task in upload_tasks + [bigquery_table_task]],
+                                              task_history, table["priority"])
+            for task in upload_tasks + [bigquery_table_task]:
+                task.priority_weight = chain_weights[task.task_id]
+                task.weight_rule = "absolute"
+                table_task_ids.append(task.task_id)
+        table_groups.append(table_group)
 
-    local_to_gcs_pit_stops = PythonOperator(
-        task_id="local_to_gcs_pit_stops",
-        python_callable=upload_to_gcs,
-        op_kwargs={
-            "bucket": BUCKET,
-            "object_name": f"raw/pit_stops.parquet",
-            "local_file": f"{path_to_local_home}/{csv_folder_name}/pit_stops.parquet",
-        },
-    )
+    if batch_tables:
+        format_to_parquet_all = PythonOperator(
+            task_id="format_to_parquet_all",
+            python_callable=batch_format_to_parquet,
+            priority_weight=max(task.priority_weight for task in dag.tasks if task.task_id in table_task_ids),
+            weight_rule="absolute",
+            op_kwargs={
+                "tables": batch_tables,
+                "bucket": BUCKET,
+                "zip_path": f"{path_to_local_home}/{zip_file}",
+            },
+        )
+        csv_source_task >> format_to_parquet_all
+        csv_source_task = format_to_parquet_all
+        table_task_ids.append(format_to_parquet_all.task_id)
 
-    local_to_gcs_qualifying = PythonOperator(
-        task_id="local_to_gcs_qualifying",
-        python_callable=upload_to_gcs,
+    update_tables_manifest = PythonOperator(
+        task_id="update_tables_manifest",
+        python_callable=update_manifest,
+        trigger_rule="none_failed",
         op_kwargs={
             "bucket": BUCKET,
-            "object_name": f"raw/qualifying.parquet",
-            "local_file": f"{path_to_local_home}/{csv_folder_name}/qualifying.parquet",
+            "zip_path": f"{path_to_local_home}/{zip_file}",
         },
     )
 
-    local_to_gcs_races = PythonOperator(
-        task_id="local_to_gcs_races",
-        python_callable=upload_to_gcs,
+    cleanup = PythonOperator(
+        task_id="cleanup",
+        python_callable=cleanup_run_files,
         op_kwargs={
-            "bucket": BUCKET,
-            "object_name": f"raw/races.parquet",
-            "local_file": f"{path_to_local_home}/{csv_folder_name}/races.parquet",
+            "paths": [f"{path_to_local_home}/{csv_folder_name}/"],
         },
     )
 
-    local_to_gcs_results = PythonOperator(
-        task_id="local_to_gcs_results",
-        python_callable=upload_to_gcs,
-        op_kwargs={
-            "bucket": BUCKET,
-            "object_name": f"raw/results.parquet",
-            "local_file": f"{path_to_local_home}/{csv_folder_name}/results.parquet",
-        },
-    )
 
-    local_to_gcs_seasons = PythonOperator(
-        task_id="local_to_gcs_seasons",
-        python_callable=upload_to_gcs,
-        op_kwargs={
-            "bucket": BUCKET,
-            "object_name": f"raw/seasons.parquet",
-            "local_file": f"{path_to_local_home}/{csv_folder_name}/seasons.parquet",
-        },
-    )
+    dbt_transformations = getDbtApiOperator('dbt_transformations', dbt_job_id)
 
-    local_to_gcs_sprint_results = PythonOperator(
-        task_id="local_to_gcs_sprint_results",
-        python_callable=upload_to_gcs,
+    refresh_mart = PythonOperator(
+        task_id="refresh_mart_service",
+        python_callable=refresh_mart_service,
         op_kwargs={
-            "bucket": BUCKET,
-            "object_name": f"raw/sprint_results.parquet",
-            "local_file": f"{path_to_local_home}/{csv_folder_name}/sprint_results.parquet",
+            "service_url": MART_SERVICE_URL,
         },
     )
 
-    local_to_gcs_status = PythonOperator(
-        task_id="local_to_gcs_status",
-        python_callable=upload_to_gcs,
+    pipeline_metrics = PythonOperator(
+        task_id="pipeline_metrics",
+        python_callable=collect_pipeline_metrics,
+        trigger_rule="all_done",
         op_kwargs={
-            "bucket": BUCKET,
-            "object_name": f"raw/status.parquet",
-            "local_file": f"{path_to_local_home}/{csv_folder_name}/status.parquet",
-        },
-    )
-
-    bigquery_external_table_circuits = BigQueryCreateExternalTableOperator(
-        task_id="bigquery_external_table_circuits",
-        table_resource={
-            "tableReference": {
-                "projectId": PROJECT_ID,
-                "datasetId": BIGQUERY_DATASET,
-                "tableId": "external_table_circuits",
-            },
-            "externalDataConfiguration": {
-                "sourceFormat": "PARQUET",
-                "sourceUris": [f"gs://{BUCKET}/raw/circuits.parquet"],
-            },
-        },
-    )
-
-    bigquery_external_table_constructor_results = BigQueryCreateExternalTableOperator(
-        task_id="bigquery_external_table_constructor_results",
-        table_resource={
-            "tableReference": {
-                "projectId": PROJECT_ID,
-                "datasetId": BIGQUERY_DATASET,
-                "tableId": "external_table_constructor_results",
-            },
-            "externalDataConfiguration": {
-                "sourceFormat": "PARQUET",
-                "sourceUris": [f"gs://{BUCKET}/raw/constructor_results.parquet"],
-            },
-        },
-    )
-
-    bigquery_external_table_constructor_standings = BigQueryCreateExternalTableOperator(
-        task_id="bigquery_external_table_constructor_standings",
-        table_resource={
-            "tableReference": {
-                "projectId": PROJECT_ID,
-                "datasetId": BIGQUERY_DATASET,
-                "tableId": "external_table_constructor_standings",
-            },
-            "externalDataConfiguration": {
-                "sourceFormat": "PARQUET",
-                "sourceUris": [f"gs://{BUCKET}/raw/constructor_standings.parquet"],
-            },
-        },
-    )
-
-    bigquery_external_table_constructors = BigQueryCreateExternalTableOperator(
-        task_id="bigquery_external_table_constructors",
-        table_resource={
-            "tableReference": {
-                "projectId": PROJECT_ID,
-                "datasetId": BIGQUERY_DATASET,
-                "tableId": "external_table_constructors",
-            },
-            "externalDataConfiguration": {
-                "sourceFormat": "PARQUET",
-                "sourceUris": [f"gs://{BUCKET}/raw/constructors.parquet"],
-            },
-        },
-    )
-
-    bigquery_external_table_driver_standings = BigQueryCreateExternalTableOperator(
-        task_id="bigquery_external_table_driver_standings",
-        table_resource={
-            "tableReference": {
-                "projectId": PROJECT_ID,
-                "datasetId": BIGQUERY_DATASET,
-                "tableId": "external_table_driver_standings",
-            },
-            "externalDataConfiguration": {
-                "sourceFormat": "PARQUET",
-                "sourceUris": [f"gs://{BUCKET}/raw/driver_standings.parquet"],
-            },
-        },
-    )
-
-    bigquery_external_table_drivers = BigQueryCreateExternalTableOperator(
-        task_id="bigquery_external_table_drivers",
-        table_resource={
-            "tableReference": {
-                "projectId": PROJECT_ID,
-                "datasetId": BIGQUERY_DATASET,
-                "tableId": "external_table_drivers",
-            },
-            "externalDataConfiguration": {
-                "sourceFormat": "PARQUET",
-                "sourceUris": [f"gs://{BUCKET}/raw/drivers.parquet"],
-            },
+            "table_task_ids": table_task_ids,
         },
     )
 
-    bigquery_external_table_lap_times = BigQueryCreateExternalTableOperator(
-        task_id="bigquery_external_table_lap_times",
-        table_resource={
-            "tableReference": {
-                "projectId": PROJECT_ID,
-                "datasetId": BIGQUERY_DATASET,
-                "tableId": "external_table_lap_times",
-            },
-            "externalDataConfiguration": {
-                "sourceFormat": "PARQUET",
-                "sourceUris": [f"gs://{BUCKET}/raw/lap_times.parquet"],
-            },
-        },
-    )
-
-    bigquery_external_table_pit_stops = BigQueryCreateExternalTableOperator(
-        task_id="bigquery_external_table_pit_stops",
-        table_resource={
-            "tableReference": {
-                "projectId": PROJECT_ID,
-                "datasetId": BIGQUERY_DATASET,
-                "tableId": "external_table_pit_stops",
-            },
-            "externalDataConfiguration": {
-                "sourceFormat": "PARQUET",
-                "sourceUris": [f"gs://{BUCKET}/raw/pit_stops.parquet"],
-            },
-        },
-    )
+    csv_source_task >> table_groups >> update_tables_manifest
+    update_tables_manifest >> cleanup
+    cleanup >> dbt_transformations >> refresh_mart >> pipeline_metrics
 
-    bigquery_external_table_qualifying = BigQueryCreateExternalTableOperator(
-        task_id="bigquery_external_table_qualifying",
-        table_resource={
-            "tableReference": {
-                "projectId": PROJECT_ID,
-                "datasetId": BIGQUERY_DATASET,
-                "tableId": "external_table_qualifying",
-            },
-            "externalDataConfiguration": {
-                "sourceFormat": "PARQUET",
-                "sourceUris": [f"gs://{BUCKET}/raw/qualifying.parquet"],
-            },
-        },
-    )
-
-    bigquery_external_table_races = BigQueryCreateExternalTableOperator(
-        task_id="bigquery_external_table_races",
-        table_resource={
-            "tableReference": {
-                "projectId": PROJECT_ID,
-                "datasetId": BIGQUERY_DATASET,
-                "tableId": "external_table_races",
-            },
-            "externalDataConfiguration": {
-                "sourceFormat": "PARQUET",
-                "sourceUris": [f"gs://{BUCKET}/raw/races.parquet"],
-            },
-        },
-    )
-
-    bigquery_external_table_results = BigQueryCreateExternalTableOperator(
-        task_id="bigquery_external_table_results",
-        table_resource={
-            "tableReference": {
-                "projectId": PROJECT_ID,
-                "datasetId": BIGQUERY_DATASET,
-                "tableId": "external_table_results",
-            },
-            "externalDataConfiguration": {
-                "sourceFormat": "PARQUET",
-                "sourceUris": [f"gs://{BUCKET}/raw/results.parquet"],
-            },
-        },
-    )
 
-    bigquery_external_table_seasons = BigQueryCreateExternalTableOperator(
-        task_id="bigquery_external_table_seasons",
-        table_resource={
-            "tableReference": {
-                "projectId": PROJECT_ID,
-                "datasetId": BIGQUERY_DATASET,
-                "tableId": "external_table_seasons",
-            },
-            "externalDataConfiguration": {
-                "sourceFormat": "PARQUET",
-                "sourceUris": [f"gs://{BUCKET}/raw/seasons.parquet"],
-            },
-        },
-    )
+with DAG(
+    dag_id="f1_backfill_dag",
+    schedule_interval=None,
+    default_args=default_args,
+    catchup=False,
+    max_active_runs=BACKFILL_MAX_RUNS,
+    params={"snapshot_url": "", "version": "", "prefix": BACKFILL_PREFIX, "dataset": ""},
+    tags=['dtc-de'],
+) as backfill_dag:
 
-    bigquery_external_table_sprint_results = BigQueryCreateExternalTableOperator(
-        task_id="bigquery_external_table_sprint_results",
-        table_resource={
-            "tableReference": {
-                "projectId": PROJECT_ID,
-                "datasetId": BIGQUERY_DATASET,
-                "tableId": "external_table_sprint_results",
-            },
-            "externalDataConfiguration": {
-                "sourceFormat": "PARQUET",
-                "sourceUris": [f"gs://{BUCKET}/raw/sprint_results.parquet"],
-            },
+    backfill_snapshot_task = PythonOperator(
+        task_id="backfill_snapshot",
+        python_callable=backfill_snapshot,
+        pool=BACKFILL_POOL,
+        op_kwargs={
+            "url": "{{ params.snapshot_url }}",
+            "version": "{{ params.version }}",
+            "bucket": BUCKET,
+            "prefix": "{{ params.prefix }}",
         },
     )
 
-    bigquery_external_table_status = BigQueryCreateExternalTableOperator(
-        task_id="bigquery_external_table_status",
-        table_resource={
-            "tableReference": {
-                "projectId": PROJECT_ID,
-                "datasetId": BIGQUERY_DATASET,
-                "tableId": "external_table_status",
-            },
-            "externalDataConfiguration": {
-                "sourceFormat": "PARQUET",
-                "sourceUris": [f"gs://{BUCKET}/raw/status.parquet"],
-            },
+    backfill_tables_task = PythonOperator(
+        task_id="backfill_bigquery_tables",
+        python_callable=create_backfill_tables,
+        op_kwargs={
+            "bucket": BUCKET,
+            "version": "{{ params.version }}",
+            "prefix": "{{ params.prefix }}",
+            "dataset": "{{ params.dataset }}",
         },
     )
 
-    
-    cleanup = BashOperator(
-        task_id="cleanup",
-        bash_command=f"rm -r {path_to_local_home}/{csv_folder_name}/"
-    )
-
-
-    dbt_transformations = getDbtApiOperator('dbt_transformations', dbt_job_id)
-
-    download_dataset_task >> unzip_files
-    unzip_files >> format_to_parquet_circuits >> local_to_gcs_circuits >> bigquery_external_table_circuits >> cleanup
-    unzip_files >> format_to_parquet_constructor_results >> local_to_gcs_constructor_results >> bigquery_external_table_constructor_results >> cleanup
-    unzip_files >> format_to_parquet_constructor_standings >> local_to_gcs_constructor_standings >> bigquery_external_table_constructor_standings >> cleanup
-    unzip_files >> format_to_parquet_constructors >> local_to_gcs_constructors >> bigquery_external_table_constructors >> cleanup
-    unzip_files >> format_to_parquet_driver_standings >> local_to_gcs_driver_standings >> bigquery_external_table_driver_standings >> cleanup
-    unzip_files >> format_to_parquet_drivers >> local_to_gcs_drivers >> bigquery_external_table_drivers >> cleanup
-    unzip_files >> format_to_parquet_lap_times >> local_to_gcs_lap_times >> bigquery_external_table_lap_times >> cleanup
-    unzip_files >> format_to_parquet_pit_stops >> local_to_gcs_pit_stops >> bigquery_external_table_pit_stops >> cleanup
-    unzip_files >> format_to_parquet_qualifying >> local_to_gcs_qualifying >> bigquery_external_table_qualifying >> cleanup
-    unzip_files >> format_to_parquet_races >> local_to_gcs_races >> bigquery_external_table_races >> cleanup
-    unzip_files >> format_to_parquet_results >> local_to_gcs_results >> bigquery_external_table_results >> cleanup
-    unzip_files >> format_to_parquet_seasons >> local_to_gcs_seasons >> bigquery_external_table_seasons >> cleanup
-    unzip_files >> format_to_parquet_sprint_results >> local_to_gcs_sprint_results >> bigquery_external_table_sprint_results >> cleanup
-    unzip_files >> format_to_parquet_status >> local_to_gcs_status >> bigquery_external_table_status >> cleanup
-    cleanup >> dbt_transformations
-    
+    backfill_snapshot_task >> backfill_tables_task
@@ -0,0 +1,112 @@
+import os
+import logging
+
+# "fail" fails the conversion task of a table whose checks fail, "warn" only reports them, "off" skips them
+DATA_QUALITY = os.environ.get("DATA_QUALITY", "warn")
+
+
+class DataQualityError(ValueError):
+    pass
+
+
+class TableChecker:
+    """
+    Checks every record batch of a table while it is converted, with Arrow compute kernels only:
+    key columns not null and unique, foreign keys present in their dimension table,
+    values in range, and the column layout unchanged since the last loaded archive.
+    Only the key columns are kept until the end of the table, for the uniqueness check.
+    """
+
+    def __init__(self, table, checks, key_sets=None, columns=None, previous_columns=None):
+        """
+        :param table: table name
+        :param checks: f1_tables CHECKS entry of the table
+        :param key_sets: dimension table name -> Arrow array of its keys, for the foreign key checks
+        :param columns: CSV layout of the table, see get_table_fingerprints
+        :param previous_columns: CSV layout of the table in the last loaded archive, None if unknown
+        """
+        self.table = table
+        self.key = checks.get("key") or []
+        self.references = checks.get("references") or {}
+        self.ranges = checks.get("ranges") or {}
+        self.key_sets = key_sets or {}
+        self.columns = columns
+        self.previous_columns = previous_columns
+        self.rows = 0
+        self.key_batches = []
+        self.failures = {}
+        self.result = None
+
+    def add_failures(self, check, column, count):
+        if count:
+            name = (check, column)
+            self.failures[name] = self.failures.get(name, 0) + count
+
+    def check_batch(self, batch):
+        import pyarrow as pa
+        import pyarrow.compute as pc
+
+        self.rows += batch.num_rows
+        for column in self.key:
+            self.add_failures("not_null", column, batch.column(column).null_count)
+        if self.key:
+            self.key_batches.append(pa.RecordBatch.from_arrays([batch.column(column) for column in self.key],
+                                                               names=self.key))
+        for column, dimension in self.references.items():
+            values = batch.column(column)
+            # Null foreign keys are allowed, only the keys missing from the dimension table are orphans
+            orphans = pc.and_(pc.is_valid(values), pc.invert(pc.is_in(values, value_set=self.key_sets[dimension])))
+            self.add_failures(f"references {dimension}", column, pc.sum(orphans).as_py() or 0)
+        for column, (minimum, maximum) in self.ranges.items():
+            if column not in batch.schema.names:
+                continue
+            values = batch.column(column)
+            if minimum is not None:
+                self.add_failures(f">= {minimum}", column, pc.sum(pc.less(values, minimum)).as_py() or 0)
+            if maximum is not None:
+                self.add_failures(f"<= {maximum}", column, pc.sum(pc.greater(values, maximum)).as_py() or 0)
+
+    def check_unique(self):
+        import pyarrow as pa
+
+        if not self.key_batches:
+            return
+        keys = pa.Table.from_batches(self.key_batches)
+        distinct = keys.group_by(self.key).aggregate([]).num_rows
+        self.add_failures("unique", ",".join(self.key), keys.num_rows - distinct)
+        self.key_batches = []
+
+    def report(self):
+        """
+        Finishes the checks after the last batch
+        :return: per-table report, failed checks with the number of failing rows
+        """
+        if self.result is not None:
+            return self.result
+        self.check_unique()
+        if self.previous_columns is not None and self.columns is not None and self.columns != self.previous_columns:
+            self.add_failures("column_layout", f"{self.previous_columns} -> {self.columns}", 1)
+        self.result = {
+            "table": self.table,
+            "rows": self.rows,
+            "passed": not self.failures,
+            "failures": [{"check": check, "column": column, "rows": count}
+                         for (check, column), count in sorted(self.failures.items())],
+        }
+        return self.result
+
+
+def enforce(report, mode=DATA_QUALITY):
+    """
+    :param report: TableChecker report
+    :param mode: "fail" raises on failed checks, "warn" logs them
+    :return:
+    """
+    if report["passed"]:
+        logging.info(f"Data quality checks of {report['table']} passed on {report['rows']} rows")
+        return
+    failures = "; ".join(f"{failure['check']} {failure['column']}: {failure['rows']} rows"
+                         for failure in report["failures"])
+    if mode == "fail":
+        raise DataQualityError(f"Data quality checks of {report['table']} failed: {failures}")
+    logging.warning(f"Data quality checks of {report['table']} failed: {failures}")
@@ -0,0 +1,84 @@
+import os
+import json
+import logging
+
+import requests
+
+DOWNLOAD_CHUNK_SIZE = 1024 * 1024  # 1 MB
+
+
+def read_validators(meta_file):
+    """
+    :param meta_file: path & file-name of the saved validators
+    :return: ETag and Last-Modified saved for a download, empty if there are none
+    """
+    if not os.path.exists(meta_file):
+        return {}
+    with open(meta_file) as f:
+        return json.load(f)
+
+
+def write_validators(meta_file, response):
+    """
+    Saves the ETag and Last-Modified of a response to revalidate or resume the download later
+    :param meta_file: path & file-name of the saved validators
+    :param response: download response
+    :return:
+    """
+    with open(meta_file, 'w') as f:
+        json.dump({
+            'etag': response.headers.get('ETag'),
+            'last_modified': response.headers.get('Last-Modified'),
+        }, f)
+
+
+def download_dataset(url, dest_file, timeout=60):
+    """
+    Downloads url to dest_file, keeping dest_file as a local cache.
+    The cached file is revalidated with If-None-Match/If-Modified-Since,
+    an interrupted download is continued with a Range request.
+    :param url: dataset url
+    :param dest_file: target path & file-name
+    :param timeout: seconds to wait for the server
+    :return: True if dest_file was downloaded, False if the cached file is not modified
+    """
+    meta_file = f"{dest_file}.meta.json"
+    part_file = f"{dest_file}.part"
+    part_meta_file = f"{part_file}.meta.json"
+
+    headers = {}
+    cached = read_validators(meta_file) if os.path.exists(dest_file) else {}
+    if cached.get('etag'):
+        headers['If-None-Match'] = cached['etag']
+    if cached.get('last_modified'):
+        headers['If-Modified-Since'] = cached['last_modified']
+
+    partial = read_validators(part_meta_file) if os.path.exists(part_file) else {}
+    if partial.get('etag') or partial.get('last_modified'):
+        headers['Range'] = f"bytes={os.path.getsize(part_file)}-"
+        headers['If-Range'] = partial.get('etag') or partial['last_modified']
+
+    with requests.get(url, headers=headers, stream=True, timeout=timeout) as response:
+        if response.status_code == 304:
+            logging.info(f"{url} is not modified since the cached download")
+            return False
+        if response.status_code == 416:
+            logging.warning(f"Partial download of {url} can`t be continued, starting over")
+            os.remove(part_file)
+            os.remove(part_meta_file)
+            return download_dataset(url, dest_file, timeout)
+        response.raise_for_status()
+
+        if response.status_code == 206:
+            logging.info(f"Resuming download of {url} from byte {os.path.getsize(part_file)}")
+            mode = 'ab'
+        else:
+            mode = 'wb'
+            write_validators(part_meta_file, response)
+        with open(part_file, mode) as f:
+            for chunk in response.iter_content(DOWNLOAD_CHUNK_SIZE):
+                f.write(chunk)
+
+    os.replace(part_file, dest_file)
+    os.replace(part_meta_file, meta_file)
+    return True
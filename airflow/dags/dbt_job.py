@@ -0,0 +1,166 @@
+import json
+import asyncio
+import logging
+import datetime
+import subprocess
+
+from airflow.exceptions import AirflowException
+from airflow.models import BaseOperator
+from airflow.triggers.base import BaseTrigger, TriggerEvent
+
+# dbt Cloud run statuses
+# Ref: https://docs.getdbt.com/dbt-cloud/api-v2#operation/getRunById
+DBT_RUN_SUCCESS = 10
+DBT_RUN_ERROR = 20
+DBT_RUN_CANCELLED = 30
+
+
+def get_dbt_job_run_link(job_id, account_id):
+    return 'accounts/{0}/jobs/{1}/run/'.format(account_id, job_id)
+
+
+def get_dbt_run_link(run_id, account_id):
+    return 'accounts/{0}/runs/{1}/'.format(account_id, run_id)
+
+
+def get_dbt_headers(http_conn_id):
+    """
+    The dbt Cloud API token is the password of the connection, so it is kept out of the DAG and the trigger table
+    :param http_conn_id: connection to the dbt Cloud API
+    :return: headers of the dbt Cloud API requests
+    """
+    from airflow.hooks.base import BaseHook
+
+    headers = {'Content-Type': 'application/json'}
+    password = BaseHook.get_connection(http_conn_id).password
+    if password:
+        headers['Authorization'] = f'Token {password}'
+    return headers
+
+
+class DbtCloudRunTrigger(BaseTrigger):
+    """
+    Polls a dbt Cloud run on the triggerer until it finishes,
+    waiting poll_interval seconds between polls and doubling it up to max_poll_interval.
+    The run fails after max_failures polls in a row that can`t get its status
+    (e.g. a wrong connection, an expired token or a deleted run).
+    """
+
+    def __init__(self, run_id, account_id, http_conn_id, poll_interval=10, max_poll_interval=120, max_failures=5):
+        super().__init__()
+        self.run_id = run_id
+        self.account_id = account_id
+        self.http_conn_id = http_conn_id
+        self.poll_interval = poll_interval
+        self.max_poll_interval = max_poll_interval
+        self.max_failures = max_failures
+
+    def serialize(self):
+        return ("dbt_job.DbtCloudRunTrigger", {
+            "run_id": self.run_id,
+            "account_id": self.account_id,
+            "http_conn_id": self.http_conn_id,
+            "poll_interval": self.poll_interval,
+            "max_poll_interval": self.max_poll_interval,
+            "max_failures": self.max_failures,
+        })
+
+    def get_run_status(self):
+        from airflow.providers.http.hooks.http import HttpHook
+
+        response = HttpHook('GET', http_conn_id=self.http_conn_id).run(
+            get_dbt_run_link(self.run_id, self.account_id), headers=get_dbt_headers(self.http_conn_id))
+        return response.json()['data']['status']
+
+    async def run(self):
+        loop = asyncio.get_event_loop()
+        poll_interval = self.poll_interval
+        failures = 0
+        while True:
+            try:
+                # HttpHook is synchronous, so it is run in a thread to keep the triggerer loop free
+                status = await loop.run_in_executor(None, self.get_run_status)
+                failures = 0
+            except Exception as error:
+                failures += 1
+                self.log.warning(f"Can`t get dbt run {self.run_id} status ({failures}/{self.max_failures}): {error}")
+                if failures >= self.max_failures:
+                    yield TriggerEvent({"status": "error", "run_id": self.run_id,
+                                        "message": f"Can`t get dbt run {self.run_id} status: {error}"})
+                    return
+                status = None
+            if status == DBT_RUN_SUCCESS:
+                yield TriggerEvent({"status": "success", "run_id": self.run_id})
+                return
+            if status in (DBT_RUN_ERROR, DBT_RUN_CANCELLED):
+                yield TriggerEvent({"status": "error", "run_id": self.run_id,
+                                    "message": f"dbt run {self.run_id} finished with status {status}"})
+                return
+            await asyncio.sleep(poll_interval)
+            poll_interval = min(poll_interval * 2, self.max_poll_interval)
+
+
+class DbtJobRunOperator(BaseOperator):
+    """
+    Runs the dbt transformations and succeeds only when they are finished.
+    runner="cloud" starts a dbt Cloud job and defers polling its run to the triggerer,
+    so no worker slot is held while dbt runs, for at most run_timeout seconds.
+    runner="core" runs dbt Core on the worker.
+    """
+
+    def __init__(self, *, job_id, account_id, message='Triggered by Airflow', http_conn_id='dbt_api',
+                 headers=None, poll_interval=10, max_poll_interval=120, max_failures=5, run_timeout=6 * 60 * 60,
+                 runner='cloud', dbt_command='dbt build', project_dir=None, profiles_dir=None, **kwargs):
+        super().__init__(**kwargs)
+        self.job_id = job_id
+        self.account_id = account_id
+        self.message = message
+        self.http_conn_id = http_conn_id
+        # Extra headers of the request starting the job, the token comes from the connection
+        self.headers = headers or {}
+        self.poll_interval = poll_interval
+        self.max_poll_interval = max_poll_interval
+        self.max_failures = max_failures
+        self.run_timeout = run_timeout
+        self.runner = runner
+        self.dbt_command = dbt_command
+        self.project_dir = project_dir
+        self.profiles_dir = profiles_dir
+
+    def execute(self, context):
+        if self.runner == 'core':
+            return self.run_dbt_core()
+
+        from airflow.providers.http.hooks.http import HttpHook
+
+        response = HttpHook('POST', http_conn_id=self.http_conn_id).run(
+            get_dbt_job_run_link(self.job_id, self.account_id),
+            data=json.dumps({'cause': self.message}),
+            headers={**get_dbt_headers(self.http_conn_id), **self.headers},
+        )
+        run_id = response.json()['data']['id']
+        logging.info(f"Started dbt Cloud run {run_id} of job {self.job_id}")
+        self.defer(
+            trigger=DbtCloudRunTrigger(run_id, self.account_id, self.http_conn_id,
+                                       self.poll_interval, self.max_poll_interval, self.max_failures),
+            method_name='execute_complete',
+            timeout=datetime.timedelta(seconds=self.run_timeout),
+        )
+
+    def execute_complete(self, context, event=None):
+        if event['status'] != 'success':
+            raise AirflowException(event['message'])
+        logging.info(f"dbt Cloud run {event['run_id']} succeeded")
+        return event['run_id']
+
+    def run_dbt_core(self):
+        command = self.dbt_command.split()
+        if self.project_dir:
+            command += ['--project-dir', self.project_dir]
+        if self.profiles_dir:
+            command += ['--profiles-dir', self.profiles_dir]
+        logging.info(f"Running {' '.join(command)}")
+        process = subprocess.run(command, capture_output=True, text=True)
+        logging.info(process.stdout)
+        if process.returncode != 0:
+            raise AirflowException(f"{' '.join(command)} failed:\n{process.stderr or process.stdout}")
@@ -0,0 +1,115 @@
+# Registry of the f1db tables loaded by data_ingestion_gcs_dag.
+# Every entry generates a format_to_parquet_<name> >> local_to_gcs_<name> >> bigquery_external_table_<name> chain.
+#   name         - table name, used in task ids, object names and external table names
+#   member       - CSV file name in f1db_csv.zip
+#   schema       - Parquet column types (see the type names below), columns that are not listed are inferred from the CSV
+#   partitioning - "year" to write the table as raw/<name>/year=YYYY/ Hive partitions (year is looked up
+#                  in races by raceId) when HIVE_PARTITIONING is on, None for a single raw/<name>.parquet object
+#   clustering   - columns the native BigQuery table (BIGQUERY_LOAD_MODE=native) is clustered by
+#   priority     - priority_weight of the table tasks, the largest tables start first
+
+# Type names: int8, int16, int32, float32, float64, string, dictionary (dictionary encoded string), date32, time32.
+# \N in the CSVs is read as null, so nullable numeric columns keep their numeric type.
+CIRCUITS_SCHEMA = {
+    "circuitId": "int16", "circuitRef": "string", "name": "string", "location": "string",
+    "country": "dictionary", "lat": "float64", "lng": "float64", "alt": "int16", "url": "string",
+}
+CONSTRUCTOR_RESULTS_SCHEMA = {
+    "constructorResultsId": "int32", "raceId": "int32", "constructorId": "int32",
+    "points": "float32", "status": "dictionary",
+}
+STANDINGS_SCHEMA = {
+    "raceId": "int32", "points": "float32", "position": "int8", "positionText": "dictionary", "wins": "int16",
+}
+CONSTRUCTOR_STANDINGS_SCHEMA = dict(STANDINGS_SCHEMA, constructorStandingsId="int32", constructorId="int32")
+DRIVER_STANDINGS_SCHEMA = dict(STANDINGS_SCHEMA, driverStandingsId="int32", driverId="int32")
+CONSTRUCTORS_SCHEMA = {
+    "constructorId": "int32", "constructorRef": "string", "name": "string", "nationality": "dictionary",
+    "url": "string",
+}
+DRIVERS_SCHEMA = {
+    "driverId": "int32", "driverRef": "string", "number": "int16", "code": "string", "forename": "string",
+    "surname": "string", "dob": "date32", "nationality": "dictionary", "url": "string",
+}
+LAP_TIMES_SCHEMA = {
+    "raceId": "int32", "driverId": "int32", "lap": "int16", "position": "int8", "time": "string",
+    "milliseconds": "int32",
+}
+PIT_STOPS_SCHEMA = {
+    "raceId": "int32", "driverId": "int32", "stop": "int8", "lap": "int16", "time": "time32",
+    "duration": "string", "milliseconds": "int32",
+}
+QUALIFYING_SCHEMA = {
+    "qualifyId": "int32", "raceId": "int32", "driverId": "int32", "constructorId": "int32", "number": "int16",
+    "position": "int8", "q1": "string", "q2": "string", "q3": "string",
+}
+RACES_SCHEMA = {
+    "raceId": "int32", "year": "int16", "round": "int8", "circuitId": "int16", "name": "dictionary",
+    "date": "date32", "time": "time32", "url": "string",
+    "fp1_date": "date32", "fp1_time": "time32", "fp2_date": "date32", "fp2_time": "time32",
+    "fp3_date": "date32", "fp3_time": "time32", "quali_date": "date32", "quali_time": "time32",
+    "sprint_date": "date32", "sprint_time": "time32",
+}
+RESULTS_SCHEMA = {
+    "resultId": "int32", "raceId": "int32", "driverId": "int32", "constructorId": "int32", "number": "int16",
+    "grid": "int8", "position": "int8", "positionText": "dictionary", "positionOrder": "int8",
+    "points": "float32", "laps": "int16", "time": "string", "milliseconds": "int32", "fastestLap": "int16",
+    "rank": "int8", "fastestLapTime": "string", "fastestLapSpeed": "float32", "statusId": "int16",
+}
+SEASONS_SCHEMA = {"year": "int16", "url": "string"}
+STATUS_SCHEMA = {"statusId": "int16", "status": "dictionary"}
+
+TABLES = [
+    {"name": "lap_times", "member": "lap_times.csv", "schema": LAP_TIMES_SCHEMA, "partitioning": "year", "clustering": ["raceId", "driverId"], "priority": 10},
+    {"name": "results", "member": "results.csv", "schema": RESULTS_SCHEMA, "partitioning": "year", "clustering": ["raceId", "constructorId"], "priority": 8},
+    {"name": "driver_standings", "member": "driver_standings.csv", "schema": DRIVER_STANDINGS_SCHEMA, "partitioning": None, "clustering": ["raceId", "driverId"], "priority": 6},
+    {"name": "qualifying", "member": "qualifying.csv", "schema": QUALIFYING_SCHEMA, "partitioning": "year", "clustering": ["raceId", "constructorId"], "priority": 5},
+    {"name": "constructor_results", "member": "constructor_results.csv", "schema": CONSTRUCTOR_RESULTS_SCHEMA, "partitioning": "year", "clustering": ["raceId", "constructorId"], "priority": 5},
+    {"name": "constructor_standings", "member": "constructor_standings.csv", "schema": CONSTRUCTOR_STANDINGS_SCHEMA, "partitioning": None, "clustering": ["raceId", "constructorId"], "priority": 5},
+    {"name": "pit_stops", "member": "pit_stops.csv", "schema": PIT_STOPS_SCHEMA, "partitioning": "year", "clustering": ["raceId", "driverId"], "priority": 4},
+    {"name": "sprint_results", "member": "sprint_results.csv", "schema": RESULTS_SCHEMA, "partitioning": None, "clustering": ["raceId", "constructorId"], "priority": 2},
+    {"name": "races", "member": "races.csv", "schema": RACES_SCHEMA, "partitioning": None, "clustering": ["year"], "priority": 2},
+    {"name": "drivers", "member": "drivers.csv", "schema": DRIVERS_SCHEMA, "partitioning": None, "clustering": None, "priority": 1},
+    {"name": "constructors", "member": "constructors.csv", "schema": CONSTRUCTORS_SCHEMA, "partitioning": None, "clustering": None, "priority": 1},
+    {"name": "circuits", "member": "circuits.csv", "schema": CIRCUITS_SCHEMA, "partitioning": None, "clustering": None, "priority": 1},
+    {"name": "seasons", "member": "seasons.csv", "schema": SEASONS_SCHEMA, "partitioning": None, "clustering": None, "priority": 1},
+    {"name": "status", "member": "status.csv", "schema": STATUS_SCHEMA, "partitioning": None, "clustering": None, "priority": 1},
+]
+
+# Data quality checks run on every batch while the table is converted (see data_quality.TableChecker):
+#   key        - columns that are not null and unique together
+#   references - foreign key column -> dimension table whose key it has to be in, null keys are allowed
+#   ranges     - column -> (minimum, maximum), None for an open bound
+CHECKS = {
+    "circuits": {"key": ["circuitId"]},
+    "constructors": {"key": ["constructorId"]},
+    "drivers": {"key": ["driverId"]},
+    "seasons": {"key": ["year"], "ranges": {"year": (1950, 2100)}},
+    "status": {"key": ["statusId"]},
+    "races": {"key": ["raceId"], "references": {"circuitId": "circuits"},
+              "ranges": {"year": (1950, 2100), "round": (1, None)}},
+    "results": {"key": ["resultId"],
+                "references": {"raceId": "races", "driverId": "drivers", "constructorId": "constructors",
+                               "statusId": "status"},
+                "ranges": {"points": (0, None), "position": (1, None), "positionOrder": (1, None), "laps": (0, None)}},
+    "sprint_results": {"key": ["resultId"],
+                       "references": {"raceId": "races", "driverId": "drivers", "constructorId": "constructors",
+                                      "statusId": "status"},
+                       "ranges": {"points": (0, None), "position": (1, None)}},
+    "constructor_results": {"key": ["constructorResultsId"],
+                            "references": {"raceId": "races", "constructorId": "constructors"},
+                            "ranges": {"points": (0, None)}},
+    "constructor_standings": {"key": ["constructorStandingsId"],
+                              "references": {"raceId": "races", "constructorId": "constructors"},
+                              "ranges": {"points": (0, None), "position": (1, None), "wins": (0, None)}},
+    "driver_standings": {"key": ["driverStandingsId"],
+                         "references": {"raceId": "races", "driverId": "drivers"},
+                         "ranges": {"points": (0, None), "position": (1, None), "wins": (0, None)}},
+    "qualifying": {"key": ["qualifyId"],
+                   "references": {"raceId": "races", "driverId": "drivers", "constructorId": "constructors"},
+                   "ranges": {"position": (1, None)}},
+    "lap_times": {"key": ["raceId", "driverId", "lap"], "references": {"raceId": "races", "driverId": "drivers"},
+                  "ranges": {"lap": (1, None), "position": (1, None), "milliseconds": (0, None)}},
+    "pit_stops": {"key": ["raceId", "driverId", "stop"], "references": {"raceId": "races", "driverId": "drivers"},
+                  "ranges": {"stop": (1, None), "lap": (1, None), "milliseconds": (0, None)}},
+}
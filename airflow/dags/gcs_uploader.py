@@ -0,0 +1,351 @@
+import os
+import math
+import time
+import base64
+import hashlib
+import logging
+import tempfile
+import functools
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+import google_crc32c
+from google.cloud import storage
+
+# Chunk of a resumable upload, must be a multiple of 256 KB.
+# 5 MB chunks keep every request short enough on a 800 kbps upload speed
+# (Ref: https://github.com/googleapis/python-storage/issues/74)
+UPLOAD_CHUNK_SIZE = int(os.environ.get("GCS_UPLOAD_CHUNK_SIZE", 5 * 1024 * 1024))  # 5 MB
+UPLOAD_CHUNK_ALIGNMENT = 256 * 1024
+# Files from this size are uploaded as parallel slices composed into one object
+SLICED_UPLOAD_THRESHOLD = int(os.environ.get("GCS_SLICED_UPLOAD_THRESHOLD", 64 * 1024 * 1024))  # 64 MB
+SLICED_UPLOAD_SLICES = int(os.environ.get("GCS_SLICED_UPLOAD_SLICES", 8))
+UPLOAD_RETRIES = int(os.environ.get("GCS_UPLOAD_RETRIES", 5))
+# Seconds to connect and to wait for each response of a resumable upload request,
+# a stalled connection fails the request and is retried from the last persisted byte
+UPLOAD_TIMEOUT = (int(os.environ.get("GCS_UPLOAD_CONNECT_TIMEOUT", 10)),
+                  int(os.environ.get("GCS_UPLOAD_READ_TIMEOUT", 120)))
+# GCS composes at most 32 objects at once
+MAX_COMPOSE_SOURCES = 32
+# Session URIs of the unfinished resumable uploads, kept out of the folders upload_folder mirrors
+UPLOAD_SESSION_DIR = os.environ.get("GCS_UPLOAD_SESSION_DIR",
+                                    os.path.join(tempfile.gettempdir(), "gcs-upload-sessions"))
+SESSION_SUFFIX = ".upload-session"
+SLICE_SUFFIX = ".slice-"
+
+
+@functools.lru_cache(maxsize=None)
+def get_storage_client():
+    """
+    One client per worker process, so its connection pool is reused between uploads.
+    Set STORAGE_EMULATOR_HOST to work against a local fake-gcs-server.
+    """
+    return storage.Client()
+
+
+def get_crc32c(local_file, start=0, length=None):
+    """
+    :param local_file: source path & file-name
+    :param start: first byte to checksum
+    :param length: number of bytes to checksum, the rest of the file by default
+    :return: base64 encoded CRC32C, the format GCS reports it in
+    """
+    checksum = google_crc32c.Checksum()
+    remaining = os.path.getsize(local_file) - start if length is None else length
+    with open(local_file, 'rb') as f:
+        f.seek(start)
+        while remaining > 0:
+            data = f.read(min(UPLOAD_CHUNK_SIZE, remaining))
+            if not data:
+                break
+            checksum.update(data)
+            remaining -= len(data)
+    return base64.b64encode(checksum.digest()).decode('utf-8')
+
+
+def get_committed_offset(response):
+    """
+    :param response: 308 response of a resumable upload session
+    :return: number of bytes GCS already persisted
+    """
+    committed = response.headers.get('Range')
+    if not committed:
+        return 0
+    return int(committed.split('-')[-1]) + 1
+
+
+def query_session_offset(session_url, size, timeout=UPLOAD_TIMEOUT):
+    """
+    Ref: https://cloud.google.com/storage/docs/performing-resumable-uploads#status-check
+    :param session_url: resumable upload session URI
+    :param size: total upload size
+    :param timeout: (connect, read) seconds of the request
+    :return: number of bytes GCS already persisted, None if the session is gone
+    """
+    response = requests.put(session_url, headers={'Content-Range': f'bytes */{size}'}, timeout=timeout)
+    if response.status_code in (200, 201):
+        return size
+    if response.status_code == 308:
+        return get_committed_offset(response)
+    if response.status_code in (404, 410):
+        return None
+    response.raise_for_status()
+
+
+def get_session_file(blob):
+    """
+    :param blob: target blob of a resumable upload
+    :return: path & file-name of the session URI of the upload, keyed by the bucket and object name
+    """
+    key = hashlib.sha256(f"{blob.bucket.name}/{blob.name}".encode('utf-8')).hexdigest()
+    return os.path.join(UPLOAD_SESSION_DIR, f"{key}{SESSION_SUFFIX}")
+
+
+def resumable_upload(blob, local_file, chunk_size=UPLOAD_CHUNK_SIZE, retries=UPLOAD_RETRIES, timeout=UPLOAD_TIMEOUT):
+    """
+    Uploads a file chunk by chunk through a resumable session.
+    The session URI is kept in UPLOAD_SESSION_DIR (see get_session_file), so an interrupted upload
+    (e.g. a retried task) continues from the last byte GCS persisted.
+    :param blob: target blob
+    :param local_file: source path & file-name
+    :param chunk_size: bytes sent per request
+    :param retries: attempts for each chunk
+    :param timeout: (connect, read) seconds of every request
+    :return:
+    """
+    size = os.path.getsize(local_file)
+    session_file = get_session_file(blob)
+    session_url, offset = None, None
+    if os.path.exists(session_file):
+        with open(session_file) as f:
+            session_url = f.read().strip()
+        offset = query_session_offset(session_url, size, timeout)
+        if offset is not None:
+            logging.info(f"Resuming upload of {local_file} from byte {offset}")
+    if offset is None:
+        session_url = blob.create_resumable_upload_session(size=size)
+        offset = 0
+        os.makedirs(UPLOAD_SESSION_DIR, exist_ok=True)
+        with open(session_file, 'w') as f:
+            f.write(session_url)
+
+    attempt = 0
+    with open(local_file, 'rb') as f:
+        while offset < size:
+            f.seek(offset)
+            chunk = f.read(chunk_size)
+            headers = {'Content-Range': f'bytes {offset}-{offset + len(chunk) - 1}/{size}'}
+            try:
+                response = requests.put(session_url, data=chunk, headers=headers, timeout=timeout)
+                if response.status_code in (200, 201):
+                    offset = size
+                elif response.status_code == 308:
+                    offset = get_committed_offset(response)
+                    attempt = 0
+                else:
+                    response.raise_for_status()
+            except (requests.ConnectionError, requests.Timeout, requests.HTTPError) as error:
+                attempt += 1
+                if attempt > retries:
+                    raise
+                logging.warning(f"Upload of {local_file} interrupted ({error}), retry {attempt}/{retries}")
+                time.sleep(min(2 ** attempt, 30))
+                try:
+                    offset = query_session_offset(session_url, size, timeout)
+                except (requests.ConnectionError, requests.Timeout):
+                    # Still unreachable, the chunk is sent again from the last offset GCS confirmed
+                    continue
+                if offset is None:
+                    raise
+    os.remove(session_file)
+
+
+def upload_slice(bucket, object_name, local_file, start, length, chunk_size):
+    """
+    Uploads one byte range of a file as a temporary object.
+    A slice already in GCS with the same CRC32C is kept, so a retried upload only sends the missing slices.
+    :return: uploaded slice blob
+    """
+    blob = bucket.blob(object_name, chunk_size=chunk_size)
+    crc32c = get_crc32c(local_file, start, length)
+    if blob.exists():
+        blob.reload()
+        if blob.crc32c == crc32c:
+            return blob
+    with open(local_file, 'rb') as f:
+        f.seek(start)
+        blob.upload_from_file(f, size=length, checksum='crc32c')
+    return blob
+
+
+def sliced_upload(bucket, object_name, local_file, slices=SLICED_UPLOAD_SLICES, chunk_size=UPLOAD_CHUNK_SIZE):
+    """
+    Parallel composite upload: slices of the file are uploaded concurrently and composed into one object
+    Ref: https://cloud.google.com/storage/docs/parallel-composite-uploads
+    :param bucket: target bucket
+    :param object_name: target path & file-name
+    :param local_file: source path & file-name
+    :param slices: number of slices uploaded in parallel
+    :param chunk_size: bytes sent per request
+    :return:
+    """
+    size = os.path.getsize(local_file)
+    slices = max(1, min(slices, MAX_COMPOSE_SOURCES))
+    slice_size = math.ceil(size / slices)
+    ranges = [(start, min(slice_size, size - start)) for start in range(0, size, slice_size)]
+
+    with ThreadPoolExecutor(max_workers=len(ranges)) as pool:
+        parts = list(pool.map(
+            lambda item: upload_slice(bucket, f"{object_name}{SLICE_SUFFIX}{item[0]:02d}", local_file,
+                                      item[1][0], item[1][1], chunk_size),
+            enumerate(ranges),
+        ))
+    bucket.blob(object_name).compose(parts)
+    for part in parts:
+        part.delete()
+
+
+def upload_file(bucket, object_name, local_file, chunk_size=UPLOAD_CHUNK_SIZE,
+                sliced_threshold=SLICED_UPLOAD_THRESHOLD, slices=SLICED_UPLOAD_SLICES):
+    """
+    Uploads a file to GCS and verifies the CRC32C of the stored object
+    :param bucket: GCS bucket name
+    :param object_name: target path & file-name
+    :param local_file: source path & file-name
+    :param chunk_size: bytes sent per request of a resumable upload
+    :param sliced_threshold: file size from which the file is uploaded as parallel slices
+    :param slices: number of slices uploaded in parallel
+    :return: uploaded blob
+    """
+    bucket = get_storage_client().bucket(bucket)
+    size = os.path.getsize(local_file)
+    blob = bucket.blob(object_name, chunk_size=chunk_size)
+    if size >= sliced_threshold:
+        sliced_upload(bucket, object_name, local_file, slices, chunk_size)
+    elif size > chunk_size:
+        resumable_upload(blob, local_file, chunk_size)
+    else:
+        blob.upload_from_filename(local_file)
+
+    blob.reload()
+    crc32c = get_crc32c(local_file)
+    if blob.crc32c != crc32c:
+        raise ValueError(f"CRC32C of gs://{bucket.name}/{object_name} ({blob.crc32c}) "
+                         f"doesn`t match {local_file} ({crc32c})")
+    return blob
+
+
+class UploadStream:
+    """
+    Writable file object that sends what is written to a GCS object through a resumable upload session,
+    one chunk at a time, and verifies the CRC32C of the stored object on close
+    """
+
+    def __init__(self, blob, chunk_size=UPLOAD_CHUNK_SIZE):
+        self.blob = blob
+        self.writer = blob.open('wb', chunk_size=chunk_size, ignore_flush=True)
+        self.checksum = google_crc32c.Checksum()
+        self.size = 0
+        self.closed = False
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        data = bytes(data)
+        self.checksum.update(data)
+        self.size += len(data)
+        return self.writer.write(data)
+
+    def tell(self):
+        return self.size
+
+    def flush(self):
+        pass
+
+    def close(self):
+        if self.closed:
+            return
+        self.writer.close()
+        self.closed = True
+        self.blob.reload()
+        crc32c = base64.b64encode(self.checksum.digest()).decode('utf-8')
+        if self.blob.crc32c != crc32c:
+            raise ValueError(f"CRC32C of gs://{self.blob.bucket.name}/{self.blob.name} ({self.blob.crc32c}) "
+                             f"doesn`t match the written stream ({crc32c})")
+
+    def abort(self):
+        """
+        Stops writing without finishing the upload session, so the object is not created.
+        GCS drops the unfinished session after a week.
+        """
+        self.closed = True
+
+
+def get_shared_chunk_size(streams, buffer_size):
+    """
+    :param streams: upload streams open at once
+    :param buffer_size: bytes buffered by all the streams together
+    :return: chunk size of every stream, a multiple of 256 KB from 256 KB up to UPLOAD_CHUNK_SIZE
+    """
+    chunk_size = buffer_size // max(streams, 1) // UPLOAD_CHUNK_ALIGNMENT * UPLOAD_CHUNK_ALIGNMENT
+    return max(UPLOAD_CHUNK_ALIGNMENT, min(chunk_size, UPLOAD_CHUNK_SIZE))
+
+
+def open_upload_stream(bucket, object_name, chunk_size=UPLOAD_CHUNK_SIZE):
+    """
+    :param bucket: GCS bucket name
+    :param object_name: target path & file-name
+    :param chunk_size: bytes buffered and sent per request, must be a multiple of 256 KB
+    :return: UploadStream writing to the object
+    """
+    return UploadStream(get_storage_client().bucket(bucket).blob(object_name), chunk_size)
+
+
+def object_exists(bucket, object_name):
+    """
+    :param bucket: GCS bucket name
+    :param object_name: object path & file-name, or the prefix of a partitioned table
+    :return: True if the object or any object under the prefix exists
+    """
+    bucket = get_storage_client().bucket(bucket)
+    if bucket.blob(object_name).exists():
+        return True
+    return any(True for _ in bucket.list_blobs(prefix=f"{object_name.rstrip('/')}/", max_results=1))
+
+
+def upload_folder(bucket, prefix, local_folder, chunk_size=UPLOAD_CHUNK_SIZE):
+    """
+    Mirrors a local folder (e.g. year=YYYY/ partitions of a table) under a GCS prefix.
+    Files whose object already has the same CRC32C are not uploaded again,
+    objects without a local file are deleted. Upload sessions and slices of an interrupted upload
+    are neither uploaded nor deleted, they are finished by the retried upload.
+    :param bucket: GCS bucket name
+    :param prefix: target path
+    :param local_folder: source folder
+    :param chunk_size: bytes sent per request of a resumable upload
+    :return: names of the uploaded objects
+    """
+    prefix = prefix.rstrip('/')
+    local_files = {}
+    for root, _, names in os.walk(local_folder):
+        for name in names:
+            if name.endswith(SESSION_SUFFIX) or SLICE_SUFFIX in name:
+                continue
+            local_file = os.path.join(root, name)
+            local_files[f"{prefix}/{os.path.relpath(local_file, local_folder)}"] = local_file
+
+    remote_blobs = {blob.name: blob for blob in get_storage_client().bucket(bucket).list_blobs(prefix=f"{prefix}/")}
+    uploaded = []
+    for object_name, local_file in sorted(local_files.items()):
+        blob = remote_blobs.get(object_name)
+        if blob is not None and blob.crc32c == get_crc32c(local_file):
+            logging.info(f"{object_name} is unchanged, not uploading it")
+            continue
+        upload_file(bucket, object_name, local_file, chunk_size)
+        uploaded.append(object_name)
+    for object_name, blob in remote_blobs.items():
+        if object_name not in local_files and SLICE_SUFFIX not in object_name:
+            logging.info(f"Deleting {object_name}, it has no local file")
+            blob.delete()
+    return uploaded
@@ -0,0 +1,109 @@
+import os
+import json
+import time
+import logging
+import resource
+import importlib
+from contextlib import contextmanager
+
+# "statsd" sends the metrics through Airflow's StatsD client (the [metrics] section of airflow.cfg),
+# "log" only logs them, any other value is the module.function path of a custom sink taking the metrics dict
+METRICS_SINK = os.environ.get("METRICS_SINK", "statsd")
+METRICS_PREFIX = "f1_pipeline"
+NUMERIC_METRICS = [
+    "wall_seconds", "cpu_seconds", "rows", "input_bytes", "output_bytes",
+    "compression_ratio", "throughput_mb_s", "process_peak_rss_mb", "peak_rss_growth_mb",
+]
+
+
+def get_path_size(path):
+    """
+    :param path: file or folder path
+    :return: size of the file, or of every file in the folder
+    """
+    if not os.path.isdir(path):
+        return os.path.getsize(path)
+    return sum(os.path.getsize(os.path.join(root, name)) for root, _, names in os.walk(path) for name in names)
+
+
+def get_peak_rss_mb():
+    # ru_maxrss is in kilobytes on Linux
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def send_to_statsd(metrics):
+    from airflow.stats import Stats
+
+    name = f"{METRICS_PREFIX}.{metrics['stage']}.{metrics['table']}"
+    Stats.timing(f"{name}.duration", metrics["wall_seconds"] * 1000)
+    for key in NUMERIC_METRICS:
+        if metrics.get(key) is not None:
+            Stats.gauge(f"{name}.{key}", metrics[key])
+
+
+def emit_metrics(metrics, sink=None):
+    """
+    :param metrics: stage metrics, see measure_stage
+    :param sink: "statsd", "log" or module.function path of a custom sink, METRICS_SINK by default
+    :return:
+    """
+    sink = sink or METRICS_SINK
+    logging.info(f"Stage metrics: {json.dumps(metrics)}")
+    if sink == "statsd":
+        send_to_statsd(metrics)
+    elif sink != "log":
+        module_name, function_name = sink.rsplit(".", 1)
+        getattr(importlib.import_module(module_name), function_name)(metrics)
+
+
+@contextmanager
+def measure_stage(stage, table, ti=None):
+    """
+    Measures wall/CPU time and memory of a pipeline stage.
+    The stage fills rows, input_bytes and output_bytes of the yielded dict,
+    the metrics are sent to the sink and pushed to XCom under the "metrics" key, also when the stage fails:
+    error is then the exception it failed with, None otherwise.
+    process_peak_rss_mb is the peak RSS of the whole process so far, peak_rss_growth_mb how far the stage
+    raised it, 0 when the stage stayed below the peak of earlier work of the process
+    :param stage: stage name, e.g. convert or upload
+    :param table: table the stage works on
+    :param ti: current task instance
+    """
+    metrics = {"stage": stage, "table": table, "rows": None, "input_bytes": None, "output_bytes": None,
+               "error": None}
+    wall_start, cpu_start, rss_start = time.perf_counter(), time.process_time(), get_peak_rss_mb()
+    try:
+        yield metrics
+    except Exception as error:
+        metrics["error"] = f"{type(error).__name__}: {error}"
+        raise
+    finally:
+        metrics["wall_seconds"] = round(time.perf_counter() - wall_start, 3)
+        metrics["cpu_seconds"] = round(time.process_time() - cpu_start, 3)
+        rss_end = get_peak_rss_mb()
+        metrics["process_peak_rss_mb"] = round(rss_end, 1)
+        metrics["peak_rss_growth_mb"] = round(rss_end - rss_start, 1)
+        if metrics["input_bytes"] and metrics["output_bytes"]:
+            metrics["compression_ratio"] = round(metrics["input_bytes"] / metrics["output_bytes"], 2)
+        processed_bytes = metrics["output_bytes"] or metrics["input_bytes"]
+        if processed_bytes and metrics["wall_seconds"]:
+            metrics["throughput_mb_s"] = round(processed_bytes / 1024 / 1024 / metrics["wall_seconds"], 2)
+        emit_metrics(metrics)
+        if ti is not None:
+            ti.xcom_push(key="metrics", value=metrics)
+
+
+def summarize_metrics(stages):
+    """
+    :param stages: metrics pushed by the tasks of a run
+    :return: per-run summary with the stages and the totals of every stage type
+    """
+    totals = {}
+    for metrics in stages:
+        total = totals.setdefault(metrics["stage"], {"tables": 0, "failed": 0, "wall_seconds": 0, "cpu_seconds": 0,
+                                                     "rows": 0, "input_bytes": 0, "output_bytes": 0})
+        total["tables"] += 1
+        total["failed"] += 1 if metrics.get("error") else 0
+        for key in ["wall_seconds", "cpu_seconds", "rows", "input_bytes", "output_bytes"]:
+            total[key] += metrics.get(key) or 0
+    return {"stages": stages, "totals": totals}
@@ -0,0 +1,240 @@
+import os
+import time
+import shutil
+import logging
+import tempfile
+
+# "true" compares every converted table with the Parquet of the previous release before it is uploaded
+# and stores the rows inserted, updated and deleted by the release as Parquet change sets
+release_diff = os.environ.get("RELEASE_DIFF", "false").lower() == "true"
+# Change sets are kept for every release, as the audit trail of the corrections to old rows:
+# <DELTAS_PREFIX>/<table>/release=<YYYYMMDDTHHMMSS>/{insert,update,delete}.parquet
+DELTAS_PREFIX = os.environ.get("DELTAS_PREFIX", "deltas")
+CHANGE_TYPES = ["insert", "update", "delete"]
+# Suffix of the previous values of the changed columns in the update change set
+PREVIOUS_SUFFIX = "_previous"
+ROW_HASH_COLUMN = "_row_hash"
+
+
+def get_dataset(path):
+    """
+    :param path: Parquet file, or the folder of a table written as year=YYYY/ partitions
+    :return: pyarrow dataset of the table
+    """
+    import pyarrow.dataset as ds
+
+    return ds.dataset(path, format="parquet", partitioning="hive" if os.path.isdir(path) else None)
+
+
+def decode_dictionaries(table):
+    """
+    :return: the table with dictionary columns decoded, so they can be joined and compared
+    """
+    import pyarrow as pa
+
+    columns = [column.cast(column.type.value_type) if pa.types.is_dictionary(column.type) else column
+               for column in table.columns]
+    return pa.Table.from_arrays(columns, names=table.column_names)
+
+
+def quote(column):
+    return '"' + column.replace('"', '""') + '"'
+
+
+def read_row_hashes(path, key):
+    """
+    Reads the key columns of a release and a 64-bit hash of the other columns of every row,
+    a fraction of the table's memory. Two nulls hash the same.
+    :param path: Parquet file, or the folder of a table written as year=YYYY/ partitions
+    :param key: primary key columns
+    :return: table of the key columns and ROW_HASH_COLUMN
+    """
+    import duckdb
+    import pyarrow as pa
+
+    columns = [column for column in get_dataset(path).schema.names if column not in key]
+    if os.path.isdir(path):
+        source = f"read_parquet('{os.path.join(path, '**', '*.parquet')}', hive_partitioning = true)"
+    else:
+        source = f"read_parquet('{path}')"
+    row_hash = f"hash({', '.join(quote(column) for column in columns)})" if columns else "0::UBIGINT"
+    connection = duckdb.connect()
+    try:
+        result = connection.execute(f"SELECT {', '.join(quote(column) for column in key)}, "
+                                    f"{row_hash} AS {ROW_HASH_COLUMN} FROM {source}")
+        # arrow() is a table before DuckDB 1.4, a record batch reader since
+        return pa.table(result.arrow())
+    finally:
+        connection.close()
+
+
+def read_rows(path, keys):
+    """
+    Streams the release one batch at a time and keeps the rows of the given keys
+    :param path: Parquet file, or the folder of a table written as year=YYYY/ partitions
+    :param keys: table of the key columns of the rows to read
+    :return: the rows, with dictionary columns decoded
+    """
+    import pyarrow as pa
+
+    dataset = get_dataset(path)
+    key = keys.column_names
+    parts = []
+    for batch in dataset.to_batches():
+        rows = decode_dictionaries(pa.Table.from_batches([batch]))
+        parts.append(rows.join(keys.cast(rows.select(key).schema), keys=key, join_type="left semi"))
+    return pa.concat_tables(parts) if parts else decode_dictionaries(dataset.schema.empty_table())
+
+
+def get_duplicated_keys(table, key):
+    """
+    :return: number of key values that appear on more than one row
+    """
+    import pyarrow.compute as pc
+
+    counts = table.group_by(key).aggregate([([], "count_all")])
+    return pc.sum(pc.greater(counts.column("count_all"), 1).cast("int64")).as_py() or 0
+
+
+def get_changed_keys(previous, current, key):
+    """
+    Compares the row hashes of the two releases, see read_row_hashes
+    :return: (keys of the previous rows, keys of the current rows) that are deleted, inserted or changed
+    """
+    import pyarrow as pa
+    import pyarrow.compute as pc
+
+    previous = previous.cast(pa.schema([current.schema.field(column) for column in key]
+                                       + [current.schema.field(ROW_HASH_COLUMN)]))
+    both = current.join(previous, keys=key, join_type="inner", right_suffix=PREVIOUS_SUFFIX)
+    changed = both.filter(pc.not_equal(both.column(ROW_HASH_COLUMN),
+                                       both.column(f"{ROW_HASH_COLUMN}{PREVIOUS_SUFFIX}"))).select(key)
+    deleted = previous.join(current.select(key), keys=key, join_type="left anti").select(key)
+    inserted = current.join(previous.select(key), keys=key, join_type="left anti").select(key)
+    return pa.concat_tables([deleted, changed]), pa.concat_tables([inserted, changed])
+
+
+def get_changed_rows(joined, columns):
+    """
+    :param joined: inner join of the current and previous rows on the key
+    :param columns: non-key columns, the previous values are the ones with PREVIOUS_SUFFIX
+    :return: mask of the rows where any column differs, two nulls are equal
+    """
+    import pyarrow as pa
+    import pyarrow.compute as pc
+
+    changed = pa.array([False] * joined.num_rows, type=pa.bool_())
+    for column in columns:
+        current, previous = joined.column(column), joined.column(f"{column}{PREVIOUS_SUFFIX}")
+        equal = pc.or_(pc.fill_null(pc.equal(current, previous), False),
+                       pc.and_(pc.is_null(current), pc.is_null(previous)))
+        changed = pc.or_(changed, pc.invert(equal))
+    return changed
+
+
+def diff_tables(previous, current, key):
+    """
+    Hash joins the two releases of a table on its primary key
+    :param previous: table of the previous release
+    :param current: table of the current release
+    :param key: primary key columns
+    :return: change type -> rows: inserted and deleted rows as they are,
+             updated rows with the current values and the previous ones of every non-key column
+    :raise ValueError: a key value is on more than one row of a release, its rows can't be matched
+    """
+    for name, table in (("previous", previous), ("current", current)):
+        duplicated = get_duplicated_keys(table, key)
+        if duplicated:
+            raise ValueError(f"{duplicated} key values of {key} are duplicated in the {name} release")
+    previous = previous.select(current.column_names).cast(current.schema)
+    columns = [column for column in current.column_names if column not in key]
+    sort_keys = [(column, "ascending") for column in key]
+
+    updated = current.join(previous, keys=key, join_type="inner", right_suffix=PREVIOUS_SUFFIX)
+    if columns:
+        updated = updated.filter(get_changed_rows(updated, columns))
+    else:
+        updated = updated.slice(0, 0)
+    return {
+        "insert": current.join(previous.select(key), keys=key, join_type="left anti").sort_by(sort_keys),
+        "update": updated.select(current.column_names + [f"{column}{PREVIOUS_SUFFIX}" for column in columns])
+                         .sort_by(sort_keys),
+        "delete": previous.join(current.select(key), keys=key, join_type="left anti").sort_by(sort_keys),
+    }
+
+
+def download_release(bucket, object_name, local_path):
+    """
+    :param bucket: GCS bucket name
+    :param object_name: table object path & file-name, the prefix of a partitioned table
+    :param local_path: where the object, or the objects under the prefix, are downloaded to
+    :return: local path of the previous release, None if the table was never uploaded
+    """
+    from gcs_uploader import get_storage_client
+
+    gcs_bucket = get_storage_client().bucket(bucket)
+    blob = gcs_bucket.blob(object_name)
+    if blob.exists():
+        blob.download_to_filename(local_path)
+        return local_path
+    prefix = f"{object_name.rstrip('/')}/"
+    blobs = list(gcs_bucket.list_blobs(prefix=prefix))
+    for blob in blobs:
+        local_file = os.path.join(local_path, blob.name[len(prefix):])
+        os.makedirs(os.path.dirname(local_file), exist_ok=True)
+        blob.download_to_filename(local_file)
+    return local_path if blobs else None
+
+
+def diff_release(bucket, object_name, local_file, table, key, release):
+    """
+    Compares the converted table with the previous release still in GCS
+    and uploads the non-empty change sets to <DELTAS_PREFIX>/<table>/release=<release>/.
+    Only the keys and row hashes of the two releases are held in memory, the full rows are read
+    for the keys that are inserted, deleted or changed
+    :param bucket: GCS bucket name
+    :param object_name: table object path & file-name, the prefix of a partitioned table
+    :param local_file: converted table, file or folder of a partitioned table
+    :param table: table name
+    :param key: primary key columns
+    :param release: release id the change sets are stored under
+    :return: diff summary with the number of rows of every change type, None if the release is not diffed
+    """
+    import pyarrow.parquet as pq
+    from gcs_uploader import upload_file
+
+    start = time.perf_counter()
+    folder = tempfile.mkdtemp()
+    try:
+        previous_path = download_release(bucket, object_name, os.path.join(folder, "previous"))
+        if previous_path is None:
+            logging.info(f"{table} has no previous release to diff with")
+            return None
+        previous_columns, current_columns = get_dataset(previous_path).schema.names, \
+            get_dataset(local_file).schema.names
+        if set(previous_columns) != set(current_columns):
+            logging.warning(f"Column layout of {table} changed, the release is not diffed: "
+                            f"{previous_columns} -> {current_columns}")
+            return None
+        previous_hashes, current_hashes = read_row_hashes(previous_path, key), read_row_hashes(local_file, key)
+        for name, hashes in (("previous", previous_hashes), ("current", current_hashes)):
+            duplicated = get_duplicated_keys(hashes, key)
+            if duplicated:
+                logging.warning(f"{duplicated} key values of {key} are duplicated in the {name} release of {table}, "
+                                f"the release is not diffed")
+                return None
+        previous_keys, current_keys = get_changed_keys(previous_hashes, current_hashes, key)
+        changes = diff_tables(read_rows(previous_path, previous_keys), read_rows(local_file, current_keys), key)
+        for change_type, rows in changes.items():
+            if rows.num_rows == 0:
+                continue
+            delta_file = os.path.join(folder, f"{change_type}.parquet")
+            pq.write_table(rows, delta_file, compression="zstd")
+            upload_file(bucket, f"{DELTAS_PREFIX}/{table}/release={release}/{change_type}.parquet", delta_file)
+    finally:
+        shutil.rmtree(folder)
+    summary = {"table": table, "release": release, "rows": current_hashes.num_rows,
+               **{change_type: changes[change_type].num_rows for change_type in CHANGE_TYPES},
+               "wall_seconds": round(time.perf_counter() - start, 3)}
+    logging.info(f"Release diff of {table}: {summary}")
+    return summary
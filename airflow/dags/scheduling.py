@@ -0,0 +1,180 @@
+import os
+import json
+import time
+import heapq
+import logging
+import tempfile
+
+# Airflow Variable with the duration history of the table tasks, updated by the pipeline_metrics task
+HISTORY_VARIABLE = "f1_task_history"
+# Local read-only copy of the history the priorities are read from when the DAG is parsed, refreshed from
+# the Variable at most every TASK_HISTORY_CACHE_SECONDS, so parsing seldom reads the metadata database.
+# Kept out of the DAG folder (read-only or synced on most deployments), every host keeps its own copy.
+# The durations are rounded to two significant digits, so the serialized DAG only changes
+# when a chain gets noticeably slower or faster
+HISTORY_FILE = os.environ.get("TASK_HISTORY_FILE", os.path.join(tempfile.gettempdir(), "f1_task_history.json"))
+HISTORY_CACHE_SECONDS = int(os.environ.get("TASK_HISTORY_CACHE_SECONDS", 3600))
+# Weight of the latest run in the moving average of a task duration
+HISTORY_ALPHA = 0.5
+# Pool of the tasks that upload to GCS, created by airflow-init with
+# UPLOAD_SLOTS_PER_WORKER * CELERY_WORKERS slots, so every worker runs about that many uploads at once
+UPLOAD_POOL = os.environ.get("UPLOAD_POOL", "default_pool")
+UPLOAD_POOL_SLOTS = int(os.environ.get("UPLOAD_SLOTS_PER_WORKER", 2)) * int(os.environ.get("CELERY_WORKERS", 1))
+# Task slots the expected makespan is estimated for, the worker concurrency of all workers
+SCHEDULING_SLOTS = (int(os.environ.get("AIRFLOW__CELERY__WORKER_CONCURRENCY", 16))
+                    * int(os.environ.get("CELERY_WORKERS", 1)))
+
+
+def read_history():
+    """
+    Read by the pipeline_metrics task, a missing Variable or metadata database gives an empty history
+    :return: task_id -> {"duration": seconds, "input_bytes": bytes}
+    """
+    try:
+        from airflow.models import Variable
+
+        return Variable.get(HISTORY_VARIABLE, default_var={}, deserialize_json=True)
+    except Exception as error:
+        logging.warning(f"Can`t read the task history: {error}")
+        return {}
+
+
+def update_history(history, durations, input_bytes=None, alpha=HISTORY_ALPHA):
+    """
+    :param history: task history, see read_history
+    :param durations: task_id -> seconds of the run
+    :param input_bytes: task_id -> bytes the task read in the run
+    :param alpha: weight of the run in the moving average
+    :return: updated task history
+    """
+    history = {task_id: dict(entry) for task_id, entry in history.items()}
+    for task_id, duration in durations.items():
+        entry = history.setdefault(task_id, {})
+        previous = entry.get("duration")
+        entry["duration"] = round(duration if previous is None else alpha * duration + (1 - alpha) * previous, 3)
+        if input_bytes and input_bytes.get(task_id) is not None:
+            entry["input_bytes"] = input_bytes[task_id]
+    return history
+
+
+def read_history_file(path):
+    """
+    :param path: history file written by read_cached_history
+    :return: task_id -> {"duration": seconds}, empty if the file is missing or unreadable
+    """
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def write_history_file(history, path):
+    """
+    :param history: task history, see read_history
+    :param path: history file, rewritten only when a rounded duration changed
+    :return: task_id -> {"duration": seconds rounded to two significant digits}
+    """
+    cached = {task_id: {"duration": float(f"{entry['duration']:.2g}")}
+              for task_id, entry in history.items() if entry.get("duration") is not None}
+    try:
+        if cached == read_history_file(path):
+            # Fresh again, with the same content
+            os.utime(path)
+            return cached
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # Replaced in one step, so the DAG is never parsed with half a file, by any of the parsing processes
+        with open(f"{path}.{os.getpid()}.tmp", "w") as f:
+            json.dump(cached, f, indent=2, sort_keys=True)
+        os.replace(f"{path}.{os.getpid()}.tmp", path)
+    except OSError as error:
+        logging.warning(f"Can`t write the task history file: {error}")
+    return cached
+
+
+def read_cached_history(path=HISTORY_FILE, max_age=HISTORY_CACHE_SECONDS):
+    """
+    Read when the DAG is parsed: the local copy of the history Variable, read again from the Variable once
+    it is older than max_age. Without the Variable the stale copy is kept, without both the static priorities
+    :param path: local history file
+    :param max_age: seconds the file is read without reading the Variable
+    :return: task_id -> {"duration": seconds}
+    """
+    try:
+        if time.time() - os.path.getmtime(path) < max_age:
+            return read_history_file(path)
+    except OSError:
+        pass
+    try:
+        from airflow.models import Variable
+
+        history = Variable.get(HISTORY_VARIABLE, deserialize_json=True)
+    except Exception as error:
+        # A missing Variable (no run yet) is a KeyError
+        logging.info(f"Task history not read: {error!r}")
+        return read_history_file(path)
+    return write_history_file(history, path)
+
+
+def save_history(history):
+    """
+    :param history: task history, see read_history. Saved in the Variable only,
+                    the hosts parsing the DAG read it into their own copy, see read_cached_history
+    """
+    from airflow.models import Variable
+
+    Variable.set(HISTORY_VARIABLE, history, serialize_json=True)
+
+
+def get_chain_weights(task_ids, history, default_weight):
+    """
+    Critical-path priorities: a task weighs the expected seconds from its start to the end of its chain,
+    so the chains that set the makespan start first. Without history the static weight is used for every task.
+    :param task_ids: tasks of one chain, in order
+    :param history: task history, see read_history
+    :param default_weight: static priority of the chain
+    :return: task_id -> priority_weight
+    """
+    durations = [history.get(task_id, {}).get("duration") for task_id in task_ids]
+    if any(duration is None for duration in durations):
+        return {task_id: default_weight * (len(task_ids) - index) for index, task_id in enumerate(task_ids)}
+    weights, remaining = {}, 0
+    for task_id, duration in reversed(list(zip(task_ids, durations))):
+        remaining += duration
+        weights[task_id] = max(1, round(remaining))
+    return weights
+
+
+def estimate_makespan(tasks, slots=SCHEDULING_SLOTS, pool_slots=None):
+    """
+    Simulates the scheduler: whenever a slot is free, the ready task with the highest priority starts
+    :param tasks: task_id -> {"duration": seconds, "priority": weight, "upstream": task_ids, "pool": name}
+    :param slots: tasks running at once
+    :param pool_slots: pool name -> tasks of the pool running at once
+    :return: expected seconds from the first task start to the last task end
+    """
+    pool_slots = pool_slots or {}
+    remaining_upstream = {task_id: set(task["upstream"]) & set(tasks) for task_id, task in tasks.items()}
+    ready = [task_id for task_id, upstream in remaining_upstream.items() if not upstream]
+    running, pool_used, now = [], {}, 0.0
+    while ready or running:
+        ready.sort(key=lambda task_id: -tasks[task_id]["priority"])
+        for task_id in list(ready):
+            pool = tasks[task_id].get("pool")
+            if len(running) >= slots:
+                break
+            if pool in pool_slots and pool_used.get(pool, 0) >= pool_slots[pool]:
+                continue
+            ready.remove(task_id)
+            pool_used[pool] = pool_used.get(pool, 0) + 1
+            heapq.heappush(running, (now + tasks[task_id]["duration"], task_id))
+        if not running:
+            break
+        now, task_id = heapq.heappop(running)
+        pool_used[tasks[task_id].get("pool")] -= 1
+        for downstream_id, upstream in remaining_upstream.items():
+            if task_id in upstream:
+                upstream.discard(task_id)
+                if not upstream:
+                    ready.append(downstream_id)
+    return round(now, 3)
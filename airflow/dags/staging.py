@@ -0,0 +1,114 @@
+import os
+import shutil
+import logging
+
+# "local" keeps the artifacts of a run (archive, CSVs, Parquet) on the worker's disk, so all tasks
+# of a run have to run on one host. "gcs" hands them off through a shared GCS prefix per run,
+# so any Celery worker can run any task. Set STORAGE_EMULATOR_HOST to stage on a local fake-gcs-server.
+STAGING_BACKEND = os.environ.get("STAGING_BACKEND", "local")
+STAGING_BUCKET = os.environ.get("STAGING_BUCKET", os.environ.get("GCP_GCS_BUCKET"))
+STAGING_PREFIX = os.environ.get("STAGING_PREFIX", "staging")
+# Artifacts are staged under their path relative to AIRFLOW_HOME, the same on every worker
+STAGING_ROOT = os.environ.get("AIRFLOW_HOME", "/opt/airflow/")
+
+
+class LocalStaging:
+    """Artifacts stay where the tasks write them"""
+
+    def __init__(self, run_id=None):
+        self.run_id = run_id
+
+    def push(self, path, shared=False):
+        """
+        Makes a file or folder written by this task available to the other tasks
+        :param path: local file or folder
+        :param shared: keep it for the next runs too, e.g. the download cache
+        :return:
+        """
+
+    def pull(self, path, shared=False):
+        """
+        Makes a file or folder pushed by another task available at the same local path
+        :param path: local file or folder
+        :param shared: pushed as shared
+        :return: True if the path exists after the pull
+        """
+        return os.path.exists(path)
+
+    def cleanup(self, paths):
+        """
+        Removes the artifacts of the run
+        :param paths: local files and folders of the run
+        :return:
+        """
+        for path in paths:
+            if os.path.isdir(path):
+                shutil.rmtree(path)
+            elif os.path.exists(path):
+                os.remove(path)
+
+
+class GcsStaging(LocalStaging):
+    """Artifacts are handed off through gs://<bucket>/<prefix>/<run_id>/, shared ones through <prefix>/shared/"""
+
+    def __init__(self, run_id, bucket=STAGING_BUCKET, prefix=STAGING_PREFIX, root=STAGING_ROOT):
+        super().__init__(run_id)
+        self.bucket = bucket
+        self.prefix = prefix.rstrip('/')
+        self.root = root
+
+    def get_object_name(self, path, shared=False):
+        return f"{self.prefix}/{'shared' if shared else self.run_id}/{os.path.relpath(path, self.root)}"
+
+    def push(self, path, shared=False):
+        from gcs_uploader import upload_file, upload_folder
+
+        object_name = self.get_object_name(path, shared)
+        if os.path.isdir(path):
+            upload_folder(self.bucket, object_name, path)
+        elif os.path.exists(path):
+            upload_file(self.bucket, object_name, path)
+        logging.info(f"Staged {path} as gs://{self.bucket}/{object_name}")
+
+    def pull(self, path, shared=False):
+        from gcs_uploader import get_crc32c, get_storage_client
+
+        object_name = self.get_object_name(path, shared)
+        bucket = get_storage_client().bucket(self.bucket)
+        blobs = [blob for blob in bucket.list_blobs(prefix=object_name)
+                 if blob.name == object_name or blob.name.startswith(f"{object_name}/")]
+        local_files = {path + blob.name[len(object_name):]: blob for blob in blobs}
+        if os.path.isdir(path):
+            # Files of a folder that are not staged (e.g. partitions of an earlier run) are removed
+            for root, _, names in os.walk(path):
+                for name in names:
+                    if os.path.join(root, name) not in local_files:
+                        os.remove(os.path.join(root, name))
+        for local_file, blob in local_files.items():
+            # A file left by an earlier run on this worker is only reused if it is the staged one
+            if os.path.exists(local_file) and get_crc32c(local_file) == blob.crc32c:
+                continue
+            os.makedirs(os.path.dirname(local_file), exist_ok=True)
+            blob.download_to_filename(local_file)
+            logging.info(f"Pulled gs://{self.bucket}/{blob.name} to {local_file}")
+        return os.path.exists(path)
+
+    def cleanup(self, paths):
+        from gcs_uploader import get_storage_client
+
+        super().cleanup(paths)
+        bucket = get_storage_client().bucket(self.bucket)
+        for blob in bucket.list_blobs(prefix=f"{self.prefix}/{self.run_id}/"):
+            blob.delete()
+
+
+def get_staging(dag_run=None, backend=STAGING_BACKEND):
+    """
+    :param dag_run: current DAG run, its run_id scopes the staged artifacts
+    :param backend: "local" or "gcs"
+    :return: staging of the run
+    """
+    run_id = dag_run.run_id if dag_run is not None else None
+    if backend == "gcs" and run_id is not None:
+        return GcsStaging(run_id)
+    return LocalStaging(run_id)
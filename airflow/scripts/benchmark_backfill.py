@@ -0,0 +1,87 @@
+"""
+Throughput of the backfill (f1_backfill_dag) for N snapshots processed at once.
+Synthetic snapshots (see generate_f1db.py) are served from a local HTTP server and loaded into fake GCS
+by backfill_snapshot, at most --parallel of them at a time like the BACKFILL_POOL slots;
+the tables of every snapshot go to their own backfill/<version>/ prefix.
+
+    docker-compose --profile local up -d fake-gcs
+    STORAGE_EMULATOR_HOST=http://localhost:4443 python scripts/benchmark_backfill.py --snapshots 8 --parallel 1 2 4
+"""
+import os
+import sys
+import time
+import shutil
+import tempfile
+import argparse
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+
+SCRIPTS_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(SCRIPTS_DIR, '..', 'dags'))
+from generate_f1db import generate  # noqa: E402
+from benchmark_pipeline import serve  # noqa: E402
+
+
+def run_snapshot(url, version, bucket, prefix, workers):
+    from data_ingestion_gcs_dag import backfill_snapshot
+
+    return backfill_snapshot(url, version, bucket, prefix=prefix, workers=workers)
+
+
+def run(base_url, versions, bucket, prefix, parallel, workers):
+    """
+    :return: (wall seconds, snapshot summaries)
+    """
+    start = time.perf_counter()
+    # The pool processes live for the whole backfill, every one keeps its storage client between snapshots
+    with ProcessPoolExecutor(max_workers=parallel, mp_context=multiprocessing.get_context('spawn')) as pool:
+        futures = [pool.submit(run_snapshot, f"{base_url}/{version}.zip", version, bucket, prefix, workers)
+                   for version in versions]
+        summaries = [future.result() for future in futures]
+    return time.perf_counter() - start, summaries
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--snapshots', type=int, default=8)
+    parser.add_argument('--scale', type=float, default=1)
+    parser.add_argument('--parallel', type=int, nargs='+', default=[1, 2, 4])
+    parser.add_argument('--workers', type=int, default=2, help="conversion processes per snapshot")
+    parser.add_argument('--bucket', default='f1-backfill')
+    args = parser.parse_args()
+
+    if not os.environ.get('STORAGE_EMULATOR_HOST'):
+        raise SystemExit("STORAGE_EMULATOR_HOST is not set, start fake-gcs first")
+    from google.api_core.exceptions import Conflict
+    from gcs_uploader import get_storage_client
+
+    try:
+        get_storage_client().create_bucket(args.bucket)
+    except Conflict:
+        pass
+
+    root = tempfile.mkdtemp()
+    try:
+        serve_dir = os.path.join(root, 'serve')
+        os.makedirs(serve_dir)
+        versions = [f"snapshot_{index:02d}" for index in range(args.snapshots)]
+        for index, version in enumerate(versions):
+            generate(os.path.join(serve_dir, f"{version}.zip"), args.scale, seed=index)
+        snapshot_mb = sum(os.path.getsize(os.path.join(serve_dir, f"{version}.zip"))
+                          for version in versions) / 1024 / 1024
+        server = serve(serve_dir)
+        base_url = f"http://127.0.0.1:{server.server_port}"
+        # backfill_snapshot works in $AIRFLOW_HOME/backfill/<version>/
+        os.environ['AIRFLOW_HOME'] = os.path.join(root, 'home')
+
+        print(f"{args.snapshots} snapshots, {snapshot_mb:.1f} MB of archives")
+        print(f"{'parallel':>8}{'wall s':>10}{'snapshots/min':>15}{'archive MB/s':>14}{'rows/s':>12}")
+        for parallel in args.parallel:
+            seconds, summaries = run(base_url, versions, args.bucket, f"benchmark_backfill_parallel_{parallel}",
+                                     parallel, args.workers)
+            rows = sum(summary['rows'] for summary in summaries)
+            print(f"{parallel:>8}{seconds:>10.2f}{len(summaries) * 60 / seconds:>15.1f}"
+                  f"{snapshot_mb / seconds:>14.2f}{rows / seconds:>12.0f}")
+        server.shutdown()
+    finally:
+        shutil.rmtree(root)
@@ -0,0 +1,97 @@
+"""
+Compares the total conversion wall time of the per-task layout (one format_to_parquet task,
+so one fresh interpreter, per table, --slots of them at a time in DAG order)
+with the batch layout (format_to_parquet_all converting every table from one process pool).
+
+Run inside the airflow container:
+    python scripts/benchmark_batch_convert.py /opt/airflow/f1db_csv.zip --slots 4
+"""
+import os
+import sys
+import time
+import shutil
+import tempfile
+import argparse
+import multiprocessing
+from concurrent.futures import ThreadPoolExecutor
+
+DAGS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'dags')
+sys.path.insert(0, DAGS_DIR)
+
+
+def get_table_kwargs(table, zip_path, work_dir, partitioned):
+    is_partitioned = partitioned and table.get('partitioning') == 'year'
+    table_path = table['name'] if is_partitioned else f"{table['name']}.parquet"
+    return {
+        "name": table['name'],
+        "src_file": None,
+        "dest_file": os.path.join(work_dir, table_path),
+        "member": table['member'],
+        "schema": table['schema'],
+        "partitioning": 'year' if is_partitioned else None,
+    }
+
+
+def convert_task(zip_path, table):
+    sys.path.insert(0, DAGS_DIR)
+    from data_ingestion_gcs_dag import convert_table
+
+    convert_table(table['src_file'], table['dest_file'], zip_path, table['member'], table['schema'],
+                  table['partitioning'])
+
+
+def batch_task(zip_path, tables, workers):
+    sys.path.insert(0, DAGS_DIR)
+    import data_ingestion_gcs_dag
+
+    class TaskInstance:
+        def xcom_push(self, key, value):
+            pass
+
+    # The benchmark has no manifest to compare the tables with
+    data_ingestion_gcs_dag.skip_unchanged_tables = False
+    data_ingestion_gcs_dag.batch_format_to_parquet(tables, None, zip_path, workers, ti=TaskInstance())
+
+
+def run_task(target, *args):
+    process = multiprocessing.get_context('spawn').Process(target=target, args=args)
+    process.start()
+    process.join()
+    if process.exitcode != 0:
+        raise SystemExit(f"{target.__name__} failed")
+
+
+def per_task(zip_path, tables, slots):
+    with ThreadPoolExecutor(max_workers=slots) as pool:
+        list(pool.map(lambda table: run_task(convert_task, zip_path, table), tables))
+
+
+def batch(zip_path, tables, slots):
+    run_task(batch_task, zip_path, tables, slots)
+
+
+def run(layout, zip_path, slots, partitioned):
+    from f1_tables import TABLES
+
+    work_dir = tempfile.mkdtemp()
+    try:
+        tables = [get_table_kwargs(table, zip_path, work_dir, partitioned) for table in TABLES]
+        start = time.perf_counter()
+        layout(zip_path, tables, slots)
+        return time.perf_counter() - start
+    finally:
+        shutil.rmtree(work_dir)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('zip_path')
+    parser.add_argument('--slots', type=int, default=os.cpu_count() or 1,
+                        help="concurrent tasks of the per-task layout, pool processes of the batch layout")
+    parser.add_argument('--partitioned', action='store_true', help="write the year Hive partitions")
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    for layout in (per_task, batch):
+        wall_time = min(run(layout, args.zip_path, args.slots, args.partitioned) for _ in range(args.repeat))
+        print(f"{layout.__name__:<10} wall time {wall_time:8.2f} s")
@@ -0,0 +1,113 @@
+"""
+Compares the two-task flow (format_to_parquet_X, then local_to_gcs_X) with the fused
+format_to_gcs_X task that streams the Parquet straight to GCS.
+Like the Airflow tasks, every task runs in a fresh interpreter, so the flows pay the same start-up
+and import costs they pay in the DAG. Reports wall time and bytes written to local disk.
+
+Run against fake GCS:
+    docker-compose --profile local up -d fake-gcs
+    STORAGE_EMULATOR_HOST=http://localhost:4443 python scripts/benchmark_fused_upload.py /opt/airflow/f1db_csv.zip
+"""
+import os
+import sys
+import time
+import shutil
+import tempfile
+import argparse
+import multiprocessing
+
+DAGS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'dags')
+sys.path.insert(0, DAGS_DIR)
+
+
+def folder_size(folder):
+    return sum(os.path.getsize(os.path.join(root, name))
+               for root, _, names in os.walk(folder) for name in names)
+
+
+def convert_task(zip_path, table, dest_file, partitioned):
+    sys.path.insert(0, DAGS_DIR)
+    from data_ingestion_gcs_dag import format_to_parquet, read_race_years
+
+    race_years = read_race_years(zip_path, 'races.csv') if partitioned else None
+    format_to_parquet(zip_path, dest_file, member=table['member'], schema=table['schema'], race_years=race_years)
+
+
+def upload_task(bucket, object_name, local_file):
+    sys.path.insert(0, DAGS_DIR)
+    from gcs_uploader import upload_file, upload_folder
+
+    if os.path.isdir(local_file):
+        upload_folder(bucket, object_name, local_file)
+    else:
+        upload_file(bucket, object_name, local_file)
+
+
+def fused_task(zip_path, table, bucket, object_name, partitioned):
+    sys.path.insert(0, DAGS_DIR)
+    from data_ingestion_gcs_dag import format_to_gcs, read_race_years
+
+    race_years = read_race_years(zip_path, 'races.csv') if partitioned else None
+    format_to_gcs(zip_path, bucket, object_name, member=table['member'], schema=table['schema'],
+                  race_years=race_years)
+
+
+def run_task(target, *args):
+    process = multiprocessing.get_context('spawn').Process(target=target, args=args)
+    process.start()
+    process.join()
+    if process.exitcode != 0:
+        raise SystemExit(f"{target.__name__}{args} failed")
+
+
+def two_task(zip_path, tables, bucket, work_dir, partitioned):
+    for table in tables:
+        is_partitioned = partitioned and table.get('partitioning') == 'year'
+        table_path = table['name'] if is_partitioned else f"{table['name']}.parquet"
+        run_task(convert_task, zip_path, table, os.path.join(work_dir, table_path), is_partitioned)
+        run_task(upload_task, bucket, f"two_task/{table_path}", os.path.join(work_dir, table_path))
+
+
+def fused(zip_path, tables, bucket, work_dir, partitioned):
+    for table in tables:
+        is_partitioned = partitioned and table.get('partitioning') == 'year'
+        table_path = table['name'] if is_partitioned else f"{table['name']}.parquet"
+        run_task(fused_task, zip_path, table, bucket, f"fused/{table_path}", is_partitioned)
+
+
+def run(flow, zip_path, tables, bucket, partitioned):
+    work_dir = tempfile.mkdtemp()
+    try:
+        start = time.perf_counter()
+        flow(zip_path, tables, bucket, work_dir, partitioned)
+        return time.perf_counter() - start, folder_size(work_dir)
+    finally:
+        shutil.rmtree(work_dir)
+
+
+if __name__ == '__main__':
+    from google.api_core.exceptions import Conflict
+    from f1_tables import TABLES
+    from gcs_uploader import get_storage_client
+
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('zip_path')
+    parser.add_argument('--tables', nargs='*', help="tables to benchmark, all of them by default")
+    parser.add_argument('--bucket', default='f1-benchmark')
+    parser.add_argument('--partitioned', action='store_true', help="write the year Hive partitions")
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    if not os.environ.get('STORAGE_EMULATOR_HOST'):
+        print("STORAGE_EMULATOR_HOST is not set, uploading to the real GCS bucket", args.bucket)
+    try:
+        get_storage_client().create_bucket(args.bucket)
+    except Conflict:
+        pass
+    tables = [table for table in TABLES if not args.tables or table['name'] in args.tables]
+
+    for flow in (two_task, fused):
+        results = [run(flow, args.zip_path, tables, args.bucket, args.partitioned) for _ in range(args.repeat)]
+        wall_time = min(result[0] for result in results)
+        written = results[0][1]
+        print(f"{flow.__name__:<10} wall time {wall_time:8.2f} s   disk written {written / 1024 / 1024:8.1f} MB")
@@ -0,0 +1,106 @@
+"""
+Latency and bytes scanned of the dbt models and fact_table.sql on the external tables (BIGQUERY_LOAD_MODE=external)
+against the native, partitioned and clustered tables (BIGQUERY_LOAD_MODE=native) of the same release.
+Unlike the dry runs of profile_queries.py, which estimate the external tables as 0 bytes, every query really runs
+(without the query cache), so the bytes are the ones BigQuery processed and billed.
+Load both sets of tables first, e.g. one DAG run in each mode.
+
+    python scripts/benchmark_load_modes.py --repeat 3 --report load_modes.json
+"""
+import os
+import sys
+import json
+import shutil
+import tempfile
+import argparse
+
+SCRIPTS_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, SCRIPTS_DIR)
+from profile_queries import FACT_TABLE_SQL, compile_models, format_value  # noqa: E402
+
+MODES = {"external": "external_table_", "native": "native_table_"}
+
+
+def run_query(client, sql, repeat):
+    """
+    :return: {"latency_seconds", "bytes_processed", "bytes_billed", "slot_ms"} of the fastest of repeat runs
+    """
+    from google.cloud import bigquery
+
+    job_config = bigquery.QueryJobConfig(use_query_cache=False)
+    best = None
+    for _ in range(repeat):
+        job = client.query(sql, job_config=job_config)
+        job.result()
+        metrics = {"latency_seconds": round((job.ended - job.started).total_seconds(), 3),
+                   "bytes_processed": job.total_bytes_processed, "bytes_billed": job.total_bytes_billed,
+                   "slot_ms": job.slot_millis}
+        if best is None or metrics["latency_seconds"] < best["latency_seconds"]:
+            best = metrics
+    return best
+
+
+def get_queries(prefix, profiles_dir=None, target=None, select=None):
+    """
+    :param prefix: raw_table_prefix the models and fact_table.sql read the raw tables with
+    :return: model name -> SQL
+    """
+    work_dir = tempfile.mkdtemp()
+    try:
+        queries = compile_models(work_dir, profiles_dir, target, select, json.dumps({"raw_table_prefix": prefix}))
+    finally:
+        shutil.rmtree(work_dir)
+    with open(FACT_TABLE_SQL) as f:
+        # The SELECT of the fact table only, a benchmark run doesn't replace the table
+        sql = f.read().split(" AS\n", 1)[1]
+    queries['fact_table'] = sql.replace(MODES["external"], prefix)
+    return queries
+
+
+def compare_modes(results):
+    """
+    :param results: mode -> model -> run_query metrics
+    :return: model -> {"bytes_ratio", "latency_ratio"} of native over external, None when a mode is missing
+    """
+    comparison = {}
+    for model in sorted(set(results["external"]) | set(results["native"])):
+        external, native = results["external"].get(model), results["native"].get(model)
+        ratios = {}
+        for key, metric in (("bytes_ratio", "bytes_processed"), ("latency_ratio", "latency_seconds")):
+            ratios[key] = round(native[metric] / external[metric], 3) \
+                if external and native and external[metric] else None
+        comparison[model] = ratios
+    return comparison
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--profiles-dir', help="dbt profiles folder, ~/.dbt by default")
+    parser.add_argument('--target', help="dbt target of the profile")
+    parser.add_argument('--select', nargs='+', help="dbt models to run, all by default")
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--report', help="JSON file the results and the comparison are written to")
+    args = parser.parse_args()
+
+    from google.cloud import bigquery
+
+    client = bigquery.Client()
+    results = {}
+    for mode, prefix in MODES.items():
+        queries = get_queries(prefix, args.profiles_dir, args.target, args.select)
+        results[mode] = {model: run_query(client, sql, args.repeat) for model, sql in sorted(queries.items())}
+    comparison = compare_modes(results)
+
+    print(f"{'model':<32}{'external MB':>13}{'native MB':>11}{'external s':>12}{'native s':>10}"
+          f"{'bytes x':>9}{'latency x':>11}")
+    for model, ratios in comparison.items():
+        external, native = results["external"].get(model) or {}, results["native"].get(model) or {}
+        print(f"{model:<32}{format_value(external.get('bytes_processed'), 13, 1024 * 1024)}"
+              f"{format_value(native.get('bytes_processed'), 11, 1024 * 1024)}"
+              f"{format_value(external.get('latency_seconds'), 12)}"
+              f"{format_value(native.get('latency_seconds'), 10)}"
+              f"{format_value(ratios['bytes_ratio'], 9)}{format_value(ratios['latency_ratio'], 11)}")
+    if args.report:
+        with open(args.report, 'w') as f:
+            json.dump({"results": results, "comparison": comparison}, f, indent=2, sort_keys=True)
+        print(f"report saved to {args.report}")
@@ -0,0 +1,99 @@
+"""
+Stages of the end-to-end benchmark of the ingestion on a synthetic archive (see generate_f1db.py):
+download -> convert -> upload -> fact_table.sql on DuckDB -> pace marts.
+They are timed, compared with the saved baseline and fail on regressions by the pytest-benchmark suite
+tests/test_benchmark_pipeline.py:
+
+    python -m pytest tests/test_benchmark_pipeline.py --benchmark-autosave          # save the baseline
+    python -m pytest tests/test_benchmark_pipeline.py --benchmark-compare --benchmark-compare-fail=min:20%
+"""
+import os
+import sys
+import shutil
+import threading
+import subprocess
+import functools
+from http.server import HTTPServer, SimpleHTTPRequestHandler
+
+SCRIPTS_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(SCRIPTS_DIR, '..', 'dags'))
+from f1_tables import TABLES  # noqa: E402
+from data_ingestion_gcs_dag import format_to_parquet, read_race_years  # noqa: E402
+from dataset_download import download_dataset  # noqa: E402
+
+DBT_PROJECT_DIR = os.path.join(SCRIPTS_DIR, '..', '..')
+PACE_MODELS = ['+f1_race_pace_mart', '+f1_season_pace_mart']
+
+
+class QuietHandler(SimpleHTTPRequestHandler):
+    def log_message(self, *args):
+        pass
+
+
+def serve(folder):
+    """
+    :param folder: folder served over HTTP
+    :return: running server, its url is http://127.0.0.1:<server.server_port>/
+    """
+    server = HTTPServer(('127.0.0.1', 0), functools.partial(QuietHandler, directory=folder))
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def stage_download(url, work_dir):
+    dest_file = os.path.join(work_dir, 'f1db_csv.zip')
+    for path in (dest_file, f"{dest_file}.meta.json"):
+        if os.path.exists(path):
+            os.remove(path)
+    download_dataset(url, dest_file)
+    return dest_file
+
+
+def stage_convert(zip_path, work_dir, partitioned):
+    parquet_dir = os.path.join(work_dir, 'parquet')
+    shutil.rmtree(parquet_dir, ignore_errors=True)
+    race_years = read_race_years(zip_path, 'races.csv') if partitioned else None
+    rows = 0
+    for table in TABLES:
+        if race_years is not None and table.get('partitioning') == 'year':
+            dest = os.path.join(parquet_dir, table['name'])
+            rows += format_to_parquet(zip_path, dest, member=table['member'], schema=table['schema'],
+                                      race_years=race_years)
+        else:
+            dest = os.path.join(parquet_dir, f"{table['name']}.parquet")
+            rows += format_to_parquet(zip_path, dest, member=table['member'], schema=table['schema'])
+    return parquet_dir, rows
+
+
+def stage_upload(bucket, parquet_dir):
+    from google.api_core.exceptions import Conflict
+    from gcs_uploader import get_storage_client, upload_file, upload_folder
+
+    try:
+        get_storage_client().create_bucket(bucket)
+    except Conflict:
+        pass
+    for name in sorted(os.listdir(parquet_dir)):
+        local_file = os.path.join(parquet_dir, name)
+        if os.path.isdir(local_file):
+            upload_folder(bucket, f"benchmark/{name}", local_file)
+        else:
+            upload_file(bucket, f"benchmark/{name}", local_file)
+
+
+def stage_model(parquet_dir):
+    from local_sql import connect, run_fact_table
+
+    return len(run_fact_table(connect(parquet_dir)))
+
+
+def stage_pace_models(parquet_dir, work_dir, full_refresh):
+    """
+    Builds the pace marts with dbt on DuckDB, a full refresh or an incremental run on unchanged seasons
+    """
+    command = ['dbt', 'run', '--profiles-dir', 'local', '--select', *PACE_MODELS,
+               '--target-path', os.path.join(work_dir, 'target'), '--log-path', os.path.join(work_dir, 'logs')]
+    if full_refresh:
+        command.append('--full-refresh')
+    env = dict(os.environ, F1_PARQUET_PATH=parquet_dir, F1_DUCKDB_PATH=os.path.join(work_dir, 'f1.duckdb'))
+    subprocess.run(command, cwd=DBT_PROJECT_DIR, env=env, check=True, stdout=subprocess.DEVNULL)
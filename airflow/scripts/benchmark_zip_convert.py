@@ -0,0 +1,61 @@
+"""
+Compares the unzip-then-convert flow with converting straight out of the archive.
+Reports wall time and bytes written to local disk for both flows.
+
+Run inside the airflow container:
+    python scripts/benchmark_zip_convert.py /opt/airflow/f1db_csv.zip
+"""
+import os
+import sys
+import time
+import shutil
+import zipfile
+import tempfile
+import argparse
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'dags'))
+from data_ingestion_gcs_dag import format_to_parquet  # noqa: E402
+
+
+def folder_size(folder):
+    return sum(os.path.getsize(os.path.join(root, name))
+               for root, _, names in os.walk(folder) for name in names)
+
+
+def unzip_then_convert(zip_path, work_dir):
+    with zipfile.ZipFile(zip_path) as archive:
+        archive.extractall(work_dir)
+        members = [name for name in archive.namelist() if name.endswith('.csv')]
+    for member in members:
+        src_file = os.path.join(work_dir, member)
+        format_to_parquet(src_file, src_file.replace('.csv', '.parquet'))
+
+
+def convert_from_zip(zip_path, work_dir):
+    with zipfile.ZipFile(zip_path) as archive:
+        members = [name for name in archive.namelist() if name.endswith('.csv')]
+    for member in members:
+        format_to_parquet(zip_path, os.path.join(work_dir, member.replace('.csv', '.parquet')), member=member)
+
+
+def run(flow, zip_path):
+    work_dir = tempfile.mkdtemp()
+    try:
+        start = time.perf_counter()
+        flow(zip_path, work_dir)
+        return time.perf_counter() - start, folder_size(work_dir)
+    finally:
+        shutil.rmtree(work_dir)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('zip_path')
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    for flow in (unzip_then_convert, convert_from_zip):
+        results = [run(flow, args.zip_path) for _ in range(args.repeat)]
+        wall_time = min(result[0] for result in results)
+        written = results[0][1]
+        print(f"{flow.__name__:<20} wall time {wall_time:8.2f} s   disk written {written / 1024 / 1024:8.1f} MB")
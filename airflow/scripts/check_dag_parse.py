@@ -0,0 +1,78 @@
+"""
+Checks that data_ingestion_gcs_dag parses within a time and memory budget
+and without importing the libraries that are only needed by the task callables.
+Exits with 1 when the budget is exceeded, so it can run in CI.
+
+Run inside the airflow container:
+    python scripts/check_dag_parse.py --max-seconds 2 --max-mb 50 --max-rss-mb 100
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import resource
+import importlib
+import tracemalloc
+
+DAGS_FOLDER = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'dags')
+# Imported by the task callables only, never at parse time
+DEFERRED_MODULES = ['pandas', 'pyarrow', 'duckdb', 'google.cloud.storage']
+# Provider modules the DAG imports. They may import google.cloud.storage (through GCSHook)
+# or pandas (through google.cloud.bigquery) themselves, which the DAG can't avoid
+PROVIDER_MODULES = ['airflow.providers.google.cloud.operators.bigquery']
+
+
+def get_peak_rss_mb():
+    # ru_maxrss is in kilobytes on Linux
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--dag-module', default='data_ingestion_gcs_dag')
+    parser.add_argument('--max-seconds', type=float, default=2.0)
+    parser.add_argument('--max-mb', type=float, default=50.0)
+    parser.add_argument('--max-rss-mb', type=float, default=100.0)
+    parser.add_argument('--json', action='store_true', help="print the measures as one JSON line")
+    args = parser.parse_args()
+
+    # Airflow itself is imported by the scheduler before parsing, it is not part of the budget,
+    # no more than the provider operators every DAG using them pays for
+    import airflow  # noqa: F401
+    sys.path.insert(0, DAGS_FOLDER)
+    provider_modules = set()
+    for name in PROVIDER_MODULES:
+        before = set(sys.modules)
+        try:
+            importlib.import_module(name)
+        except ImportError:
+            continue
+        provider_modules |= set(sys.modules) - before
+
+    rss_start = get_peak_rss_mb()
+    tracemalloc.start()
+    start = time.perf_counter()
+    module = importlib.import_module(args.dag_module)
+    seconds = time.perf_counter() - start
+    peak_mb = tracemalloc.get_traced_memory()[1] / 1024 / 1024
+    tracemalloc.stop()
+    rss_mb = get_peak_rss_mb() - rss_start
+
+    deferred = [name for name in DEFERRED_MODULES if name in sys.modules and name not in provider_modules]
+    if args.json:
+        print(json.dumps({"dag_module": args.dag_module, "tasks": len(module.dag.tasks), "seconds": seconds,
+                          "peak_mb": peak_mb, "rss_mb": rss_mb, "deferred_modules": deferred}))
+    else:
+        print(f"{args.dag_module}: {len(module.dag.tasks)} tasks parsed in {seconds:.2f} s, "
+              f"peak {peak_mb:.1f} MB, RSS +{rss_mb:.1f} MB")
+    errors = [f"imports {name} at parse time" for name in deferred]
+    if seconds > args.max_seconds:
+        errors.append(f"parse time {seconds:.2f} s is over {args.max_seconds} s")
+    if peak_mb > args.max_mb:
+        errors.append(f"parse memory {peak_mb:.1f} MB is over {args.max_mb} MB")
+    if rss_mb > args.max_rss_mb:
+        errors.append(f"parse RSS growth {rss_mb:.1f} MB is over {args.max_rss_mb} MB")
+    for error in errors:
+        print(f"ERROR: {error}", file=sys.stderr if args.json else sys.stdout)
+    sys.exit(1 if errors else 0)
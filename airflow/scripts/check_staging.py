@@ -0,0 +1,109 @@
+"""
+Runs the table chains as if they were spread over Celery workers that share no disk:
+every task runs in a fresh interpreter with its own AIRFLOW_HOME, and the convert and upload tasks
+of a table always land on different workers, so they only succeed if the staging hands the artifacts off.
+Reports the wall time of all chains for each number of workers running tasks concurrently.
+
+    docker-compose --profile local up -d fake-gcs
+    STORAGE_EMULATOR_HOST=http://localhost:4443 python scripts/check_staging.py /opt/airflow/f1db_csv.zip --workers 1 2 4
+"""
+import os
+import sys
+import time
+import inspect
+import shutil
+import tempfile
+import argparse
+import multiprocessing
+from concurrent.futures import ThreadPoolExecutor
+
+DAGS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'dags')
+sys.path.insert(0, DAGS_DIR)
+
+
+class DagRun:
+    def __init__(self, run_id):
+        self.run_id = run_id
+
+    def get_previous_dagrun(self):
+        return None
+
+
+class TaskInstance:
+    def xcom_push(self, key, value):
+        pass
+
+
+def run_on_worker(home, run_id, callable_name, kwargs):
+    os.environ['AIRFLOW_HOME'] = home
+    os.environ['STAGING_BACKEND'] = 'gcs'
+    sys.path.insert(0, DAGS_DIR)
+    import data_ingestion_gcs_dag
+
+    task_callable = getattr(data_ingestion_gcs_dag, callable_name)
+    callable_kwargs = {key: value.replace('{home}', home) if isinstance(value, str) else value
+                       for key, value in kwargs.items()}
+    # Like PythonOperator, only the context the callable takes is passed
+    context = {"dag_run": DagRun(run_id), "ti": TaskInstance()}
+    parameters = inspect.signature(task_callable).parameters
+    task_callable(**callable_kwargs, **{key: value for key, value in context.items() if key in parameters})
+
+
+def run_task(home, run_id, callable_name, **kwargs):
+    process = multiprocessing.get_context('spawn').Process(target=run_on_worker,
+                                                           args=(home, run_id, callable_name, kwargs))
+    process.start()
+    process.join()
+    if process.exitcode != 0:
+        raise SystemExit(f"{callable_name} {kwargs} failed on {home}")
+
+
+def run_chains(homes, run_id, bucket, workers):
+    from f1_tables import TABLES
+
+    def run_chain(index):
+        table = TABLES[index]
+        table_path = f"{table['name']}.parquet"
+        run_task(homes[index % len(homes)], run_id, 'format_to_parquet_if_changed',
+                 src_file=None, dest_file=f"{{home}}/csv_data/{table_path}", bucket=bucket,
+                 object_name=f"staging_check/{table_path}", zip_path="{home}/f1db_csv.zip",
+                 member=table['member'], schema=table['schema'])
+        run_task(homes[(index + 1) % len(homes)], run_id, 'upload_to_gcs', bucket=bucket,
+                 object_name=f"staging_check/{table_path}", local_file=f"{{home}}/csv_data/{table_path}",
+                 table=table['name'])
+
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        list(pool.map(run_chain, range(len(TABLES))))
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('zip_path')
+    parser.add_argument('--bucket', default='f1-staging')
+    parser.add_argument('--workers', type=int, nargs='+', default=[1, 2, 4])
+    args = parser.parse_args()
+
+    os.environ['STAGING_BUCKET'] = args.bucket
+    from google.api_core.exceptions import Conflict
+    from gcs_uploader import get_storage_client, upload_file
+
+    try:
+        get_storage_client().create_bucket(args.bucket)
+    except Conflict:
+        pass
+
+    root = tempfile.mkdtemp()
+    try:
+        for workers in args.workers:
+            homes = [os.path.join(root, f"worker-{index}") for index in range(max(2, workers))]
+            for home in homes:
+                os.makedirs(home, exist_ok=True)
+            run_id = f"staging_check_{workers}_{int(time.time())}"
+            # The download task stages the archive as the shared download cache
+            upload_file(args.bucket, "staging/shared/f1db_csv.zip", args.zip_path)
+            start = time.perf_counter()
+            run_chains(homes, run_id, args.bucket, workers)
+            print(f"{workers} workers: all table chains in {time.perf_counter() - start:8.2f} s")
+            run_task(homes[0], run_id, 'cleanup_run_files', paths=["{home}/csv_data"])
+    finally:
+        shutil.rmtree(root)
@@ -1,13 +1,14 @@
 CREATE OR REPLACE TABLE f1_data_all.fact_table AS
 with constr_year_results as (
-SELECT distinct c.name, 
-  sum(points) over (partition by c.name, r.year) as constructor_result_points, 
+SELECT c.name, 
+  sum(points) as constructor_result_points, 
   r.year
 FROM f1_data_all.external_table_constructor_results cr
 inner join f1_data_all.external_table_races r
   on r.raceid = cr.raceid
 inner join f1_data_all.external_table_constructors c
   on c.constructorid = cr.constructorid 
+group by c.name, r.year
 )
 , dds as (
 select name, 
@@ -0,0 +1,223 @@
+"""
+Generates an f1db-shaped f1db_csv.zip at N x scale with referentially consistent rows.
+The rows reference each other the way Ergast's do (races -> circuits, results -> races/drivers/constructors/status),
+missing values are written as \\N and the headers name every column of the schemas in f1_tables.
+At scale 1 the row counts are close to the real archive (about 500k lap_times rows).
+
+    python scripts/generate_f1db.py /tmp/f1db_csv.zip --scale 10
+"""
+import os
+import csv
+import shutil
+import random
+import zipfile
+import tempfile
+import argparse
+import datetime
+
+NULL = '\\N'
+FIRST_SEASON, LAST_SEASON = 1950, 2024
+# Ergast has lap times and pit stops only for the recent seasons
+LAP_TIMES_SINCE, PIT_STOPS_SINCE, SPRINTS_SINCE = 1996, 2011, 2021
+CONSTRUCTORS_PER_SEASON = 10
+LAPS_PER_RACE = 60
+POINTS = [25, 18, 15, 12, 10, 8, 6, 4, 2, 1]
+STATUSES = ['Finished', 'Disqualified', 'Accident', 'Collision', 'Engine', 'Gearbox', 'Transmission', 'Clutch',
+            'Hydraulics', 'Electrical', '+1 Lap', '+2 Laps', 'Spun off', 'Retired', 'Brakes']
+NATIONALITIES = ['British', 'German', 'Italian', 'French', 'Austrian', 'American', 'Brazilian', 'Finnish',
+                 'Spanish', 'Dutch', 'Australian', 'Japanese']
+
+
+def format_lap_time(milliseconds):
+    minutes, seconds = divmod(milliseconds / 1000, 60)
+    if minutes >= 60:
+        return f"{int(minutes // 60)}:{int(minutes % 60):02d}:{seconds:06.3f}"
+    return f"{int(minutes)}:{seconds:06.3f}"
+
+
+class Writer:
+    """
+    Writes the CSV members row by row into temporary files, without holding them in memory.
+    A zip archive takes one member at a time, so the files are added to it on close.
+    """
+
+    def __init__(self, archive):
+        self.archive = archive
+        self.work_dir = tempfile.mkdtemp()
+        self.files = {}
+
+    def header(self, member, columns):
+        stream = open(os.path.join(self.work_dir, member), 'w', newline='', encoding='utf-8')
+        self.files[member] = (stream, csv.writer(stream, lineterminator='\n'))
+        self.files[member][1].writerow(columns)
+
+    def row(self, member, values):
+        self.files[member][1].writerow(values)
+
+    def close(self):
+        for member, (stream, _) in self.files.items():
+            stream.close()
+            self.archive.write(stream.name, member)
+        shutil.rmtree(self.work_dir)
+
+
+def generate(zip_path, scale=1, seed=42):
+    """
+    :param zip_path: target archive path & file-name
+    :param scale: races per season multiplier, every race level table grows linearly with it
+    :param seed: random seed, the same seed and scale give the same archive
+    :return: number of races generated
+    """
+    rnd = random.Random(seed)
+    races_per_season = max(1, round(15 * scale))
+    seasons = list(range(FIRST_SEASON, LAST_SEASON + 1))
+
+    with zipfile.ZipFile(zip_path, 'w', compression=zipfile.ZIP_DEFLATED) as archive:
+        writer = Writer(archive)
+
+        writer.header('seasons.csv', ['year', 'url'])
+        for year in seasons:
+            writer.row('seasons.csv', [year, f"http://en.wikipedia.org/wiki/{year}_Formula_One_season"])
+
+        writer.header('status.csv', ['statusId', 'status'])
+        for status_id, status in enumerate(STATUSES, 1):
+            writer.row('status.csv', [status_id, status])
+
+        circuits = max(20, races_per_season)
+        writer.header('circuits.csv', ['circuitId', 'circuitRef', 'name', 'location', 'country',
+                                       'lat', 'lng', 'alt', 'url'])
+        for circuit_id in range(1, circuits + 1):
+            writer.row('circuits.csv', [circuit_id, f"circuit_{circuit_id}", f"Circuit {circuit_id}",
+                                        f"City {circuit_id}", rnd.choice(NATIONALITIES),
+                                        round(rnd.uniform(-50, 60), 4), round(rnd.uniform(-120, 140), 4),
+                                        rnd.choice([NULL, rnd.randint(0, 2000)]),
+                                        f"http://en.wikipedia.org/wiki/Circuit_{circuit_id}"])
+
+        constructors = CONSTRUCTORS_PER_SEASON * 3
+        writer.header('constructors.csv', ['constructorId', 'constructorRef', 'name', 'nationality', 'url'])
+        for constructor_id in range(1, constructors + 1):
+            writer.row('constructors.csv', [constructor_id, f"team_{constructor_id}", f"Team {constructor_id}",
+                                            rnd.choice(NATIONALITIES),
+                                            f"http://en.wikipedia.org/wiki/Team_{constructor_id}"])
+
+        drivers = constructors * 2 * 4
+        writer.header('drivers.csv', ['driverId', 'driverRef', 'number', 'code', 'forename', 'surname',
+                                      'dob', 'nationality', 'url'])
+        for driver_id in range(1, drivers + 1):
+            dob = datetime.date(1930, 1, 1) + datetime.timedelta(days=rnd.randint(0, 365 * 75))
+            writer.row('drivers.csv', [driver_id, f"driver_{driver_id}", rnd.choice([NULL, rnd.randint(1, 99)]),
+                                       rnd.choice([NULL, f"D{driver_id % 100:02d}"]), f"Name{driver_id}",
+                                       f"Surname{driver_id}", dob.isoformat(), rnd.choice(NATIONALITIES),
+                                       f"http://en.wikipedia.org/wiki/Driver_{driver_id}"])
+
+        writer.header('races.csv', ['raceId', 'year', 'round', 'circuitId', 'name', 'date', 'time', 'url'])
+        writer.header('results.csv', ['resultId', 'raceId', 'driverId', 'constructorId', 'number', 'grid',
+                                      'position', 'positionText', 'positionOrder', 'points', 'laps', 'time',
+                                      'milliseconds', 'fastestLap', 'rank', 'fastestLapTime',
+                                      'fastestLapSpeed', 'statusId'])
+        writer.header('sprint_results.csv', ['resultId', 'raceId', 'driverId', 'constructorId', 'number', 'grid',
+                                             'position', 'positionText', 'positionOrder', 'points', 'laps',
+                                             'time', 'milliseconds', 'fastestLap', 'fastestLapTime', 'statusId'])
+        writer.header('constructor_results.csv', ['constructorResultsId', 'raceId', 'constructorId', 'points',
+                                                  'status'])
+        writer.header('constructor_standings.csv', ['constructorStandingsId', 'raceId', 'constructorId', 'points',
+                                                    'position', 'positionText', 'wins'])
+        writer.header('driver_standings.csv', ['driverStandingsId', 'raceId', 'driverId', 'points', 'position',
+                                               'positionText', 'wins'])
+        writer.header('qualifying.csv', ['qualifyId', 'raceId', 'driverId', 'constructorId', 'number', 'position',
+                                         'q1', 'q2', 'q3'])
+        writer.header('lap_times.csv', ['raceId', 'driverId', 'lap', 'position', 'time', 'milliseconds'])
+        writer.header('pit_stops.csv', ['raceId', 'driverId', 'stop', 'lap', 'time', 'duration', 'milliseconds'])
+
+        race_id = result_id = sprint_id = constructor_result_id = standing_id = qualify_id = 0
+        for year in seasons:
+            teams = rnd.sample(range(1, constructors + 1), CONSTRUCTORS_PER_SEASON)
+            # Two drivers per team, a season pace per team makes some teams dominate
+            line_up = [(driver, team) for index, team in enumerate(teams)
+                       for driver in (1 + (team - 1) * 8 + (year + index) % 8, 1 + (team - 1) * 8 + (year + index + 1) % 8)]
+            pace = {team: rnd.uniform(0, 1.5) for team in teams}
+            constructor_points = dict.fromkeys(teams, 0)
+            constructor_wins = dict.fromkeys(teams, 0)
+            driver_points = {driver: 0 for driver, _ in line_up}
+            driver_wins = {driver: 0 for driver, _ in line_up}
+            for round_number in range(1, races_per_season + 1):
+                race_id += 1
+                date = datetime.date(year, 3, 1) + datetime.timedelta(days=round_number * 240 // races_per_season)
+                writer.row('races.csv', [race_id, year, round_number, rnd.randint(1, circuits),
+                                         f"Grand Prix {round_number}", date.isoformat(),
+                                         NULL if year < 2005 else '14:00:00',
+                                         f"http://en.wikipedia.org/wiki/{year}_Grand_Prix_{round_number}"])
+
+                base_lap = rnd.randint(75000, 100000)
+                finish = sorted(line_up, key=lambda item: pace[item[1]] + rnd.uniform(0, 2.5))
+                race_points = dict.fromkeys(teams, 0)
+                for order, (driver, team) in enumerate(finish, 1):
+                    result_id += 1
+                    finished = rnd.random() > 0.15
+                    points = POINTS[order - 1] if finished and order <= len(POINTS) else 0
+                    race_points[team] += points
+                    driver_points[driver] += points
+                    if order == 1:
+                        constructor_wins[team] += 1
+                        driver_wins[driver] += 1
+                    milliseconds = base_lap * LAPS_PER_RACE + order * 5000
+                    writer.row('results.csv', [
+                        result_id, race_id, driver, team, rnd.randint(1, 99), rnd.randint(1, len(line_up)),
+                        order if finished else NULL, order if finished else 'R', order, points,
+                        LAPS_PER_RACE if finished else rnd.randint(1, LAPS_PER_RACE - 1),
+                        format_lap_time(milliseconds) if finished else NULL, milliseconds if finished else NULL,
+                        rnd.randint(1, LAPS_PER_RACE) if year >= 2004 else NULL,
+                        order if year >= 2004 else NULL, format_lap_time(base_lap) if year >= 2004 else NULL,
+                        round(rnd.uniform(180, 240), 3) if year >= 2004 else NULL,
+                        1 if finished else rnd.randint(2, len(STATUSES)),
+                    ])
+                    if year >= SPRINTS_SINCE and round_number % 4 == 0:
+                        sprint_id += 1
+                        writer.row('sprint_results.csv', [
+                            sprint_id, race_id, driver, team, rnd.randint(1, 99), order, order, order, order,
+                            max(0, 9 - order), 20, format_lap_time(base_lap * 20), base_lap * 20,
+                            rnd.randint(1, 20), format_lap_time(base_lap), 1,
+                        ])
+                    qualify_id += 1
+                    writer.row('qualifying.csv', [qualify_id, race_id, driver, team, rnd.randint(1, 99), order,
+                                                  format_lap_time(base_lap - 2000), NULL if order > 15 else
+                                                  format_lap_time(base_lap - 2500), NULL if order > 10 else
+                                                  format_lap_time(base_lap - 3000)])
+                    if year >= LAP_TIMES_SINCE:
+                        for lap in range(1, LAPS_PER_RACE + 1):
+                            lap_milliseconds = base_lap + order * 80 + rnd.randint(-500, 1500)
+                            writer.row('lap_times.csv', [race_id, driver, lap, order, format_lap_time(lap_milliseconds),
+                                                         lap_milliseconds])
+                    if year >= PIT_STOPS_SINCE:
+                        for stop in range(1, rnd.randint(1, 3) + 1):
+                            stop_milliseconds = rnd.randint(19000, 30000)
+                            writer.row('pit_stops.csv', [race_id, driver, stop, stop * LAPS_PER_RACE // 4,
+                                                         f"14:{10 + stop * 15}:{rnd.randint(10, 59)}",
+                                                         f"{stop_milliseconds / 1000:.3f}", stop_milliseconds])
+
+                for team in teams:
+                    constructor_result_id += 1
+                    constructor_points[team] += race_points[team]
+                    writer.row('constructor_results.csv', [constructor_result_id, race_id, team, race_points[team],
+                                                           rnd.choice([NULL, NULL, NULL, 'D'])])
+                for position, team in enumerate(sorted(teams, key=lambda item: -constructor_points[item]), 1):
+                    standing_id += 1
+                    writer.row('constructor_standings.csv', [standing_id, race_id, team, constructor_points[team],
+                                                             position, position, constructor_wins[team]])
+                for position, driver in enumerate(sorted(driver_points, key=lambda item: -driver_points[item]), 1):
+                    standing_id += 1
+                    writer.row('driver_standings.csv', [standing_id, race_id, driver, driver_points[driver],
+                                                        position, position, driver_wins[driver]])
+        writer.close()
+    return race_id
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('zip_path')
+    parser.add_argument('--scale', type=float, default=1)
+    parser.add_argument('--seed', type=int, default=42)
+    args = parser.parse_args()
+
+    races = generate(args.zip_path, args.scale, args.seed)
+    print(f"{args.zip_path}: {races} races at scale {args.scale}")
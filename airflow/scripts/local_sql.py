@@ -0,0 +1,115 @@
+"""
+Runs fact_table.sql on DuckDB over the local Parquet files of format_to_parquet,
+and benchmarks the window (SELECT DISTINCT ... sum() over) and GROUP BY
+formulations of constr_year_results, checking that they return the same rows.
+
+    pip install duckdb
+    python scripts/local_sql.py /opt/airflow/csv_data --repeat 5
+"""
+import os
+import time
+import argparse
+
+import duckdb
+
+FACT_TABLE_SQL = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fact_table.sql')
+TABLES = ['constructor_results', 'races', 'constructors']
+
+CONSTR_YEAR_RESULTS = {
+    'window': """
+SELECT distinct c.name,
+  sum(points) over (partition by c.name, r.year) as constructor_result_points,
+  r.year
+FROM f1_data_all.external_table_constructor_results cr
+inner join f1_data_all.external_table_races r
+  on r.raceid = cr.raceid
+inner join f1_data_all.external_table_constructors c
+  on c.constructorid = cr.constructorid
+""",
+    'group_by': """
+SELECT c.name,
+  sum(points) as constructor_result_points,
+  r.year
+FROM f1_data_all.external_table_constructor_results cr
+inner join f1_data_all.external_table_races r
+  on r.raceid = cr.raceid
+inner join f1_data_all.external_table_constructors c
+  on c.constructorid = cr.constructorid
+group by c.name, r.year
+""",
+}
+
+
+def get_location(parquet_path, table):
+    """
+    :param parquet_path: folder with <table>.parquet files, or <table>/ folders of Hive partitions
+    :param table: table name
+    :return: Parquet file, or glob of the partition files, of the table
+    """
+    if os.path.isdir(os.path.join(parquet_path, table)):
+        return os.path.join(parquet_path, table, '*', '*.parquet')
+    return os.path.join(parquet_path, f"{table}.parquet")
+
+
+def connect(parquet_path, database=':memory:'):
+    """
+    :param parquet_path: folder with <table>.parquet files, or <table>/ folders of Hive partitions
+    :param database: DuckDB database file
+    :return: connection with the f1_data_all.external_table_<table> views of the BigQuery dataset
+    """
+    connection = duckdb.connect(database)
+    connection.execute("CREATE SCHEMA IF NOT EXISTS f1_data_all")
+    for table in TABLES:
+        location = get_location(parquet_path, table)
+        connection.execute(
+            f"CREATE OR REPLACE VIEW f1_data_all.external_table_{table} AS "
+            f"SELECT * FROM read_parquet('{location}', hive_partitioning = true)"
+        )
+    return connection
+
+
+def run_fact_table(connection):
+    with open(FACT_TABLE_SQL) as f:
+        connection.execute(f.read())
+    return connection.execute("SELECT * FROM f1_data_all.fact_table ORDER BY year").fetchall()
+
+
+def benchmark(connection, repeat):
+    """
+    :return: formulation -> best wall time in seconds
+    """
+    timings = {}
+    for name, query in CONSTR_YEAR_RESULTS.items():
+        best = None
+        for _ in range(repeat):
+            start = time.perf_counter()
+            connection.execute(query).fetchall()
+            elapsed = time.perf_counter() - start
+            best = elapsed if best is None else min(best, elapsed)
+        timings[name] = best
+    return timings
+
+
+def same_results(connection):
+    window, group_by = CONSTR_YEAR_RESULTS['window'], CONSTR_YEAR_RESULTS['group_by']
+    differences = connection.execute(
+        f"SELECT count(*) FROM (({window}) EXCEPT ({group_by})) "
+        f"UNION ALL SELECT count(*) FROM (({group_by}) EXCEPT ({window}))"
+    ).fetchall()
+    return all(count == 0 for count, in differences)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('parquet_path')
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    connection = connect(args.parquet_path)
+    fact_rows = run_fact_table(connection)
+    print(f"fact_table: {len(fact_rows)} seasons")
+    for name, seconds in benchmark(connection, args.repeat).items():
+        print(f"constr_year_results {name:<10} {seconds * 1000:10.2f} ms")
+    if not same_results(connection):
+        raise SystemExit("window and group_by formulations return different rows")
+    print("window and group_by formulations return the same rows")
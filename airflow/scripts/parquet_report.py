@@ -0,0 +1,53 @@
+"""
+Compares, per f1db table, the Parquet file size and conversion time of
+inferred types with default snappy compression against the typed schemas
+of f1_tables with the configured compression.
+
+Run inside the airflow container:
+    python scripts/parquet_report.py /opt/airflow/f1db_csv.zip --compression zstd
+"""
+import os
+import sys
+import time
+import shutil
+import tempfile
+import argparse
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'dags'))
+from f1_tables import TABLES  # noqa: E402
+from data_ingestion_gcs_dag import format_to_parquet, PARQUET_COMPRESSION  # noqa: E402
+
+
+def convert(zip_path, member, dest_file, **kwargs):
+    start = time.perf_counter()
+    format_to_parquet(zip_path, dest_file, member=member, **kwargs)
+    return os.path.getsize(dest_file), time.perf_counter() - start
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('zip_path')
+    parser.add_argument('--compression', default=PARQUET_COMPRESSION)
+    args = parser.parse_args()
+
+    work_dir = tempfile.mkdtemp()
+    try:
+        print(f"{'table':<24}{'inferred KB':>12}{'typed KB':>12}{'ratio':>8}{'inferred s':>12}{'typed s':>10}")
+        totals = [0, 0, 0.0, 0.0]
+        for table in TABLES:
+            inferred_size, inferred_time = convert(
+                args.zip_path, table["member"], os.path.join(work_dir, f"{table['name']}.inferred.parquet"),
+                compression='snappy',
+            )
+            typed_size, typed_time = convert(
+                args.zip_path, table["member"], os.path.join(work_dir, f"{table['name']}.typed.parquet"),
+                schema=table["schema"], compression=args.compression,
+            )
+            totals = [totals[0] + inferred_size, totals[1] + typed_size,
+                      totals[2] + inferred_time, totals[3] + typed_time]
+            print(f"{table['name']:<24}{inferred_size / 1024:>12.1f}{typed_size / 1024:>12.1f}"
+                  f"{typed_size / inferred_size:>8.2f}{inferred_time:>12.3f}{typed_time:>10.3f}")
+        print(f"{'total':<24}{totals[0] / 1024:>12.1f}{totals[1] / 1024:>12.1f}"
+              f"{totals[1] / totals[0]:>8.2f}{totals[2]:>12.3f}{totals[3]:>10.3f}")
+    finally:
+        shutil.rmtree(work_dir)
@@ -0,0 +1,310 @@
+"""
+Profiles the bytes scanned and the latency of the dbt models and fact_table.sql.
+The models are compiled with dbt and estimated without running them:
+  bigquery - dry run, the bytes BigQuery would process (external tables are estimated as 0 bytes,
+             profile the native tables with --vars '{raw_table_prefix: native_table_}')
+  duckdb   - offline stand-in on the Parquet files of format_to_parquet: the logical (uncompressed) bytes
+             of the columns every scan reads, like BigQuery bills them, and the latency of the query.
+             The models are compiled against F1_DUCKDB_PATH, run `dbt run --profiles-dir local` once first.
+With --run-results the bytes, slot-ms and duration of a real `dbt run` are added from its run_results.json.
+
+The results are saved per commit, a model is flagged when its bytes grew by more than --threshold
+since the last profiled commit, and the script then exits non-zero.
+
+    F1_PARQUET_PATH=/opt/airflow/csv_data python scripts/profile_queries.py --engine duckdb
+    dbt run && python scripts/profile_queries.py --engine bigquery --run-results ../../target/run_results.json
+"""
+import os
+import re
+import glob
+import json
+import time
+import shutil
+import datetime
+import tempfile
+import argparse
+import subprocess
+
+SCRIPTS_DIR = os.path.dirname(os.path.abspath(__file__))
+DBT_PROJECT_DIR = os.path.join(SCRIPTS_DIR, '..', '..')
+FACT_TABLE_SQL = os.path.join(SCRIPTS_DIR, 'fact_table.sql')
+PROFILE_FILE = os.path.join(SCRIPTS_DIR, 'query_profile.json')
+# Bytes BigQuery counts per INT64, FLOAT64, DATE or TIME value
+VALUE_BYTES = 8
+
+
+def get_commit():
+    """
+    :return: short hash of HEAD, with -dirty when the work tree has changes
+    """
+    commit = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=DBT_PROJECT_DIR,
+                            capture_output=True, text=True, check=True).stdout.strip()
+    status = subprocess.run(['git', 'status', '--porcelain', '--untracked-files=no'], cwd=DBT_PROJECT_DIR,
+                            capture_output=True, text=True, check=True).stdout
+    return f"{commit}-dirty" if status.strip() else commit
+
+
+def compile_models(work_dir, profiles_dir=None, target=None, select=None, dbt_vars=None, env=None):
+    """
+    :param env: environment of dbt, e.g. F1_PARQUET_PATH of the external sources on DuckDB
+    :return: model name -> compiled SQL
+    """
+    command = ['dbt', 'compile', '--target-path', os.path.join(work_dir, 'target'),
+               '--log-path', os.path.join(work_dir, 'logs')]
+    if profiles_dir:
+        command += ['--profiles-dir', profiles_dir]
+    if target:
+        command += ['--target', target]
+    if select:
+        command += ['--select', *select]
+    if dbt_vars:
+        command += ['--vars', dbt_vars]
+    subprocess.run(command, cwd=DBT_PROJECT_DIR, env=env, check=True, stdout=subprocess.DEVNULL)
+    models = {}
+    for path in glob.glob(os.path.join(work_dir, 'target', 'compiled', '*', 'models', '**', '*.sql'), recursive=True):
+        with open(path) as f:
+            models[os.path.splitext(os.path.basename(path))[0]] = f.read()
+    return models
+
+
+def dry_run_bigquery(sql):
+    """
+    :return: bytes BigQuery would process
+    """
+    from google.cloud import bigquery
+
+    job_config = bigquery.QueryJobConfig(dry_run=True, use_query_cache=False)
+    return bigquery.Client().query(sql, job_config=job_config).total_bytes_processed
+
+
+def get_column_sizes(location):
+    """
+    Logical sizes of the columns as BigQuery counts them: 8 bytes per number, date or time value,
+    2 bytes plus the (uncompressed) data per string
+    :param location: Parquet file, or glob of partition files
+    :return: column name (lower case) -> bytes in all row groups
+    """
+    import pyarrow.parquet as pq
+
+    sizes = {}
+    for path in glob.glob(location):
+        metadata = pq.ParquetFile(path).metadata
+        for row_group in range(metadata.num_row_groups):
+            for index in range(metadata.num_columns):
+                column = metadata.row_group(row_group).column(index)
+                if column.physical_type in ('BYTE_ARRAY', 'FIXED_LEN_BYTE_ARRAY'):
+                    size = column.total_uncompressed_size + 2 * column.num_values
+                elif column.physical_type == 'BOOLEAN':
+                    size = column.num_values
+                else:
+                    size = VALUE_BYTES * column.num_values
+                name = column.path_in_schema.lower()
+                sizes[name] = sizes.get(name, 0) + size
+    return sizes
+
+
+def get_scans(plan):
+    """
+    :param plan: EXPLAIN (FORMAT JSON) operator tree
+    :return: (operator name, extra_info) of the scans in the plan
+    """
+    scans = []
+    for node in plan:
+        if node.get('name') in ('PARQUET_SCAN', 'READ_PARQUET', 'SEQ_SCAN', 'TABLE_SCAN'):
+            scans.append((node['name'], node.get('extra_info', {})))
+        scans.extend(get_scans(node.get('children', [])))
+    return scans
+
+
+def estimate_duckdb(connection, sql, locations):
+    """
+    Matches every Parquet scan of the plan with the referenced file that has the most of its columns
+    and adds up the uncompressed bytes of the columns it reads
+    :param connection: DuckDB connection
+    :param sql: query
+    :param locations: Parquet files (or globs) the query can read
+    :return: estimated bytes
+    """
+    sizes = {location: get_column_sizes(location) for location in locations}
+    plan = json.loads(connection.execute(f"EXPLAIN (FORMAT JSON) {sql}").fetchall()[0][1])
+    estimated, used = 0, set()
+    for name, extra_info in get_scans(plan):
+        projections = extra_info.get('Projections') or []
+        columns = [projections] if isinstance(projections, str) else projections
+        columns = [column.lower() for column in columns]
+        if 'Table' in extra_info:
+            # A table of the DuckDB database, e.g. {{ this }} of an incremental model
+            table = extra_info['Table'].split('.')
+            rows = connection.execute(
+                "SELECT estimated_size FROM duckdb_tables() WHERE schema_name = ? AND table_name = ?",
+                [table[-2], table[-1]]).fetchone()
+            estimated += (rows[0] if rows else 0) * VALUE_BYTES * len(columns)
+            continue
+        if not sizes:
+            continue
+        location = max(sizes, key=lambda location: (sum(column in sizes[location] for column in columns),
+                                                    location not in used))
+        used.add(location)
+        estimated += sum(sizes[location].get(column, 0) for column in columns)
+    return estimated
+
+
+def time_duckdb(connection, sql, repeat):
+    """
+    :return: best wall time of the query in seconds
+    """
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        connection.execute(sql).fetchall()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return round(best, 4)
+
+
+def profile_duckdb(models, parquet_path, database, repeat):
+    """
+    :return: model -> {"estimated_bytes", "latency_seconds"}
+    """
+    import duckdb
+    import local_sql
+
+    results = {}
+    connection = duckdb.connect(database, read_only=True)
+    for model, sql in sorted(models.items()):
+        try:
+            locations = re.findall(r"'([^']+\.parquet)'", sql)
+            results[model] = {"estimated_bytes": estimate_duckdb(connection, sql, locations),
+                              "latency_seconds": time_duckdb(connection, sql, repeat)}
+        except duckdb.Error as error:
+            print(f"{model}: can`t profile on {database}: {error}")
+
+    connection = local_sql.connect(parquet_path)
+    with open(FACT_TABLE_SQL) as f:
+        sql = f.read()
+    locations = [local_sql.get_location(parquet_path, table) for table in local_sql.TABLES]
+    results['fact_table'] = {"estimated_bytes": estimate_duckdb(connection, sql, locations),
+                             "latency_seconds": time_duckdb(connection, sql, repeat)}
+    return results
+
+
+def profile_bigquery(models):
+    """
+    :return: model -> {"estimated_bytes"}
+    """
+    results = {model: {"estimated_bytes": dry_run_bigquery(sql)} for model, sql in sorted(models.items())}
+    with open(FACT_TABLE_SQL) as f:
+        results['fact_table'] = {"estimated_bytes": dry_run_bigquery(f.read())}
+    return results
+
+
+def read_run_results(path):
+    """
+    :param path: run_results.json of a dbt run
+    :return: model -> {"actual_bytes", "slot_ms", "execution_seconds"}, the bytes and slot-ms only on BigQuery
+    """
+    with open(path) as f:
+        run_results = json.load(f)
+    results = {}
+    for result in run_results['results']:
+        if not result['unique_id'].startswith('model.'):
+            continue
+        response = result.get('adapter_response') or {}
+        results[result['unique_id'].split('.')[-1]] = {
+            "actual_bytes": response.get('bytes_processed'),
+            "slot_ms": response.get('slot_ms'),
+            "execution_seconds": round(result['execution_time'], 3),
+        }
+    return results
+
+
+def format_value(value, width, unit=1):
+    return f"{'-':>{width}}" if value is None else f"{value / unit:>{width}.3f}"
+
+
+def find_growth(current, previous, threshold):
+    """
+    :param current: model -> metrics of this commit
+    :param previous: model -> metrics of the previous profiled commit
+    :param threshold: allowed growth, 0.2 is 20 %
+    :return: (model, metric, before, after) of the bytes that grew past the threshold
+    """
+    flagged = []
+    for model, metrics in current.items():
+        for metric in ("estimated_bytes", "actual_bytes"):
+            before, after = previous.get(model, {}).get(metric), metrics.get(metric)
+            if before and after and after > before * (1 + threshold):
+                flagged.append((model, metric, before, after))
+    return flagged
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--engine', choices=['duckdb', 'bigquery'], default='duckdb')
+    parser.add_argument('--profiles-dir', help="dbt profiles folder, local/ for duckdb, ~/.dbt for bigquery")
+    parser.add_argument('--target', help="dbt target of the profile")
+    parser.add_argument('--select', nargs='+', help="dbt models to profile, all by default")
+    parser.add_argument('--vars', dest='dbt_vars', help="dbt --vars of the compilation")
+    parser.add_argument('--parquet-path', default=os.environ.get('F1_PARQUET_PATH', 'parquet'))
+    parser.add_argument('--database', default=os.environ.get('F1_DUCKDB_PATH', 'f1.duckdb'))
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--run-results', help="run_results.json of a dbt run, adds the actual bytes and slot-ms")
+    parser.add_argument('--profile-file', default=PROFILE_FILE)
+    parser.add_argument('--threshold', type=float, default=0.2)
+    args = parser.parse_args()
+
+    profiles_dir = args.profiles_dir
+    if profiles_dir is None and args.engine == 'duckdb':
+        profiles_dir = os.path.join(DBT_PROJECT_DIR, 'local')
+    # dbt runs from the project folder, the sources are compiled with the paths given to this script
+    env = dict(os.environ, F1_PARQUET_PATH=os.path.abspath(args.parquet_path),
+               F1_DUCKDB_PATH=os.path.abspath(args.database))
+    work_dir = tempfile.mkdtemp()
+    try:
+        models = compile_models(work_dir, profiles_dir, args.target, args.select, args.dbt_vars, env)
+    finally:
+        shutil.rmtree(work_dir)
+    if args.engine == 'duckdb':
+        results = profile_duckdb(models, os.path.abspath(args.parquet_path), os.path.abspath(args.database),
+                                 args.repeat)
+    else:
+        results = profile_bigquery(models)
+    if args.run_results:
+        for model, actual in read_run_results(args.run_results).items():
+            results.setdefault(model, {}).update(actual)
+
+    print(f"{'model':<32}{'estimated MB':>14}{'latency s':>11}{'actual MB':>11}{'slot ms':>10}{'run s':>9}")
+    for model, metrics in sorted(results.items()):
+        print(f"{model:<32}{format_value(metrics.get('estimated_bytes'), 14, 1024 * 1024)}"
+              f"{format_value(metrics.get('latency_seconds'), 11)}"
+              f"{format_value(metrics.get('actual_bytes'), 11, 1024 * 1024)}"
+              f"{format_value(metrics.get('slot_ms'), 10)}"
+              f"{format_value(metrics.get('execution_seconds'), 9)}")
+
+    profiles = {}
+    if os.path.exists(args.profile_file):
+        with open(args.profile_file) as f:
+            profiles = json.load(f)
+    commits = profiles.setdefault(args.engine, [])
+    commit = get_commit()
+    previous = next((entry for entry in reversed(commits) if entry['commit'] != commit), None)
+    entry = next((entry for entry in commits if entry['commit'] == commit), None)
+    if entry is None:
+        entry = {"commit": commit, "models": {}}
+        commits.append(entry)
+    entry["profiled_at"] = datetime.datetime.now(datetime.timezone.utc).isoformat(timespec='seconds')
+    for model, metrics in results.items():
+        entry["models"].setdefault(model, {}).update(metrics)
+    with open(args.profile_file, 'w') as f:
+        json.dump(profiles, f, indent=2, sort_keys=True)
+    print(f"{args.engine} profile of {commit} saved to {args.profile_file}")
+
+    if previous is None:
+        print("no earlier commit profiled to compare with")
+    else:
+        flagged = find_growth(results, previous["models"], args.threshold)
+        for model, metric, before, after in flagged:
+            print(f"{model} {metric} grew past {args.threshold:.0%} since {previous['commit']}: {before} -> {after}")
+        if flagged:
+            raise SystemExit(1)
+        print(f"no model scans more than {args.threshold:.0%} more bytes than at {previous['commit']}")
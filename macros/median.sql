@@ -0,0 +1,13 @@
+{#- Median of a column in an aggregate query, approximate on BigQuery where
+    percentile_cont is only an analytic function -#}
+{% macro median(column) %}
+  {{ return(adapter.dispatch('median')(column)) }}
+{% endmacro %}
+
+{% macro default__median(column) %}
+approx_quantiles({{ column }}, 100)[offset(50)]
+{% endmacro %}
+
+{% macro duckdb__median(column) %}
+median({{ column }})
+{% endmacro %}
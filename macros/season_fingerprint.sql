@@ -0,0 +1,21 @@
+{#- Order-insensitive fingerprint of the source rows of a season,
+    an incremental run reprocesses only the seasons whose fingerprint changed.
+    The row count and the sum of the row hashes: copies of a row change it, in a xor two copies cancel out -#}
+{% macro season_fingerprint(columns) %}
+  {{ return(adapter.dispatch('season_fingerprint')(columns)) }}
+{% endmacro %}
+
+{% macro default__season_fingerprint(columns) %}
+concat(cast(count(*) as string), ':',
+  cast(sum(cast(farm_fingerprint(to_json_string(struct({{ columns | join(', ') }}))) as numeric)) as string))
+{% endmacro %}
+
+{% macro duckdb__season_fingerprint(columns) %}
+cast(count(*) as varchar) || ':' || cast(sum(hash({{ columns | join(', ') }})) as varchar)
+{% endmacro %}
+
+{#- Post-hook of the incremental models: an incremental run replaces the seasons it selects only,
+    so the seasons no longer in the source (seasons_query, the years the model is built from) are deleted -#}
+{% macro delete_removed_seasons(seasons_query) %}
+  {{ return("delete from {{ this }} where year not in (" ~ seasons_query ~ ")") }}
+{% endmacro %}
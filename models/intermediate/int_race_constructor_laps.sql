@@ -0,0 +1,57 @@
+{#- Rendered in the post-hook -#}
+{% set season_years %}{% raw %}
+select r.year
+from {{ source('stage', 'external_table_lap_times') }} l
+inner join {{ source('stage', 'external_table_races') }} r
+  on r.raceid = l.raceid
+inner join {{ source('stage', 'external_table_results') }} res
+  on res.raceid = l.raceid and res.driverid = l.driverid
+{% endraw %}{% endset %}
+{{ config(
+    materialized='incremental',
+    incremental_strategy=('insert_overwrite' if target.type == 'bigquery' else 'delete+insert'),
+    unique_key='year',
+    partition_by={'field': 'year', 'data_type': 'int64', 'range': {'start': 1950, 'end': 2100, 'interval': 1}},
+    cluster_by = ['year', 'raceid'],
+    post_hook=delete_removed_seasons(season_years)
+) }}
+
+{#- Lap times of every constructor in every race, aggregated once per season:
+    the pace marts read these rows instead of the raw laps -#}
+with laps as (
+SELECT r.year, l.raceid, res.constructorid, l.driverid, l.lap, l.milliseconds
+FROM {{ source('stage', 'external_table_lap_times') }} l
+inner join {{ source('stage', 'external_table_races') }} r
+  on r.raceid = l.raceid
+inner join {{ source('stage', 'external_table_results') }} res
+  on res.raceid = l.raceid and res.driverid = l.driverid
+)
+, season_fingerprints as (
+select year,
+  {{ season_fingerprint(['raceid', 'constructorid', 'driverid', 'lap', 'milliseconds']) }} as season_fingerprint
+from laps
+group by year
+)
+{% if is_incremental() %}
+, changed_seasons as (
+select f.year
+from season_fingerprints f
+left join (select distinct year, season_fingerprint from {{ this }}) t
+  on t.year = f.year
+where t.season_fingerprint is null or t.season_fingerprint != f.season_fingerprint
+)
+{% endif %}
+select l.year,
+  l.raceid,
+  l.constructorid,
+  count(*) as laps,
+  {{ median('l.milliseconds') }} as median_lap_ms,
+  min(l.milliseconds) as best_lap_ms,
+  f.season_fingerprint
+from laps l
+inner join season_fingerprints f
+  on f.year = l.year
+{% if is_incremental() %}
+where l.year in (select year from changed_seasons)
+{% endif %}
+group by l.year, l.raceid, l.constructorid, f.season_fingerprint
@@ -0,0 +1,56 @@
+{#- Rendered in the post-hook -#}
+{% set season_years %}{% raw %}
+select r.year
+from {{ source('stage', 'external_table_pit_stops') }} p
+inner join {{ source('stage', 'external_table_races') }} r
+  on r.raceid = p.raceid
+inner join {{ source('stage', 'external_table_results') }} res
+  on res.raceid = p.raceid and res.driverid = p.driverid
+{% endraw %}{% endset %}
+{{ config(
+    materialized='incremental',
+    incremental_strategy=('insert_overwrite' if target.type == 'bigquery' else 'delete+insert'),
+    unique_key='year',
+    partition_by={'field': 'year', 'data_type': 'int64', 'range': {'start': 1950, 'end': 2100, 'interval': 1}},
+    cluster_by = ['year', 'raceid'],
+    post_hook=delete_removed_seasons(season_years)
+) }}
+
+{#- Pit stop times of every constructor in every race, aggregated once per season -#}
+with pit_stops as (
+SELECT r.year, p.raceid, res.constructorid, p.driverid, p.stop, p.milliseconds
+FROM {{ source('stage', 'external_table_pit_stops') }} p
+inner join {{ source('stage', 'external_table_races') }} r
+  on r.raceid = p.raceid
+inner join {{ source('stage', 'external_table_results') }} res
+  on res.raceid = p.raceid and res.driverid = p.driverid
+)
+, season_fingerprints as (
+select year,
+  {{ season_fingerprint(['raceid', 'constructorid', 'driverid', 'stop', 'milliseconds']) }} as season_fingerprint
+from pit_stops
+group by year
+)
+{% if is_incremental() %}
+, changed_seasons as (
+select f.year
+from season_fingerprints f
+left join (select distinct year, season_fingerprint from {{ this }}) t
+  on t.year = f.year
+where t.season_fingerprint is null or t.season_fingerprint != f.season_fingerprint
+)
+{% endif %}
+select p.year,
+  p.raceid,
+  p.constructorid,
+  count(*) as pit_stops,
+  {{ median('p.milliseconds') }} as median_pit_stop_ms,
+  sum(p.milliseconds) as total_pit_stop_ms,
+  f.season_fingerprint
+from pit_stops p
+inner join season_fingerprints f
+  on f.year = p.year
+{% if is_incremental() %}
+where p.year in (select year from changed_seasons)
+{% endif %}
+group by p.year, p.raceid, p.constructorid, f.season_fingerprint
@@ -1,8 +1,25 @@
-{{ config(materialized='table', cluster_by = 'year') }}
-
-select name, year, difference, 
-  constructor_result_points, difference*1.0/constructor_result_points as prc_own_points, 
-  year_points_sum, difference*1.0/year_points_sum as prc_all_points, 
-  two_constr_points_sum, difference*1.0/two_constr_points_sum as prc_top2_points
-from {{ ref('f1_stage') }}
-where place = 1
\ No newline at end of file
+{{ config(
+    materialized='incremental',
+    incremental_strategy=('insert_overwrite' if target.type == 'bigquery' else 'delete+insert'),
+    unique_key='year',
+    partition_by={'field': 'year', 'data_type': 'int64', 'range': {'start': 1950, 'end': 2100, 'interval': 1}},
+    cluster_by = 'year',
+    post_hook=delete_removed_seasons("select year from {{ ref('f1_stage') }}")
+) }}
+
+select name, year, difference, 
+  constructor_result_points, difference*1.0/constructor_result_points as prc_own_points, 
+  year_points_sum, difference*1.0/year_points_sum as prc_all_points, 
+  two_constr_points_sum, difference*1.0/two_constr_points_sum as prc_top2_points,
+  season_fingerprint
+from {{ ref('f1_stage') }}
+where place = 1
+{% if is_incremental() %}
+  and year in (
+    select s.year
+    from (select distinct year, season_fingerprint from {{ ref('f1_stage') }}) s
+    left join (select distinct year, season_fingerprint from {{ this }}) t
+      on t.year = s.year
+    where t.season_fingerprint is null or t.season_fingerprint != s.season_fingerprint
+  )
+{% endif %}
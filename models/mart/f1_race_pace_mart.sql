@@ -0,0 +1,40 @@
+{{ config(
+    materialized='table',
+    partition_by={'field': 'year', 'data_type': 'int64', 'range': {'start': 1950, 'end': 2100, 'interval': 1}},
+    cluster_by = 'year'
+) }}
+
+{#- Pace dominance of every race: the median lap time of the fastest team against the second one,
+    and the pit stop times of the two. Built from the per-race intermediate models, a few rows per race,
+    so it is rebuilt as a whole. Teams with less than pace_min_laps laps in a race are not ranked -#}
+with race_pace as (
+select l.year, l.raceid, c.name, l.median_lap_ms, p.median_pit_stop_ms,
+  row_number() over (partition by l.raceid order by l.median_lap_ms, c.name) as pace_rank
+from {{ ref('int_race_constructor_laps') }} l
+inner join {{ source('stage', 'external_table_constructors') }} c
+  on c.constructorid = l.constructorid
+left join {{ ref('int_race_constructor_pit_stops') }} p
+  on p.raceid = l.raceid and p.constructorid = l.constructorid
+where l.laps >= {{ var('pace_min_laps', 10) }}
+)
+, top2 as (
+select year, raceid,
+  max(case when pace_rank = 1 then name end) as name,
+  max(case when pace_rank = 2 then name end) as second_name,
+  max(case when pace_rank = 1 then median_lap_ms end) as median_lap_ms,
+  max(case when pace_rank = 2 then median_lap_ms end) as second_median_lap_ms,
+  max(case when pace_rank = 1 then median_pit_stop_ms end) as median_pit_stop_ms,
+  max(case when pace_rank = 2 then median_pit_stop_ms end) as second_median_pit_stop_ms
+from race_pace
+where pace_rank <= 2
+group by year, raceid
+)
+select t.year, t.raceid, r.round, r.name as race, t.name, t.second_name,
+  t.median_lap_ms, t.second_median_lap_ms,
+  t.second_median_lap_ms - t.median_lap_ms as lap_advantage_ms,
+  (t.second_median_lap_ms - t.median_lap_ms)*1.0/t.second_median_lap_ms as prc_lap_advantage,
+  t.median_pit_stop_ms, t.second_median_pit_stop_ms,
+  t.second_median_pit_stop_ms - t.median_pit_stop_ms as pit_stop_advantage_ms
+from top2 t
+inner join {{ source('stage', 'external_table_races') }} r
+  on r.raceid = t.raceid
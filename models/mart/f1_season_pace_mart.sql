@@ -0,0 +1,55 @@
+{{ config(
+    materialized='table',
+    partition_by={'field': 'year', 'data_type': 'int64', 'range': {'start': 1950, 'end': 2100, 'interval': 1}},
+    cluster_by = 'year'
+) }}
+
+{#- Pace dominance of every season: teams are ranked by their average gap to the fastest
+    median lap time of each race, the leader's advantage is the second team's gap minus its own.
+    Only teams ranked in at least half of the races of the season are ranked for the season -#}
+with race_gaps as (
+select year, raceid, constructorid,
+  median_lap_ms*1.0/min(median_lap_ms) over (partition by raceid) - 1 as gap_to_fastest
+from {{ ref('int_race_constructor_laps') }}
+where laps >= {{ var('pace_min_laps', 10) }}
+)
+, season_pace as (
+select g.year, g.constructorid,
+  count(*) as races,
+  avg(g.gap_to_fastest) as avg_gap_to_fastest,
+  sum(case when g.gap_to_fastest = 0 then 1 else 0 end) as fastest_races,
+  max(count(*)) over (partition by g.year) as season_races
+from race_gaps g
+group by g.year, g.constructorid
+)
+, season_pit_stops as (
+select year, constructorid, avg(median_pit_stop_ms) as avg_median_pit_stop_ms
+from {{ ref('int_race_constructor_pit_stops') }}
+group by year, constructorid
+)
+, ranked as (
+select s.year, c.name, s.races, s.avg_gap_to_fastest, s.fastest_races, p.avg_median_pit_stop_ms,
+  row_number() over (partition by s.year order by s.avg_gap_to_fastest, c.name) as pace_rank
+from season_pace s
+inner join {{ source('stage', 'external_table_constructors') }} c
+  on c.constructorid = s.constructorid
+left join season_pit_stops p
+  on p.year = s.year and p.constructorid = s.constructorid
+where s.races * 2 >= s.season_races
+)
+select year,
+  max(case when pace_rank = 1 then name end) as name,
+  max(case when pace_rank = 2 then name end) as second_name,
+  max(case when pace_rank = 1 then races end) as races,
+  max(case when pace_rank = 1 then fastest_races end) as fastest_races,
+  max(case when pace_rank = 1 then avg_gap_to_fastest end) as avg_gap_to_fastest,
+  max(case when pace_rank = 2 then avg_gap_to_fastest end) as second_avg_gap_to_fastest,
+  max(case when pace_rank = 2 then avg_gap_to_fastest end)
+    - max(case when pace_rank = 1 then avg_gap_to_fastest end) as prc_pace_advantage,
+  max(case when pace_rank = 1 then avg_median_pit_stop_ms end) as avg_median_pit_stop_ms,
+  max(case when pace_rank = 2 then avg_median_pit_stop_ms end) as second_avg_median_pit_stop_ms,
+  max(case when pace_rank = 2 then avg_median_pit_stop_ms end)
+    - max(case when pace_rank = 1 then avg_median_pit_stop_ms end) as pit_stop_advantage_ms
+from ranked
+where pace_rank <= 2
+group by year
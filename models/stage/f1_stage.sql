@@ -1,23 +1,65 @@
-{{ config(materialized='table', cluster_by = 'year') }}
-
-with constr_year_results as (
-SELECT distinct c.name, 
-  sum(points) over (partition by c.name, r.year) as constructor_result_points, 
-  r.year
-FROM {{ source('stage', 'external_table_constructor_results') }} cr
-inner join {{ source('stage', 'external_table_races') }} r
-  on r.raceid = cr.raceid
-inner join {{ source('stage', 'external_table_constructors') }} c
-  on c.constructorid = cr.constructorid 
-)
-select name, 
-  constructor_result_points, 
-  year,
-  rank() over (partition by year order by constructor_result_points desc) as place,
-  constructor_result_points - (lead(constructor_result_points) over 
-                (partition by year order by constructor_result_points desc)) as difference,
-  sum(constructor_result_points) over (partition by year) as year_points_sum,
-  sum(constructor_result_points) over (partition by year 
-                    order by constructor_result_points desc 
-                    rows between current row and 1 following) as two_constr_points_sum
-from constr_year_results
\ No newline at end of file
+{#- Rendered in the post-hook -#}
+{% set season_years %}{% raw %}
+select r.year
+from {{ source('stage', 'external_table_constructor_results') }} cr
+inner join {{ source('stage', 'external_table_races') }} r
+  on r.raceid = cr.raceid
+inner join {{ source('stage', 'external_table_constructors') }} c
+  on c.constructorid = cr.constructorid
+{% endraw %}{% endset %}
+{{ config(
+    materialized='incremental',
+    incremental_strategy=('insert_overwrite' if target.type == 'bigquery' else 'delete+insert'),
+    unique_key='year',
+    partition_by={'field': 'year', 'data_type': 'int64', 'range': {'start': 1950, 'end': 2100, 'interval': 1}},
+    cluster_by = 'year',
+    post_hook=delete_removed_seasons(season_years)
+) }}
+
+with season_results as (
+SELECT cr.constructorresultsid, c.name, cr.points, r.year
+FROM {{ source('stage', 'external_table_constructor_results') }} cr
+inner join {{ source('stage', 'external_table_races') }} r
+  on r.raceid = cr.raceid
+inner join {{ source('stage', 'external_table_constructors') }} c
+  on c.constructorid = cr.constructorid 
+)
+, season_fingerprints as (
+select year, 
+  {{ season_fingerprint(['constructorresultsid', 'name', 'points']) }} as season_fingerprint
+from season_results
+group by year
+)
+{% if is_incremental() %}
+, changed_seasons as (
+select f.year
+from season_fingerprints f
+left join (select distinct year, season_fingerprint from {{ this }}) t
+  on t.year = f.year
+where t.season_fingerprint is null or t.season_fingerprint != f.season_fingerprint
+)
+{% endif %}
+, constr_year_results as (
+SELECT name, 
+  sum(points) as constructor_result_points, 
+  year
+FROM season_results
+{% if is_incremental() %}
+where year in (select year from changed_seasons)
+{% endif %}
+group by name, year
+)
+select cyr.name, 
+  cyr.constructor_result_points, 
+  cyr.year,
+  rank() over (partition by cyr.year order by cyr.constructor_result_points desc) as place,
+  cyr.constructor_result_points - (lead(cyr.constructor_result_points) over 
+                (partition by cyr.year order by cyr.constructor_result_points desc, cyr.name)) as difference,
+  sum(cyr.constructor_result_points) over (partition by cyr.year) as year_points_sum,
+  sum(cyr.constructor_result_points) over (partition by cyr.year 
+                    order by cyr.constructor_result_points desc, cyr.name
+                    rows between current row and 1 following) as two_constr_points_sum,
+  f.season_fingerprint
+from constr_year_results cyr
+inner join season_fingerprints f
+  on f.year = cyr.year
@@ -0,0 +1,196 @@
+"""
+Read service over the f1_mart dominance metrics.
+The mart (one row per season, one per team tied for first) is loaded into memory, indexed by year and team,
+and every query is answered from an LRU cache in front of the index.
+data_ingestion_gcs_dag calls POST /refresh after each successful dbt run.
+
+    GET  /seasons                               all seasons
+    GET  /seasons?metric=prc_own_points&min=0.25 seasons with the metric above a threshold
+    GET  /seasons/<year>                        one season, a row per team tied for first
+    GET  /teams/<name>                          seasons won by a team
+    POST /refresh                               reloads the mart, with "Authorization: Bearer $MART_REFRESH_TOKEN",
+                                                from the same host only if MART_REFRESH_TOKEN is not set
+
+    MART_SOURCE=bigquery python serving/f1_mart_api.py --port 8090
+    MART_SOURCE=duckdb F1_DUCKDB_PATH=f1.duckdb python serving/f1_mart_api.py
+"""
+import os
+import hmac
+import json
+import bisect
+import logging
+import argparse
+import functools
+import threading
+import ipaddress
+from urllib.parse import parse_qs, unquote, urlparse
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# "bigquery" reads the dbt target dataset, "duckdb" the local DuckDB database of local/profiles.yml
+MART_SOURCE = os.environ.get("MART_SOURCE", "bigquery")
+MART_TABLE = os.environ.get("MART_TABLE", "zoomcampproject.f1_data_all.f1_mart")
+DUCKDB_PATH = os.environ.get("F1_DUCKDB_PATH", "f1.duckdb")
+CACHE_SIZE = int(os.environ.get("MART_CACHE_SIZE", 1024))
+# Shared secret of POST /refresh, the DAG sends it from the same variable
+REFRESH_TOKEN = os.environ.get("MART_REFRESH_TOKEN")
+METRICS = ["prc_own_points", "prc_all_points", "prc_top2_points"]
+COLUMNS = ["name", "year", "difference", "constructor_result_points", "year_points_sum",
+           "two_constr_points_sum"] + METRICS
+
+
+def load_mart(source=MART_SOURCE):
+    """
+    :param source: "bigquery" or "duckdb"
+    :return: f1_mart rows as dicts
+    """
+    query = f"SELECT {', '.join(COLUMNS)} FROM {{table}} ORDER BY year"
+    if source == "duckdb":
+        import duckdb
+
+        connection = duckdb.connect(DUCKDB_PATH, read_only=True)
+        cursor = connection.execute(query.format(table="f1_data_all.f1_mart"))
+        names = [column[0] for column in cursor.description]
+        return [dict(zip(names, row)) for row in cursor.fetchall()]
+    from google.cloud import bigquery
+
+    return [dict(row) for row in bigquery.Client().query(query.format(table=f"`{MART_TABLE}`")).result()]
+
+
+class MartIndex:
+    """f1_mart rows indexed by year, by team and sorted by every dominance metric"""
+
+    def __init__(self, rows):
+        self.rows = sorted(rows, key=lambda row: row["year"])
+        self.by_year = {}
+        self.by_team = {}
+        for row in self.rows:
+            # Teams tied for first (e.g. on points) share the season
+            self.by_year.setdefault(row["year"], []).append(row)
+            self.by_team.setdefault(row["name"].lower(), []).append(row)
+        self.by_metric = {}
+        for metric in METRICS:
+            ranked = sorted((row for row in self.rows if row[metric] is not None), key=lambda row: row[metric])
+            self.by_metric[metric] = ([row[metric] for row in ranked], ranked)
+
+    def season(self, year):
+        return self.by_year.get(year, [])
+
+    def team(self, name):
+        return self.by_team.get(name.lower(), [])
+
+    def seasons(self, metric=None, minimum=None, maximum=None):
+        """
+        :param metric: dominance metric the seasons are filtered by
+        :param minimum: seasons with the metric above it
+        :param maximum: seasons with the metric at most it
+        :return: seasons in year order
+        """
+        if metric is None:
+            return self.rows
+        values, ranked = self.by_metric[metric]
+        start = 0 if minimum is None else bisect.bisect_right(values, minimum)
+        end = len(values) if maximum is None else bisect.bisect_right(values, maximum)
+        return sorted(ranked[start:end], key=lambda row: row["year"])
+
+
+class MartService:
+    """Answers the queries from an LRU cache, a refresh swaps the index and drops the cache"""
+
+    def __init__(self, loader=load_mart, cache_size=CACHE_SIZE):
+        self.loader = loader
+        self.lock = threading.Lock()
+        self.index = MartIndex([])
+        # The index is part of the key, a query that raced a refresh never caches a result of the old index
+        self.cache = functools.lru_cache(maxsize=cache_size)(self.run_query)
+
+    def refresh(self):
+        index = MartIndex(self.loader())
+        with self.lock:
+            self.index = index
+            self.cache.cache_clear()
+        logging.info(f"Loaded {len(index.rows)} f1_mart seasons")
+        return len(index.rows)
+
+    def query(self, kind, *args):
+        """
+        :param kind: "season" (year), "team" (name) or "seasons" (metric, minimum, maximum)
+        :return: the row or rows of the query
+        """
+        return self.cache(self.index, kind, *args)
+
+    @staticmethod
+    def run_query(index, kind, *args):
+        if kind == "season":
+            return index.season(*args)
+        if kind == "team":
+            return index.team(*args)
+        return index.seasons(*args)
+
+
+def to_json(value):
+    return json.dumps(value, default=str).encode("utf-8")
+
+
+def make_handler(service, refresh_token=REFRESH_TOKEN):
+    """
+    :param service: MartService the requests are answered from
+    :param refresh_token: bearer token POST /refresh requires, None to accept it from loopback clients only
+    """
+    class Handler(BaseHTTPRequestHandler):
+        def send(self, status, body):
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def do_GET(self):
+            url = urlparse(self.path)
+            parts = [unquote(part) for part in url.path.strip("/").split("/")]
+            params = {key: values[-1] for key, values in parse_qs(url.query).items()}
+            try:
+                if parts == ["seasons"]:
+                    metric = params.get("metric")
+                    if metric is not None and metric not in METRICS:
+                        return self.send(400, to_json({"error": f"metric is one of {METRICS}"}))
+                    minimum = float(params["min"]) if "min" in params else None
+                    maximum = float(params["max"]) if "max" in params else None
+                    return self.send(200, to_json(service.query("seasons", metric, minimum, maximum)))
+                if len(parts) == 2 and parts[0] == "seasons":
+                    season = service.query("season", int(parts[1]))
+                    return self.send(200 if season else 404, to_json(season))
+                if len(parts) == 2 and parts[0] == "teams":
+                    return self.send(200, to_json(service.query("team", parts[1])))
+            except ValueError as error:
+                return self.send(400, to_json({"error": str(error)}))
+            self.send(404, to_json({"error": "not found"}))
+
+        def is_refresh_allowed(self):
+            if refresh_token is None:
+                return ipaddress.ip_address(self.client_address[0]).is_loopback
+            authorization = self.headers.get("Authorization", "")
+            return hmac.compare_digest(authorization.encode("utf-8"), f"Bearer {refresh_token}".encode("utf-8"))
+
+        def do_POST(self):
+            if self.path.rstrip("/") != "/refresh":
+                return self.send(404, to_json({"error": "not found"}))
+            if not self.is_refresh_allowed():
+                return self.send(401 if refresh_token else 403, to_json({"error": "refresh not allowed"}))
+            self.send(200, to_json({"seasons": service.refresh()}))
+
+        def log_message(self, *args):
+            pass
+
+    return Handler
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--port", type=int, default=8090)
+    args = parser.parse_args()
+
+    service = MartService()
+    service.refresh()
+    ThreadingHTTPServer((args.host, args.port), make_handler(service)).serve_forever()
@@ -0,0 +1,123 @@
+"""
+Load test of the f1_mart serving API, reports p50/p99 latency per query type.
+Without --url the queries run in-process against the service (the index and LRU cache alone),
+with --url they go over HTTP from --clients concurrent clients.
+
+    python serving/load_test.py --synthetic 75
+    python serving/load_test.py --url http://localhost:8090 --clients 8
+"""
+import json
+import time
+import random
+import argparse
+import statistics
+import urllib.error
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+
+from f1_mart_api import METRICS, MartService, load_mart
+
+TEAMS = ["Ferrari", "McLaren", "Williams", "Mercedes", "Red Bull", "Lotus", "Brabham", "Renault"]
+
+
+def synthetic_mart(seasons):
+    """
+    :param seasons: number of seasons
+    :return: f1_mart-like rows, one winner per season
+    """
+    rows = []
+    for year in range(1950, 1950 + seasons):
+        points = random.randint(80, 800)
+        rows.append({
+            "name": random.choice(TEAMS), "year": year, "difference": random.randint(0, 300),
+            "constructor_result_points": points, "year_points_sum": points * 4, "two_constr_points_sum": points * 2,
+            "prc_own_points": round(random.uniform(0.15, 0.45), 4), "prc_all_points": round(random.uniform(0.2, 0.5), 4),
+            "prc_top2_points": round(random.uniform(0.5, 0.8), 4),
+        })
+    return rows
+
+
+def make_queries(years, count):
+    """
+    :param years: seasons in the mart
+    :param count: number of queries
+    :return: (query type, service.query args, URL path) tuples
+    """
+    queries = []
+    for _ in range(count):
+        kind = random.choice(["season", "team", "threshold"])
+        if kind == "season":
+            year = random.choice(years)
+            queries.append((kind, ("season", year), f"/seasons/{year}"))
+        elif kind == "team":
+            team = random.choice(TEAMS)
+            queries.append((kind, ("team", team), f"/teams/{urllib.request.quote(team)}"))
+        else:
+            metric, minimum = random.choice(METRICS), random.choice([0.2, 0.25, 0.3, 0.5])
+            queries.append((kind, ("seasons", metric, minimum, None), f"/seasons?metric={metric}&min={minimum}"))
+    return queries
+
+
+def percentile(values, share):
+    return statistics.quantiles(values, n=100)[share - 1] if len(values) > 1 else values[0]
+
+
+def report(latencies):
+    print(f"{'query':<10} {'count':>8} {'p50 us':>10} {'p99 us':>10}")
+    for kind, values in sorted(latencies.items()):
+        print(f"{kind:<10} {len(values):>8} {percentile(values, 50) * 1e6:>10.1f} {percentile(values, 99) * 1e6:>10.1f}")
+
+
+def run_in_process(service, queries):
+    latencies = {}
+    for kind, args, _ in queries:
+        start = time.perf_counter()
+        service.query(*args)
+        latencies.setdefault(kind, []).append(time.perf_counter() - start)
+    return latencies
+
+
+def run_http(url, queries, clients):
+    def request(query):
+        kind, _, path = query
+        start = time.perf_counter()
+        try:
+            with urllib.request.urlopen(f"{url.rstrip('/')}{path}") as response:
+                response.read()
+        except urllib.error.HTTPError as error:
+            # 404 of a team without seasons is still a served query
+            error.read()
+        return kind, time.perf_counter() - start
+
+    latencies = {}
+    with ThreadPoolExecutor(max_workers=clients) as pool:
+        for kind, latency in pool.map(request, queries):
+            latencies.setdefault(kind, []).append(latency)
+    return latencies
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--url', help='base URL of a running serving API')
+    parser.add_argument('--synthetic', type=int, help='serve this many synthetic seasons instead of the mart')
+    parser.add_argument('--queries', type=int, default=100000)
+    parser.add_argument('--clients', type=int, default=4)
+    parser.add_argument('--seed', type=int, default=42)
+    args = parser.parse_args()
+
+    random.seed(args.seed)
+    if args.url:
+        with urllib.request.urlopen(f"{args.url.rstrip('/')}/seasons") as response:
+            years = sorted({row["year"] for row in json.load(response)})
+        if not years:
+            raise SystemExit(f"{args.url} serves no seasons, load f1_mart first")
+        report(run_http(args.url, make_queries(years, args.queries), args.clients))
+    else:
+        rows = synthetic_mart(args.synthetic) if args.synthetic is not None else None
+        service = MartService(loader=(lambda: rows) if rows is not None else load_mart)
+        service.refresh()
+        years = list(service.index.by_year)
+        if not years:
+            raise SystemExit("f1_mart has no seasons, load it first or use --synthetic")
+        report(run_in_process(service, make_queries(years, args.queries)))
+        print(service.cache.cache_info())
@@ -0,0 +1,33 @@
+import os
+import sys
+import uuid
+
+import pytest
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+# The DAG modules and the scripts import each other by module name, as on the Airflow workers
+sys.path[:0] = [os.path.join(ROOT_DIR, 'airflow', 'dags'), os.path.join(ROOT_DIR, 'airflow', 'scripts'),
+                os.path.join(ROOT_DIR, 'serving')]
+
+
+@pytest.fixture
+def gcs_bucket():
+    """
+    Empty bucket on the fake GCS server of STORAGE_EMULATOR_HOST, deleted after the test:
+        docker run -d -p 4443:4443 fsouza/fake-gcs-server -scheme http -public-host localhost:4443
+        STORAGE_EMULATOR_HOST=http://localhost:4443 python -m pytest
+    """
+    if not os.environ.get('STORAGE_EMULATOR_HOST'):
+        pytest.skip("STORAGE_EMULATOR_HOST is not set, start fake-gcs first")
+    from google.api_core.exceptions import Conflict
+    from gcs_uploader import get_storage_client
+
+    bucket = get_storage_client().create_bucket(f"test-{uuid.uuid4().hex[:12]}")
+    yield bucket.name
+    for blob in bucket.list_blobs():
+        blob.delete()
+    try:
+        bucket.delete()
+    except Conflict:
+        # An upload session a test left unfinished on purpose, the bucket names are unique
+        pass
@@ -0,0 +1,101 @@
+"""
+Tests of the snapshot backfill (f1_backfill_dag) against fake GCS (see the gcs_bucket fixture)
+"""
+import os
+import zipfile
+
+import pytest
+
+pytest.importorskip("airflow.providers.google")
+pytest.importorskip("google.cloud.storage")
+
+import data_ingestion_gcs_dag  # noqa: E402
+from benchmark_pipeline import serve  # noqa: E402
+from generate_f1db import generate  # noqa: E402
+from gcs_uploader import get_storage_client  # noqa: E402
+from data_ingestion_gcs_dag import backfill_snapshot, create_backfill_tables  # noqa: E402
+
+
+@pytest.fixture
+def airflow_home(tmp_path, monkeypatch):
+    home = tmp_path / "airflow"
+    (home / "dags").mkdir(parents=True)
+    (home / "dags" / "data_ingestion_gcs_dag.py").write_text("")
+    monkeypatch.setattr(data_ingestion_gcs_dag, "path_to_local_home", str(home))
+    return home
+
+
+@pytest.fixture
+def snapshot_url(tmp_path):
+    """
+    :return: url of a snapshot from before the sprints, with no sprint_results.csv
+    """
+    serve_dir = tmp_path / "serve"
+    serve_dir.mkdir()
+    generate(str(tmp_path / "full.zip"), scale=0.05)
+    with zipfile.ZipFile(tmp_path / "full.zip") as full, \
+            zipfile.ZipFile(serve_dir / "2020-12-01.zip", "w", zipfile.ZIP_DEFLATED) as snapshot:
+        for info in full.infolist():
+            if info.filename != "sprint_results.csv":
+                snapshot.writestr(info, full.read(info))
+    server = serve(str(serve_dir))
+    yield f"http://127.0.0.1:{server.server_port}/2020-12-01.zip"
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.mark.parametrize("version, prefix", [
+    ("../dags", "backfill"),
+    ("..", "backfill"),
+    ("2021-12-01", "../backfill"),
+    ("2021-12-01", "backfill/nested"),
+    ("2021 12 01", "backfill"),
+])
+def test_run_conf_names_are_validated_before_use(airflow_home, version, prefix):
+    with pytest.raises(ValueError, match="must match"):
+        backfill_snapshot("http://127.0.0.1:1/f1db_csv.zip", version, "f1-test", prefix=prefix)
+    with pytest.raises(ValueError, match="must match"):
+        create_backfill_tables("f1-test", version, prefix=prefix)
+    # Nothing was created or removed outside the backfill folder
+    assert (airflow_home / "dags" / "data_ingestion_gcs_dag.py").exists()
+    assert not (airflow_home / "backfill").exists()
+
+
+def test_snapshot_without_a_table_is_backfilled(airflow_home, gcs_bucket, snapshot_url):
+    summary = backfill_snapshot(snapshot_url, "2020-12-01", gcs_bucket, workers=1)
+    assert summary["missing_tables"] == ["sprint_results"]
+    names = {blob.name for blob in get_storage_client().bucket(gcs_bucket).list_blobs(prefix="backfill/2020-12-01/")}
+    assert "backfill/2020-12-01/raw/results.parquet" in names
+    assert not any("sprint_results" in name for name in names)
+    assert not os.path.exists(airflow_home / "backfill" / "2020-12-01")
+
+
+class FakeBigQueryClient:
+    """Records the tables create_backfill_tables creates"""
+
+    def __init__(self, created, *args, **kwargs):
+        self.created = created
+
+    def get_dataset(self, dataset_id):
+        return type("Dataset", (), {"location": "EU"})()
+
+    def create_dataset(self, dataset, exists_ok=False):
+        pass
+
+    def delete_table(self, table, not_found_ok=False):
+        pass
+
+    def create_table(self, table):
+        self.created.append(table.table_id)
+
+
+def test_external_tables_are_created_for_the_uploaded_tables(airflow_home, gcs_bucket, snapshot_url, monkeypatch):
+    from google.cloud import bigquery
+
+    backfill_snapshot(snapshot_url, "2020-12-01", gcs_bucket, workers=1)
+    created = []
+    monkeypatch.setattr(bigquery, "Client", lambda *args, **kwargs: FakeBigQueryClient(created))
+    create_backfill_tables(gcs_bucket, "2020-12-01")
+    assert "external_table_results" in created
+    assert "external_table_sprint_results" not in created
+    assert len(created) == len(data_ingestion_gcs_dag.TABLES) - 1
@@ -0,0 +1,73 @@
+"""
+Tests of batch_format_to_parquet, the conversion of all tables from one forked process pool
+"""
+import os
+
+import pytest
+
+pytest.importorskip("airflow.providers.google")
+pytest.importorskip("google.cloud.storage")
+import pyarrow.parquet as pq  # noqa: E402
+
+import gcs_uploader  # noqa: E402
+import data_ingestion_gcs_dag  # noqa: E402
+from f1_tables import TABLES  # noqa: E402
+from generate_f1db import generate  # noqa: E402
+
+TABLE_NAMES = ["races", "drivers", "constructors", "results", "lap_times"]
+
+
+class TaskInstance:
+    def __init__(self):
+        self.xcom = {}
+
+    def xcom_push(self, key, value):
+        self.xcom[key] = value
+
+
+@pytest.fixture
+def tables(tmp_path):
+    zip_path = str(tmp_path / "f1db_csv.zip")
+    generate(zip_path, scale=0.1)
+    return zip_path, [{"name": table["name"], "src_file": None, "dest_file": str(tmp_path / f"{table['name']}.parquet"),
+                       "object_name": f"raw/{table['name']}.parquet", "member": table["member"],
+                       "schema": table["schema"], "partitioning": None}
+                      for table in TABLES if table["name"] in TABLE_NAMES]
+
+
+def test_pool_processes_never_read_gcs(tables, monkeypatch):
+    zip_path, kwargs = tables
+    parent = os.getpid()
+    manifest = {table["member"]: {"columns": data_ingestion_gcs_dag.get_table_fingerprints(zip_path)[table["member"]]
+                                  ["columns"]} for table in kwargs}
+
+    def read_manifest(bucket, object_name=None):
+        assert os.getpid() == parent, "the manifest is read in a pool process"
+        return manifest
+
+    monkeypatch.setattr(data_ingestion_gcs_dag, "read_manifest", read_manifest)
+    monkeypatch.setattr(data_ingestion_gcs_dag, "skip_unchanged_tables", False)
+    # A client cached before the pool is forked, as in a worker that already uploaded
+    gcs_uploader.get_storage_client.cache_clear()
+    monkeypatch.setattr(gcs_uploader.storage, "Client", object)
+    inherited = gcs_uploader.get_storage_client()
+
+    ti = TaskInstance()
+    data_ingestion_gcs_dag.batch_format_to_parquet(kwargs, "f1-test", zip_path, workers=2, ti=ti)
+    assert gcs_uploader.get_storage_client() is inherited
+    gcs_uploader.get_storage_client.cache_clear()
+
+    reports = {report["table"]: report for report in ti.xcom["quality"]}
+    # The foreign keys were checked against the dimension keys read by the task process
+    assert reports["results"]["passed"] and reports["lap_times"]["passed"]
+    for table in kwargs:
+        assert pq.read_metadata(table["dest_file"]).num_rows == ti.xcom[table["name"]]["rows"]
+
+
+def test_pool_processes_drop_the_inherited_storage_client(monkeypatch):
+    gcs_uploader.get_storage_client.cache_clear()
+    monkeypatch.setattr(gcs_uploader.storage, "Client", object)
+    inherited = gcs_uploader.get_storage_client()
+    data_ingestion_gcs_dag.reset_storage_client()
+    assert gcs_uploader.get_storage_client() is not inherited
+    gcs_uploader.get_storage_client.cache_clear()
@@ -0,0 +1,80 @@
+"""
+pytest-benchmark suite of the ingestion on a synthetic archive of F1_BENCHMARK_SCALE× the f1db size,
+every stage timed over F1_BENCHMARK_ROUNDS rounds. Save a baseline and fail on a stage slower than it:
+    python -m pytest tests/test_benchmark_pipeline.py --benchmark-autosave
+    python -m pytest tests/test_benchmark_pipeline.py --benchmark-compare --benchmark-compare-fail=min:20%
+The upload runs only against fake GCS (see the gcs_bucket fixture), the pace marts only with dbt-duckdb.
+"""
+import os
+import shutil
+
+import pytest
+
+pytest.importorskip("pytest_benchmark")
+pytest.importorskip("airflow.providers.google")
+
+from generate_f1db import generate  # noqa: E402
+from benchmark_pipeline import (serve, stage_convert, stage_download, stage_model,  # noqa: E402
+                                stage_pace_models, stage_upload)
+
+SCALE = float(os.environ.get("F1_BENCHMARK_SCALE", 1))
+ROUNDS = int(os.environ.get("F1_BENCHMARK_ROUNDS", 3))
+
+
+@pytest.fixture(scope="module")
+def archive_url(tmp_path_factory):
+    serve_dir = tmp_path_factory.mktemp("serve")
+    generate(str(serve_dir / "f1db_csv.zip"), SCALE)
+    server = serve(str(serve_dir))
+    yield f"http://127.0.0.1:{server.server_port}/f1db_csv.zip"
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.fixture(scope="module")
+def zip_path(archive_url, tmp_path_factory):
+    return stage_download(archive_url, str(tmp_path_factory.mktemp("download")))
+
+
+@pytest.fixture(scope="module")
+def parquet_dir(zip_path, tmp_path_factory):
+    parquet_dir, _ = stage_convert(zip_path, str(tmp_path_factory.mktemp("convert")), partitioned=False)
+    return parquet_dir
+
+
+def test_download(benchmark, archive_url, tmp_path):
+    dest_file = benchmark.pedantic(stage_download, args=(archive_url, str(tmp_path)), rounds=ROUNDS, iterations=1)
+    assert os.path.getsize(dest_file) > 0
+
+
+@pytest.mark.parametrize("partitioned", [False, True], ids=["files", "partitioned"])
+def test_convert(benchmark, zip_path, tmp_path, partitioned):
+    _, rows = benchmark.pedantic(stage_convert, args=(zip_path, str(tmp_path), partitioned),
+                                 rounds=ROUNDS, iterations=1)
+    assert rows > 0
+
+
+def test_upload(benchmark, gcs_bucket, parquet_dir):
+    benchmark.pedantic(stage_upload, args=(gcs_bucket, parquet_dir), rounds=ROUNDS, iterations=1)
+
+
+def test_model(benchmark, parquet_dir):
+    assert benchmark.pedantic(stage_model, args=(parquet_dir,), rounds=ROUNDS, iterations=1) > 0
+
+
+@pytest.fixture
+def dbt_work_dir(tmp_path):
+    pytest.importorskip("dbt.adapters.duckdb")
+    if shutil.which("dbt") is None:
+        pytest.skip("dbt is not installed")
+    return str(tmp_path)
+
+
+def test_pace_models_full_refresh(benchmark, parquet_dir, dbt_work_dir):
+    benchmark.pedantic(stage_pace_models, args=(parquet_dir, dbt_work_dir, True), rounds=ROUNDS, iterations=1)
+
+
+def test_pace_models_incremental(benchmark, parquet_dir, dbt_work_dir):
+    # The incremental run on unchanged seasons, after a first full build
+    stage_pace_models(parquet_dir, dbt_work_dir, True)
+    benchmark.pedantic(stage_pace_models, args=(parquet_dir, dbt_work_dir, False), rounds=ROUNDS, iterations=1)
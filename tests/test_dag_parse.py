@@ -0,0 +1,47 @@
+"""
+Tests of the parse budget of data_ingestion_gcs_dag, checked by scripts/check_dag_parse.py in a fresh interpreter
+as the DAG file processor would parse it
+"""
+import os
+import sys
+import json
+import subprocess
+
+import pytest
+
+pytest.importorskip("airflow.providers.google")
+
+from conftest import ROOT_DIR  # noqa: E402
+
+CHECK_SCRIPT = os.path.join(ROOT_DIR, 'airflow', 'scripts', 'check_dag_parse.py')
+MAX_SECONDS = 2
+MAX_RSS_MB = 100
+
+
+def check_dag_parse(*args, env=None):
+    """
+    :return: exit code of the check and its JSON report
+    """
+    process = subprocess.run([sys.executable, CHECK_SCRIPT, '--json', '--max-seconds', str(MAX_SECONDS),
+                              '--max-rss-mb', str(MAX_RSS_MB), *args],
+                             capture_output=True, text=True, timeout=120, env=env)
+    return process.returncode, json.loads(process.stdout)
+
+
+def test_dag_parses_within_the_budget():
+    returncode, report = check_dag_parse()
+    assert report["seconds"] < MAX_SECONDS
+    assert report["rss_mb"] < MAX_RSS_MB
+    # Not imported by the DAG or its modules, only by the task callables
+    assert report["deferred_modules"] == []
+    assert returncode == 0
+
+
+def test_deferred_import_at_parse_time_fails_the_check(tmp_path):
+    pytest.importorskip("pyarrow")
+    (tmp_path / "heavy_dag.py").write_text("import pyarrow.parquet\n\n"
+                                           "dag = type('DAG', (), {'tasks': []})()\n")
+    env = dict(os.environ, PYTHONPATH=os.pathsep.join([str(tmp_path), os.environ.get('PYTHONPATH', '')]))
+    returncode, report = check_dag_parse('--dag-module', 'heavy_dag', env=env)
+    assert report["deferred_modules"] == ["pyarrow"]
+    assert returncode == 1
@@ -0,0 +1,137 @@
+"""
+Tests of the conditional, resumable dataset download against a local stand-in of the Ergast server
+"""
+import os
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+import requests
+
+from dataset_download import DOWNLOAD_CHUNK_SIZE, download_dataset
+
+
+class DatasetHandler(BaseHTTPRequestHandler):
+    """
+    Serves server.content with server.etag, answers If-None-Match with 304 and Range with If-Range with 206,
+    closes the connection after server.drop_after bytes of the body once
+    """
+
+    def do_GET(self):
+        server = self.server
+        server.requests.append(dict(self.headers))
+        content, etag = server.content, server.etag
+        if self.headers.get("If-None-Match") == etag:
+            self.send_response(304)
+            self.send_header("ETag", etag)
+            self.end_headers()
+            return
+        start, status = 0, 200
+        byte_range = self.headers.get("Range")
+        if byte_range and self.headers.get("If-Range") == etag:
+            start = int(byte_range.split("=")[1].rstrip("-"))
+            if start >= len(content):
+                self.send_response(416)
+                self.send_header("Content-Range", f"bytes */{len(content)}")
+                self.send_header("Content-Length", "0")
+                self.end_headers()
+                return
+            status = 206
+        body = content[start:]
+        self.send_response(status)
+        self.send_header("ETag", etag)
+        self.send_header("Content-Length", str(len(body)))
+        if status == 206:
+            self.send_header("Content-Range", f"bytes {start}-{len(content) - 1}/{len(content)}")
+        self.end_headers()
+        if server.drop_after is not None:
+            body, server.drop_after = body[:server.drop_after], None
+            self.wfile.write(body)
+            self.close_connection = True
+            return
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def server():
+    server = ThreadingHTTPServer(("127.0.0.1", 0), DatasetHandler)
+    server.content = os.urandom(3 * DOWNLOAD_CHUNK_SIZE)
+    server.etag = '"v1"'
+    server.drop_after = None
+    server.requests = []
+    server.url = f"http://127.0.0.1:{server.server_port}/f1db_csv.zip"
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.fixture
+def dest_file(tmp_path):
+    return str(tmp_path / "f1db_csv.zip")
+
+
+def read(path):
+    with open(path, "rb") as f:
+        return f.read()
+
+
+def test_download_keeps_the_validators(server, dest_file):
+    assert download_dataset(server.url, dest_file) is True
+    assert read(dest_file) == server.content
+    with open(f"{dest_file}.meta.json") as f:
+        assert json.load(f)["etag"] == '"v1"'
+    assert not os.path.exists(f"{dest_file}.part")
+
+
+def test_unmodified_dataset_is_not_downloaded_again(server, dest_file):
+    download_dataset(server.url, dest_file)
+    assert download_dataset(server.url, dest_file) is False
+    assert server.requests[-1]["If-None-Match"] == '"v1"'
+    assert read(dest_file) == server.content
+
+
+def test_modified_dataset_replaces_the_cache(server, dest_file):
+    download_dataset(server.url, dest_file)
+    server.content, server.etag = os.urandom(1000), '"v2"'
+    assert download_dataset(server.url, dest_file) is True
+    assert read(dest_file) == server.content
+
+
+def test_interrupted_download_resumes_with_range(server, dest_file):
+    server.drop_after = 2 * DOWNLOAD_CHUNK_SIZE - 100
+    with pytest.raises(requests.RequestException):
+        download_dataset(server.url, dest_file)
+    part_size = os.path.getsize(f"{dest_file}.part")
+    assert 0 < part_size < len(server.content)
+
+    assert download_dataset(server.url, dest_file) is True
+    assert server.requests[-1]["Range"] == f"bytes={part_size}-"
+    assert server.requests[-1]["If-Range"] == '"v1"'
+    assert read(dest_file) == server.content
+
+
+def test_partial_download_of_a_replaced_dataset_starts_over(server, dest_file):
+    server.drop_after = 2 * DOWNLOAD_CHUNK_SIZE - 100
+    with pytest.raises(requests.RequestException):
+        download_dataset(server.url, dest_file)
+    # If-Range no longer matches, the server sends the whole new archive with 200
+    server.content, server.etag = os.urandom(DOWNLOAD_CHUNK_SIZE + 10), '"v2"'
+    assert download_dataset(server.url, dest_file) is True
+    assert read(dest_file) == server.content
+
+
+def test_unsatisfiable_range_starts_over(server, dest_file):
+    # A partial download as long as the archive, e.g. left by a crash before it was renamed
+    with open(f"{dest_file}.part", "wb") as f:
+        f.write(server.content)
+    with open(f"{dest_file}.part.meta.json", "w") as f:
+        json.dump({"etag": '"v1"', "last_modified": None}, f)
+
+    assert download_dataset(server.url, dest_file) is True
+    assert "Range" in server.requests[0] and "Range" not in server.requests[1]
+    assert read(dest_file) == server.content
@@ -0,0 +1,132 @@
+"""
+Tests of the deferred dbt Cloud run against a local stand-in of the dbt Cloud API
+"""
+import json
+import asyncio
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+pytest.importorskip("airflow.providers.http")
+from airflow.exceptions import AirflowException, TaskDeferred  # noqa: E402
+
+from dbt_job import (DBT_RUN_CANCELLED, DBT_RUN_ERROR, DBT_RUN_SUCCESS,  # noqa: E402
+                     DbtCloudRunTrigger, DbtJobRunOperator)
+
+DBT_RUN_RUNNING = 3
+ACCOUNT_ID, JOB_ID, RUN_ID = 1, 7, 42
+TOKEN = "token123"
+
+
+class DbtCloudHandler(BaseHTTPRequestHandler):
+    """
+    Starts run RUN_ID of job JOB_ID and answers its polls with server.statuses in order, the last one repeated.
+    A status of 500 is answered as a server error.
+    """
+
+    def do_POST(self):
+        self.server.requests.append(("POST", self.path, dict(self.headers)))
+        self.send_json(200, {"data": {"id": RUN_ID}})
+
+    def do_GET(self):
+        server = self.server
+        server.requests.append(("GET", self.path, dict(self.headers)))
+        status = server.statuses.pop(0) if len(server.statuses) > 1 else server.statuses[0]
+        if status == 500:
+            self.send_json(500, {"status": {"is_success": False}})
+            return
+        self.send_json(200, {"data": {"id": RUN_ID, "status": status}})
+
+    def send_json(self, code, body):
+        body = json.dumps(body).encode()
+        self.send_response(code)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def server(monkeypatch):
+    server = ThreadingHTTPServer(("127.0.0.1", 0), DbtCloudHandler)
+    server.statuses = [DBT_RUN_SUCCESS]
+    server.requests = []
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    # The connection the DAG calls dbt_api, with the API token as its password
+    monkeypatch.setenv("AIRFLOW_CONN_DBT_TEST", f"http://:{TOKEN}@127.0.0.1:{server.server_port}")
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+def run_trigger(max_failures=5):
+    trigger = DbtCloudRunTrigger(RUN_ID, ACCOUNT_ID, "dbt_test", poll_interval=0, max_poll_interval=0,
+                                 max_failures=max_failures)
+
+    async def collect():
+        return [event.payload async for event in trigger.run()]
+
+    return asyncio.run(collect())
+
+
+def test_trigger_succeeds_when_the_run_succeeds(server):
+    server.statuses = [DBT_RUN_RUNNING, DBT_RUN_RUNNING, DBT_RUN_SUCCESS]
+    assert run_trigger() == [{"status": "success", "run_id": RUN_ID}]
+    assert [path for _, path, _ in server.requests] == [f"/accounts/{ACCOUNT_ID}/runs/{RUN_ID}/"] * 3
+    assert all(headers["Authorization"] == f"Token {TOKEN}" for _, _, headers in server.requests)
+
+
+@pytest.mark.parametrize("status", [DBT_RUN_ERROR, DBT_RUN_CANCELLED])
+def test_trigger_fails_when_the_run_fails_or_is_cancelled(server, status):
+    server.statuses = [DBT_RUN_RUNNING, status]
+    [event] = run_trigger()
+    assert event["status"] == "error"
+    assert f"finished with status {status}" in event["message"]
+
+
+def test_trigger_gives_up_after_consecutive_failures(server):
+    server.statuses = [500]
+    [event] = run_trigger(max_failures=3)
+    assert event["status"] == "error"
+    assert "status" in event["message"]
+    assert len(server.requests) == 3
+
+
+def test_trigger_failures_are_counted_in_a_row(server):
+    server.statuses = [500, 500, DBT_RUN_RUNNING, 500, 500, DBT_RUN_SUCCESS]
+    assert run_trigger(max_failures=3) == [{"status": "success", "run_id": RUN_ID}]
+
+
+def test_trigger_does_not_serialize_the_token():
+    classpath, kwargs = DbtCloudRunTrigger(RUN_ID, ACCOUNT_ID, "dbt_test").serialize()
+    assert classpath == "dbt_job.DbtCloudRunTrigger"
+    assert "headers" not in kwargs
+    assert TOKEN not in json.dumps(kwargs)
+    # The triggerer recreates the trigger from its serialized kwargs
+    assert DbtCloudRunTrigger(**kwargs).serialize() == (classpath, kwargs)
+
+
+def test_operator_starts_the_job_and_defers_with_a_timeout(server):
+    operator = DbtJobRunOperator(task_id="dbt_job", job_id=JOB_ID, account_id=ACCOUNT_ID, http_conn_id="dbt_test",
+                                 run_timeout=60, max_failures=3)
+    with pytest.raises(TaskDeferred) as deferred:
+        operator.execute(context={})
+    method, path, headers = server.requests[0]
+    assert (method, path) == ("POST", f"/accounts/{ACCOUNT_ID}/jobs/{JOB_ID}/run/")
+    assert headers["Authorization"] == f"Token {TOKEN}"
+    assert deferred.value.timeout.total_seconds() == 60
+    assert deferred.value.method_name == "execute_complete"
+    _, kwargs = deferred.value.trigger.serialize()
+    assert kwargs["run_id"] == RUN_ID and kwargs["max_failures"] == 3
+
+
+def test_operator_fails_on_an_error_event():
+    operator = DbtJobRunOperator(task_id="dbt_job", job_id=JOB_ID, account_id=ACCOUNT_ID)
+    with pytest.raises(AirflowException, match="status 20"):
+        operator.execute_complete({}, {"status": "error", "run_id": RUN_ID,
+                                       "message": f"dbt run {RUN_ID} finished with status 20"})
+    assert operator.execute_complete({}, {"status": "success", "run_id": RUN_ID}) == RUN_ID
@@ -0,0 +1,145 @@
+"""
+Tests of the f1_mart read service on an in-memory mart, and of its load test
+"""
+import os
+import sys
+import json
+import threading
+import subprocess
+import urllib.error
+import urllib.request
+from http.server import ThreadingHTTPServer
+
+import pytest
+
+from conftest import ROOT_DIR
+from f1_mart_api import MartIndex, MartService, make_handler
+
+REFRESH_TOKEN = "s3cret"
+
+
+def mart_row(name, year, points, prc_own_points):
+    return {"name": name, "year": year, "difference": 0, "constructor_result_points": points,
+            "year_points_sum": points * 4, "two_constr_points_sum": points * 2, "prc_own_points": prc_own_points,
+            "prc_all_points": prc_own_points, "prc_top2_points": 0.5}
+
+
+ROWS = [
+    mart_row("McLaren", 2007, 218, 0.26),
+    # Two teams tied for first
+    mart_row("Ferrari", 2008, 172, 0.24),
+    mart_row("McLaren", 2008, 172, 0.24),
+    mart_row("Brawn", 2009, 172, 0.29),
+]
+
+
+def test_season_keeps_every_team_tied_for_first():
+    index = MartIndex(ROWS)
+    assert [row["name"] for row in index.season(2008)] == ["Ferrari", "McLaren"]
+    assert [row["name"] for row in index.season(2009)] == ["Brawn"]
+    assert index.season(1949) == []
+    assert [row["year"] for row in index.team("mclaren")] == [2007, 2008]
+
+
+def serve(service, refresh_token):
+    server = ThreadingHTTPServer(("127.0.0.1", 0), make_handler(service, refresh_token))
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+@pytest.fixture
+def rows():
+    """
+    :return: rows the service loads, changed by the tests before a refresh
+    """
+    return list(ROWS)
+
+
+@pytest.fixture(params=[REFRESH_TOKEN, None], ids=["token", "loopback"])
+def url(request, rows):
+    service = MartService(loader=lambda: list(rows))
+    service.refresh()
+    server = serve(service, request.param)
+    yield f"http://127.0.0.1:{server.server_port}"
+    server.shutdown()
+    server.server_close()
+
+
+def get(url):
+    try:
+        with urllib.request.urlopen(url) as response:
+            return response.status, json.load(response)
+    except urllib.error.HTTPError as error:
+        return error.code, json.load(error)
+
+
+def post(url, headers=None):
+    try:
+        with urllib.request.urlopen(urllib.request.Request(url, method="POST", headers=headers or {})) as response:
+            return response.status, json.load(response)
+    except urllib.error.HTTPError as error:
+        return error.code, json.load(error)
+
+
+def test_season_endpoint(url):
+    status, rows = get(f"{url}/seasons/2008")
+    assert status == 200 and [row["name"] for row in rows] == ["Ferrari", "McLaren"]
+    assert get(f"{url}/seasons/1949") == (404, [])
+
+
+def test_threshold_endpoint(url):
+    status, rows = get(f"{url}/seasons?metric=prc_own_points&min=0.25")
+    # Above the threshold, in year order
+    assert status == 200 and [(row["year"], row["name"]) for row in rows] == [(2007, "McLaren"), (2009, "Brawn")]
+    status, rows = get(f"{url}/seasons?metric=prc_own_points&max=0.24")
+    assert [(row["year"], row["name"]) for row in rows] == [(2008, "Ferrari"), (2008, "McLaren")]
+    assert get(f"{url}/seasons?metric=points&min=1")[0] == 400
+    assert get(f"{url}/seasons?metric=prc_own_points&min=high")[0] == 400
+    assert len(get(f"{url}/seasons")[1]) == len(ROWS)
+
+
+def test_teams_endpoint(url):
+    status, rows = get(f"{url}/teams/mclaren")
+    # The season McLaren shared with Ferrari counts as won
+    assert status == 200 and [row["year"] for row in rows] == [2007, 2008]
+    assert [row["year"] for row in get(f"{url}/teams/{urllib.request.quote('Red Bull')}")[1]] == []
+
+
+def test_refresh_reloads_the_mart(url, rows):
+    rows.append(mart_row("Red Bull", 2010, 498, 0.22))
+    headers = {"Authorization": f"Bearer {REFRESH_TOKEN}"}
+    assert post(f"{url}/refresh", headers) == (200, {"seasons": len(ROWS) + 1})
+    assert [row["name"] for row in get(f"{url}/teams/Red%20Bull")[1]] == ["Red Bull"]
+
+
+def test_refresh_requires_the_token(rows):
+    service = MartService(loader=lambda: list(rows))
+    service.refresh()
+    server = serve(service, REFRESH_TOKEN)
+    url = f"http://127.0.0.1:{server.server_port}"
+    try:
+        rows.append(mart_row("Red Bull", 2010, 498, 0.22))
+        assert post(f"{url}/refresh")[0] == 401
+        assert post(f"{url}/refresh", {"Authorization": "Bearer wrong"})[0] == 401
+        # Not reloaded
+        assert len(get(f"{url}/seasons")[1]) == len(ROWS)
+    finally:
+        server.shutdown()
+        server.server_close()
+
+
+def test_refresh_without_a_token_is_refused_to_remote_clients():
+    service = MartService(loader=lambda: ROWS)
+    handler = make_handler(service, refresh_token=None)
+    request = handler.__new__(handler)
+    request.client_address = ("192.0.2.10", 50000)
+    assert not request.is_refresh_allowed()
+    request.client_address = ("127.0.0.1", 50000)
+    assert request.is_refresh_allowed()
+
+
+def test_load_test_of_an_empty_mart_exits_with_a_message():
+    process = subprocess.run([sys.executable, os.path.join(ROOT_DIR, "serving", "load_test.py"), "--synthetic", "0"],
+                             cwd=os.path.join(ROOT_DIR, "serving"), capture_output=True, text=True, timeout=60)
+    assert process.returncode == 1
+    assert "f1_mart has no seasons" in process.stderr
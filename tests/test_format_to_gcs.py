@@ -0,0 +1,65 @@
+"""
+Tests of the fused conversion format_to_gcs of a partitioned table against fake GCS (see the gcs_bucket fixture)
+"""
+import io
+import os
+
+import pytest
+
+pytest.importorskip("airflow.providers.google")
+pytest.importorskip("google.cloud.storage")
+import pyarrow.parquet as pq  # noqa: E402
+
+from f1_tables import TABLES  # noqa: E402
+from generate_f1db import generate  # noqa: E402
+from gcs_uploader import get_storage_client  # noqa: E402
+from data_ingestion_gcs_dag import format_to_gcs, format_to_parquet, read_race_years  # noqa: E402
+
+LAP_TIMES = next(table for table in TABLES if table["name"] == "lap_times")
+ROW_GROUP_SIZE = 1000
+
+
+@pytest.fixture(scope="module")
+def zip_path(tmp_path_factory):
+    zip_path = str(tmp_path_factory.mktemp("archive") / "f1db_csv.zip")
+    generate(zip_path, scale=0.2)
+    return zip_path
+
+
+def read_partitions(bucket, prefix):
+    """
+    :return: partition object name relative to the prefix -> its Parquet file
+    """
+    return {blob.name[len(prefix) + 1:]: pq.ParquetFile(io.BytesIO(blob.download_as_bytes()))
+            for blob in get_storage_client().bucket(bucket).list_blobs(prefix=f"{prefix}/")}
+
+
+@pytest.mark.parametrize("buffer_rows", [10 * ROW_GROUP_SIZE, 100])
+def test_partitions_match_the_local_conversion(gcs_bucket, zip_path, tmp_path, buffer_rows):
+    race_years = read_race_years(zip_path, "races.csv")
+    rows, uploaded = format_to_gcs(zip_path, gcs_bucket, "raw/lap_times", member="lap_times.csv",
+                                   schema=LAP_TIMES["schema"], race_years=race_years, row_group_size=ROW_GROUP_SIZE,
+                                   buffer_rows=buffer_rows)
+    local_dir = tmp_path / "lap_times"
+    format_to_parquet(zip_path, str(local_dir), member="lap_times.csv", schema=LAP_TIMES["schema"],
+                      race_years=race_years)
+
+    partitions = read_partitions(gcs_bucket, "raw/lap_times")
+    assert sorted(partitions) == sorted(os.path.relpath(os.path.join(root, name), local_dir)
+                                        for root, _, names in os.walk(local_dir) for name in names)
+    assert sum(partition.metadata.num_rows for partition in partitions.values()) == rows
+    for name, partition in partitions.items():
+        local = pq.read_table(local_dir / name)
+        assert partition.read().equals(local.select(partition.schema_arrow.names)), name
+    assert len(uploaded) == len(partitions)
+
+
+def test_partitions_are_written_in_full_row_groups(gcs_bucket, zip_path):
+    format_to_gcs(zip_path, gcs_bucket, "raw/lap_times", member="lap_times.csv", schema=LAP_TIMES["schema"],
+                  race_years=read_race_years(zip_path, "races.csv"), row_group_size=ROW_GROUP_SIZE,
+                  block_size=64 * 1024)
+    for name, partition in read_partitions(gcs_bucket, "raw/lap_times").items():
+        sizes = [partition.metadata.row_group(i).num_rows for i in range(partition.num_row_groups)]
+        # Every row group but the last one of the year is full, however the CSV blocks split the year
+        assert all(size == ROW_GROUP_SIZE for size in sizes[:-1]), name
+        assert 0 < sizes[-1] <= ROW_GROUP_SIZE, name
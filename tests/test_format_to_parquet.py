@@ -0,0 +1,124 @@
+"""
+Regression tests of the streaming format_to_parquet against the pandas converter it replaced
+"""
+import shutil
+import zipfile
+
+import pytest
+
+pytest.importorskip("airflow.providers.google")
+pd = pytest.importorskip("pandas")
+import pyarrow.csv as pv  # noqa: E402
+import pyarrow.parquet as pq  # noqa: E402
+
+from f1_tables import TABLES  # noqa: E402
+from generate_f1db import generate  # noqa: E402
+from data_ingestion_gcs_dag import format_to_parquet, read_csv_header  # noqa: E402
+
+CSV_FILES = {
+    # Header with more names than data fields, the quirk of the Ergast CSVs the old converter repaired
+    "extra_header_names.csv": "raceId,driverId,position,time,fastestLap\n"
+                              "1,20,1,1:34:50.616\n2,8,3,1:37:12.776\n3,1,,2:10:05.102\n",
+    "matching_header.csv": "constructorId,constructorRef,name,nationality\n"
+                           "1,mclaren,McLaren,British\n6,ferrari,Ferrari,Italian\n9,red_bull,Red Bull,Austrian\n"
+                           # An empty string field, not a missing value
+                           "17,jordan,Jordan,\n",
+    "quoted_fields.csv": 'circuitId,name,location,lat\n'
+                         '1,"Albert Park Grand Prix Circuit","Melbourne, Victoria",-37.8497\n'
+                         '2,"Sepang International Circuit",Kuala Lumpur,2.76083\n',
+}
+
+
+def legacy_format_to_parquet(src_file, dest_file):
+    """
+    format_to_parquet before the streaming converter, rewrites a CSV with a mismatching header in place
+    """
+    head_table = pd.read_csv(src_file, header=None, nrows=1)
+    table = pd.read_csv(src_file, header=None, skiprows=1)
+    if len(head_table.columns) != len(table.columns):
+        table = pd.read_csv(src_file, names=head_table.columns)
+        table.columns = table.columns.astype(str)
+        table.to_csv(src_file, header=None, index=None)
+    table = pv.read_csv(src_file)
+    pq.write_table(table, dest_file)
+
+
+def convert_both(tmp_path, name, content, **kwargs):
+    """
+    :return: table written by format_to_parquet, table written by the legacy converter
+    """
+    src_file = tmp_path / name
+    src_file.write_text(content)
+    legacy_src_file = tmp_path / f"legacy_{name}"
+    shutil.copy(src_file, legacy_src_file)
+    format_to_parquet(str(src_file), str(tmp_path / "streamed" / f"{name}.parquet"), **kwargs)
+    legacy_format_to_parquet(str(legacy_src_file), str(tmp_path / f"{name}.parquet"))
+    return pq.read_table(tmp_path / "streamed" / f"{name}.parquet"), pq.read_table(tmp_path / f"{name}.parquet")
+
+
+@pytest.mark.parametrize("name", sorted(CSV_FILES))
+def test_same_output_as_legacy_converter(tmp_path, name):
+    streamed, legacy = convert_both(tmp_path, name, CSV_FILES[name])
+    assert streamed.schema == legacy.schema
+    assert streamed.equals(legacy)
+
+
+@pytest.mark.parametrize("name", sorted(CSV_FILES))
+def test_same_output_with_one_block_per_row(tmp_path, name):
+    streamed, legacy = convert_both(tmp_path, name, CSV_FILES[name], block_size=64)
+    assert streamed.to_pylist() == legacy.to_pylist()
+
+
+def test_source_csv_is_not_rewritten(tmp_path):
+    src_file = tmp_path / "extra_header_names.csv"
+    src_file.write_text(CSV_FILES["extra_header_names.csv"])
+    format_to_parquet(str(src_file), str(tmp_path / "extra_header_names.parquet"))
+    assert src_file.read_text() == CSV_FILES["extra_header_names.csv"]
+
+
+def test_short_header_is_padded_with_positional_names(tmp_path):
+    # The legacy converter fails on a header with fewer names than data fields
+    src_file = tmp_path / "short_header.csv"
+    src_file.write_text("resultId,raceId,points\n1,18,10,1\n2,18,8,2\n")
+    format_to_parquet(str(src_file), str(tmp_path / "short_header.parquet"))
+    table = pq.read_table(tmp_path / "short_header.parquet")
+    assert table.column_names == ["resultId", "raceId", "points", "3"]
+    assert table.column("3").to_pylist() == [1, 2]
+
+
+def test_null_marker_is_null_and_empty_strings_are_kept(tmp_path):
+    src_file = tmp_path / "status.csv"
+    src_file.write_text('resultId,points,status,code\n1,\\N,Finished,HAM\n2,,,\\N\n3,4,\\N,""\n')
+    format_to_parquet(str(src_file), str(tmp_path / "status.parquet"), schema={"code": "dictionary"})
+    assert pq.read_table(tmp_path / "status.parquet").to_pylist() == [
+        {"resultId": 1, "points": None, "status": "Finished", "code": "HAM"},
+        # An empty numeric field is missing, an empty string field is kept
+        {"resultId": 2, "points": None, "status": "", "code": None},
+        {"resultId": 3, "points": 4, "status": None, "code": ""},
+    ]
+
+
+def test_archive_member_matches_extracted_csv(tmp_path):
+    zip_path = tmp_path / "f1db_csv.zip"
+    with zipfile.ZipFile(zip_path, "w") as archive:
+        archive.writestr("extra_header_names.csv", CSV_FILES["extra_header_names.csv"])
+    src_file = tmp_path / "extra_header_names.csv"
+    src_file.write_text(CSV_FILES["extra_header_names.csv"])
+
+    rows = format_to_parquet(str(zip_path), str(tmp_path / "member.parquet"), member="extra_header_names.csv")
+    format_to_parquet(str(src_file), str(tmp_path / "extracted.parquet"))
+    assert rows == 3
+    assert pq.read_table(tmp_path / "member.parquet").equals(pq.read_table(tmp_path / "extracted.parquet"))
+
+
+def test_generated_headers_name_every_column(tmp_path):
+    zip_path = str(tmp_path / "f1db_csv.zip")
+    generate(zip_path, scale=0.01)
+    for table in TABLES:
+        header, fields_number = read_csv_header(zip_path, table["member"])
+        assert len(header) == fields_number, table["member"]
+
+    format_to_parquet(zip_path, str(tmp_path / "constructor_results.parquet"), member="constructor_results.csv",
+                      schema=TABLES[[table["name"] for table in TABLES].index("constructor_results")]["schema"])
+    status = pq.read_table(tmp_path / "constructor_results.parquet").column("status")
+    assert set(status.to_pylist()) == {None, "D"}
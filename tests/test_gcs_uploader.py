@@ -0,0 +1,244 @@
+"""
+Tests of gcs_uploader against fake-gcs-server (see the gcs_bucket fixture), and of its timeouts
+against a local server that never answers
+"""
+import os
+import socket
+import threading
+
+import pytest
+
+pytest.importorskip("google_crc32c")
+pytest.importorskip("google.cloud.storage")
+import requests  # noqa: E402
+
+import gcs_uploader  # noqa: E402
+from gcs_uploader import get_crc32c, get_storage_client, resumable_upload, upload_file  # noqa: E402
+
+CHUNK_SIZE = 256 * 1024
+
+
+@pytest.fixture(autouse=True)
+def session_dir(tmp_path_factory, monkeypatch):
+    session_dir = tmp_path_factory.mktemp("sessions")
+    monkeypatch.setattr(gcs_uploader, "UPLOAD_SESSION_DIR", str(session_dir))
+    return session_dir
+
+
+def get_blob(bucket, object_name):
+    return get_storage_client().bucket(bucket).blob(object_name)
+
+
+@pytest.fixture
+def local_file(tmp_path):
+    path = tmp_path / "lap_times.parquet"
+    path.write_bytes(os.urandom(4 * CHUNK_SIZE + 1000))
+    return str(path)
+
+
+@pytest.fixture
+def record_puts(monkeypatch):
+    """
+    :return: Content-Range headers of the resumable upload requests, in order
+    """
+    ranges = []
+    put = requests.put
+
+    def recording_put(url, *args, **kwargs):
+        assert kwargs.get("timeout") == gcs_uploader.UPLOAD_TIMEOUT
+        ranges.append(kwargs.get("headers", {}).get("Content-Range"))
+        return put(url, *args, **kwargs)
+
+    monkeypatch.setattr(gcs_uploader.requests, "put", recording_put)
+    return ranges
+
+
+def download(bucket, object_name):
+    return get_storage_client().bucket(bucket).blob(object_name).download_as_bytes()
+
+
+def read(path):
+    with open(path, "rb") as f:
+        return f.read()
+
+
+def test_small_file_is_uploaded_in_one_request(gcs_bucket, tmp_path):
+    path = tmp_path / "seasons.parquet"
+    path.write_bytes(b"PAR1 seasons PAR1")
+    blob = upload_file(gcs_bucket, "raw/seasons.parquet", str(path))
+    assert blob.crc32c == get_crc32c(str(path))
+    assert download(gcs_bucket, "raw/seasons.parquet") == b"PAR1 seasons PAR1"
+
+
+def test_resumable_upload_sends_chunks(gcs_bucket, local_file, record_puts):
+    upload_file(gcs_bucket, "raw/lap_times.parquet", local_file, chunk_size=CHUNK_SIZE)
+    assert download(gcs_bucket, "raw/lap_times.parquet") == read(local_file)
+    assert record_puts[0] == f"bytes 0-{CHUNK_SIZE - 1}/{os.path.getsize(local_file)}"
+    assert len(record_puts) == 5
+    assert not os.path.exists(gcs_uploader.get_session_file(get_blob(gcs_bucket, "raw/lap_times.parquet")))
+
+
+def test_interrupted_upload_resumes_from_persisted_offset(gcs_bucket, local_file, record_puts):
+    size = os.path.getsize(local_file)
+    blob = get_storage_client().bucket(gcs_bucket).blob("raw/lap_times.parquet")
+    # An earlier attempt persisted the first chunk and left its session in the session folder
+    session_url = blob.create_resumable_upload_session(size=size)
+    requests.Session().put(session_url, data=read(local_file)[:CHUNK_SIZE], timeout=10,
+                           headers={"Content-Range": f"bytes 0-{CHUNK_SIZE - 1}/{size}"})
+    with open(gcs_uploader.get_session_file(blob), "w") as f:
+        f.write(session_url)
+
+    resumable_upload(blob, local_file, CHUNK_SIZE)
+    assert record_puts[0] == f"bytes */{size}"
+    assert record_puts[1] == f"bytes {CHUNK_SIZE}-{2 * CHUNK_SIZE - 1}/{size}"
+    assert download(gcs_bucket, "raw/lap_times.parquet") == read(local_file)
+
+
+def test_dropped_chunk_is_retried(gcs_bucket, local_file, monkeypatch):
+    put, calls = requests.put, []
+
+    def flaky_put(url, *args, **kwargs):
+        calls.append(kwargs.get("headers", {}).get("Content-Range"))
+        if len(calls) == 2:
+            raise requests.ConnectionError("connection reset by peer")
+        return put(url, *args, **kwargs)
+
+    monkeypatch.setattr(gcs_uploader.requests, "put", flaky_put)
+    monkeypatch.setattr(gcs_uploader.time, "sleep", lambda seconds: None)
+    upload_file(gcs_bucket, "raw/lap_times.parquet", local_file, chunk_size=CHUNK_SIZE)
+    size = os.path.getsize(local_file)
+    # The dropped second chunk is sent again after the session status is queried
+    assert calls[1:4] == [f"bytes {CHUNK_SIZE}-{2 * CHUNK_SIZE - 1}/{size}", f"bytes */{size}",
+                          f"bytes {CHUNK_SIZE}-{2 * CHUNK_SIZE - 1}/{size}"]
+    assert download(gcs_bucket, "raw/lap_times.parquet") == read(local_file)
+
+
+def test_upload_fails_after_the_last_retry(gcs_bucket, local_file, monkeypatch):
+    def failing_put(url, *args, **kwargs):
+        if kwargs.get("data") is not None:
+            raise requests.ConnectionError("connection reset by peer")
+        # Session status: nothing persisted yet
+        response = requests.Response()
+        response.status_code = 308
+        return response
+
+    monkeypatch.setattr(gcs_uploader.requests, "put", failing_put)
+    monkeypatch.setattr(gcs_uploader.time, "sleep", lambda seconds: None)
+    blob = get_storage_client().bucket(gcs_bucket).blob("raw/lap_times.parquet")
+    with pytest.raises(requests.ConnectionError):
+        resumable_upload(blob, local_file, CHUNK_SIZE, retries=2)
+    # The session is kept for the next attempt of the task, outside the folder of the file
+    assert os.path.exists(gcs_uploader.get_session_file(blob))
+    assert os.listdir(os.path.dirname(local_file)) == ["lap_times.parquet"]
+
+
+def test_crc_mismatch_fails_the_upload(gcs_bucket, local_file, monkeypatch):
+    crc32c = get_crc32c(local_file)
+    # The local file changes while its upload is verified
+    monkeypatch.setattr(gcs_uploader, "get_crc32c", lambda *args, **kwargs: crc32c[::-1])
+    with pytest.raises(ValueError, match="doesn`t match"):
+        upload_file(gcs_bucket, "raw/lap_times.parquet", local_file, chunk_size=CHUNK_SIZE)
+
+
+def test_sliced_upload_composes_the_slices(gcs_bucket, local_file):
+    upload_file(gcs_bucket, "raw/lap_times.parquet", local_file, chunk_size=CHUNK_SIZE,
+                sliced_threshold=CHUNK_SIZE, slices=3)
+    assert download(gcs_bucket, "raw/lap_times.parquet") == read(local_file)
+    names = [blob.name for blob in get_storage_client().bucket(gcs_bucket).list_blobs()]
+    assert names == ["raw/lap_times.parquet"]
+
+
+def test_sliced_upload_keeps_slices_already_uploaded(gcs_bucket, local_file, monkeypatch):
+    size = os.path.getsize(local_file)
+    slice_size = -(-size // 3)
+    bucket = get_storage_client().bucket(gcs_bucket)
+    # A retried upload finds the first slice of the failed attempt
+    bucket.blob("raw/lap_times.parquet.slice-00").upload_from_string(read(local_file)[:slice_size])
+    uploaded = []
+    upload_from_file = gcs_uploader.storage.Blob.upload_from_file
+
+    def recording_upload(blob, *args, **kwargs):
+        uploaded.append(blob.name)
+        return upload_from_file(blob, *args, **kwargs)
+
+    monkeypatch.setattr(gcs_uploader.storage.Blob, "upload_from_file", recording_upload)
+    upload_file(gcs_bucket, "raw/lap_times.parquet", local_file, chunk_size=CHUNK_SIZE,
+                sliced_threshold=CHUNK_SIZE, slices=3)
+    assert sorted(uploaded) == ["raw/lap_times.parquet.slice-01", "raw/lap_times.parquet.slice-02"]
+    assert download(gcs_bucket, "raw/lap_times.parquet") == read(local_file)
+
+
+def test_upload_folder_skips_unchanged_partitions(gcs_bucket, tmp_path):
+    folder = tmp_path / "lap_times"
+    for year in (2020, 2021):
+        (folder / f"year={year}").mkdir(parents=True)
+        (folder / f"year={year}" / "part-0.parquet").write_bytes(os.urandom(1000))
+    assert len(gcs_uploader.upload_folder(gcs_bucket, "raw/lap_times", str(folder))) == 2
+    (folder / "year=2021" / "part-0.parquet").write_bytes(os.urandom(1000))
+    assert gcs_uploader.upload_folder(gcs_bucket, "raw/lap_times", str(folder)) == [
+        "raw/lap_times/year=2021/part-0.parquet"]
+
+
+def test_upload_folder_retried_after_an_interrupted_partition_upload(gcs_bucket, tmp_path, monkeypatch):
+    folder = tmp_path / "lap_times"
+    for year in (2020, 2021):
+        (folder / f"year={year}").mkdir(parents=True)
+        (folder / f"year={year}" / "part-0.parquet").write_bytes(os.urandom(2 * CHUNK_SIZE + 1000))
+    # Session files of an earlier version of the uploader, left next to the partitions
+    (folder / "year=2020" / "part-0.parquet.upload-session").write_text("http://127.0.0.1:1/session")
+    monkeypatch.setattr(gcs_uploader.time, "sleep", lambda seconds: None)
+    put, calls = requests.put, []
+
+    def interrupted_put(url, *args, **kwargs):
+        calls.append(url)
+        if len(calls) > 1:
+            raise requests.ConnectionError("connection reset by peer")
+        return put(url, *args, **kwargs)
+
+    # The first attempt of the task fails in the middle of the first partition
+    monkeypatch.setattr(gcs_uploader.requests, "put", interrupted_put)
+    with pytest.raises(requests.ConnectionError):
+        gcs_uploader.upload_folder(gcs_bucket, "raw/lap_times", str(folder), chunk_size=CHUNK_SIZE)
+    assert len(os.listdir(gcs_uploader.UPLOAD_SESSION_DIR)) == 1
+
+    # The retried task resumes the partition and uploads nothing but the partitions
+    monkeypatch.setattr(gcs_uploader.requests, "put", put)
+    gcs_uploader.upload_folder(gcs_bucket, "raw/lap_times", str(folder), chunk_size=CHUNK_SIZE)
+    names = sorted(blob.name for blob in get_storage_client().bucket(gcs_bucket).list_blobs(prefix="raw/lap_times/"))
+    assert names == ["raw/lap_times/year=2020/part-0.parquet", "raw/lap_times/year=2021/part-0.parquet"]
+    for year in (2020, 2021):
+        assert download(gcs_bucket, f"raw/lap_times/year={year}/part-0.parquet") == read(
+            folder / f"year={year}" / "part-0.parquet")
+    assert os.listdir(gcs_uploader.UPLOAD_SESSION_DIR) == []
+
+
+@pytest.fixture
+def stalled_server():
+    """
+    :return: url of a server that accepts connections and never answers
+    """
+    server = socket.socket()
+    server.bind(("127.0.0.1", 0))
+    server.listen()
+    connections = []
+    thread = threading.Thread(target=lambda: connections.append(server.accept()), daemon=True)
+    thread.start()
+    yield f"http://127.0.0.1:{server.getsockname()[1]}/upload/session"
+    for connection, _ in connections:
+        connection.close()
+    server.close()
+
+
+def test_stalled_session_query_times_out(stalled_server):
+    with pytest.raises(requests.Timeout):
+        gcs_uploader.query_session_offset(stalled_server, 1000, timeout=(1, 0.5))
+
+
+@pytest.mark.parametrize("streams, buffer_size, chunk_size", [
+    (1, 64 * 1024 * 1024, gcs_uploader.UPLOAD_CHUNK_SIZE),
+    (4, 4 * 1024 * 1024, 1024 * 1024),
+    (3, 1000 * 1024, 256 * 1024),
+    (100, 1024 * 1024, 256 * 1024),
+])
+def test_shared_chunk_size(streams, buffer_size, chunk_size):
+    assert gcs_uploader.get_shared_chunk_size(streams, buffer_size) == chunk_size
@@ -0,0 +1,136 @@
+"""
+f1_stage and f1_mart built incrementally after a source change are identical to a --full-refresh build,
+run with dbt-duckdb (local/profiles.yml) on the Parquet of a synthetic archive
+"""
+import os
+import shutil
+import subprocess
+
+import pytest
+
+pytest.importorskip("airflow.providers.google")
+pytest.importorskip("dbt.adapters.duckdb")
+duckdb = pytest.importorskip("duckdb")
+import pyarrow as pa  # noqa: E402
+import pyarrow.compute as pc  # noqa: E402
+import pyarrow.parquet as pq  # noqa: E402
+
+from conftest import ROOT_DIR  # noqa: E402
+from f1_tables import TABLES  # noqa: E402
+from generate_f1db import generate  # noqa: E402
+from data_ingestion_gcs_dag import format_to_parquet  # noqa: E402
+
+MODELS = ["f1_stage", "f1_mart"]
+SOURCE_TABLES = ["constructor_results", "races", "constructors"]
+
+if shutil.which("dbt") is None:
+    pytest.skip("dbt is not installed", allow_module_level=True)
+
+
+@pytest.fixture
+def parquet_dir(tmp_path):
+    zip_path = str(tmp_path / "f1db_csv.zip")
+    generate(zip_path, scale=0.2)
+    parquet_dir = tmp_path / "parquet"
+    for table in TABLES:
+        if table["name"] in SOURCE_TABLES:
+            format_to_parquet(zip_path, str(parquet_dir / f"{table['name']}.parquet"), member=table["member"],
+                              schema=table["schema"])
+    return parquet_dir
+
+
+def dbt_run(parquet_dir, database, work_dir, full_refresh=False):
+    command = ["dbt", "run", "--profiles-dir", "local", "--select", *MODELS,
+               "--target-path", str(work_dir / "target"), "--log-path", str(work_dir / "logs")]
+    if full_refresh:
+        command.append("--full-refresh")
+    env = dict(os.environ, F1_PARQUET_PATH=str(parquet_dir), F1_DUCKDB_PATH=str(database),
+               DBT_SEND_ANONYMOUS_USAGE_STATS="false")
+    process = subprocess.run(command, cwd=ROOT_DIR, env=env, capture_output=True, text=True)
+    assert process.returncode == 0, process.stdout
+
+
+def read_models(database):
+    """
+    :return: model -> rows in a stable order
+    """
+    connection = duckdb.connect(str(database), read_only=True)
+    try:
+        return {model: connection.execute(f"SELECT * FROM f1_data_all.{model} ORDER BY ALL").fetchall()
+                for model in MODELS}
+    finally:
+        connection.close()
+
+
+def get_race_ids(parquet_dir, year):
+    races = pq.read_table(parquet_dir / "races.parquet", columns=["raceId", "year"])
+    return races.filter(pc.equal(races.column("year"), year)).column("raceId")
+
+
+def change_sources(parquet_dir):
+    """
+    Corrects the points of the last season and deletes a result of an old one, like a new f1db release
+    """
+    path = parquet_dir / "constructor_results.parquet"
+    results = pq.read_table(path)
+    last_season = pc.is_in(results.column("raceId"), value_set=get_race_ids(parquet_dir, 2024))
+    points = pc.if_else(last_season, pc.multiply(results.column("points"), results.column("constructorId")),
+                        results.column("points")).cast(results.schema.field("points").type)
+    results = results.set_column(results.schema.get_field_index("points"), "points", points)
+    old_season = pc.is_in(results.column("raceId"), value_set=get_race_ids(parquet_dir, 1990))
+    deleted = pc.index(old_season, True).as_py()
+    results = results.take([index for index in range(results.num_rows) if index != deleted])
+    pq.write_table(results, path)
+
+
+def test_incremental_run_equals_full_refresh(parquet_dir, tmp_path):
+    incremental_db, full_db = tmp_path / "incremental.duckdb", tmp_path / "full.duckdb"
+    dbt_run(parquet_dir, incremental_db, tmp_path, full_refresh=True)
+    before = read_models(incremental_db)
+
+    change_sources(parquet_dir)
+    dbt_run(parquet_dir, incremental_db, tmp_path)
+    dbt_run(parquet_dir, full_db, tmp_path, full_refresh=True)
+    incremental, full = read_models(incremental_db), read_models(full_db)
+    for model in MODELS:
+        assert incremental[model] == full[model], model
+    assert incremental["f1_stage"] != before["f1_stage"]
+
+
+def test_incremental_run_without_changes_keeps_the_models(parquet_dir, tmp_path):
+    database = tmp_path / "f1.duckdb"
+    dbt_run(parquet_dir, database, tmp_path, full_refresh=True)
+    before = read_models(database)
+    dbt_run(parquet_dir, database, tmp_path)
+    assert read_models(database) == before
+
+
+def test_removed_season_is_deleted(parquet_dir, tmp_path):
+    database = tmp_path / "f1.duckdb"
+    dbt_run(parquet_dir, database, tmp_path, full_refresh=True)
+
+    # The new release has no results of 1991
+    path = parquet_dir / "constructor_results.parquet"
+    results = pq.read_table(path)
+    pq.write_table(results.filter(pc.invert(pc.is_in(results.column("raceId"),
+                                                      value_set=get_race_ids(parquet_dir, 1991)))), path)
+    dbt_run(parquet_dir, database, tmp_path)
+    models = read_models(database)
+    assert 1991 not in {row[2] for row in models["f1_stage"]}
+    assert 1991 not in {row[1] for row in models["f1_mart"]}
+
+
+def test_duplicated_rows_change_the_season(parquet_dir, tmp_path):
+    incremental_db, full_db = tmp_path / "incremental.duckdb", tmp_path / "full.duckdb"
+    dbt_run(parquet_dir, incremental_db, tmp_path, full_refresh=True)
+
+    # A scoring result of 2024 written 3 times, the 2 copies would cancel out in a xor of the row hashes
+    path = parquet_dir / "constructor_results.parquet"
+    results = pq.read_table(path)
+    scoring = pc.and_(pc.is_in(results.column("raceId"), value_set=get_race_ids(parquet_dir, 2024)),
+                      pc.greater(results.column("points"), 0))
+    duplicated = pc.index(scoring, True).as_py()
+    pq.write_table(pa.concat_tables([results] + [results.slice(duplicated, 1)] * 2), path)
+    dbt_run(parquet_dir, incremental_db, tmp_path)
+    dbt_run(parquet_dir, full_db, tmp_path, full_refresh=True)
+    assert read_models(incremental_db) == read_models(full_db)
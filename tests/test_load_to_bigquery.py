@@ -0,0 +1,126 @@
+"""
+Tests of load_to_bigquery (BIGQUERY_LOAD_MODE=native) against fake GCS (see the gcs_bucket fixture)
+and a BigQuery emulator that reads its load jobs from the same fake GCS:
+    docker run -d -p 9050:9050 -e STORAGE_EMULATOR_HOST=http://host.docker.internal:4443 \
+        ghcr.io/goccy/bigquery-emulator --project=test
+    BIGQUERY_EMULATOR_HOST=http://localhost:9050 STORAGE_EMULATOR_HOST=http://localhost:4443 python -m pytest
+"""
+import os
+import uuid
+
+import pytest
+
+pytest.importorskip("airflow.providers.google")
+bigquery = pytest.importorskip("google.cloud.bigquery")
+import pyarrow.parquet as pq  # noqa: E402
+
+from f1_tables import TABLES  # noqa: E402
+from generate_f1db import generate  # noqa: E402
+from gcs_uploader import upload_file, upload_folder  # noqa: E402
+from data_ingestion_gcs_dag import format_to_parquet, load_to_bigquery, read_race_years  # noqa: E402
+
+LAP_TIMES = next(table for table in TABLES if table["name"] == "lap_times")
+RACES = next(table for table in TABLES if table["name"] == "races")
+
+
+class TaskInstance:
+    def __init__(self, uploaded_objects):
+        self.uploaded_objects = uploaded_objects
+
+    def xcom_pull(self, task_ids=None):
+        return self.uploaded_objects
+
+
+@pytest.fixture
+def bigquery_dataset(monkeypatch):
+    """
+    :return: project.dataset of an empty dataset on the emulator of BIGQUERY_EMULATOR_HOST, deleted after the test
+    """
+    if not os.environ.get('BIGQUERY_EMULATOR_HOST'):
+        pytest.skip("BIGQUERY_EMULATOR_HOST is not set, start the BigQuery emulator first")
+    from google.auth.credentials import AnonymousCredentials
+
+    client = bigquery.Client(project=os.environ.get('BIGQUERY_EMULATOR_PROJECT', 'test'),
+                             credentials=AnonymousCredentials(),
+                             client_options={"api_endpoint": os.environ['BIGQUERY_EMULATOR_HOST']})
+    monkeypatch.setattr(bigquery, "Client", lambda *args, **kwargs: client)
+    dataset = client.create_dataset(f"f1_test_{uuid.uuid4().hex[:12]}")
+    yield f"{client.project}.{dataset.dataset_id}"
+    client.delete_dataset(dataset, delete_contents=True, not_found_ok=True)
+
+
+@pytest.fixture
+def zip_path(tmp_path):
+    zip_path = str(tmp_path / "f1db_csv.zip")
+    generate(zip_path, scale=0.05)
+    return zip_path
+
+
+def count_rows(table_id, where="TRUE"):
+    client = bigquery.Client()
+    return next(iter(client.query(f"SELECT COUNT(*) FROM `{table_id}` WHERE {where}").result()))[0]
+
+
+def test_first_load_reads_every_partition(gcs_bucket, bigquery_dataset, zip_path, tmp_path):
+    local_dir = tmp_path / "lap_times"
+    rows = format_to_parquet(zip_path, str(local_dir), member="lap_times.csv", schema=LAP_TIMES["schema"],
+                             race_years=read_race_years(zip_path, "races.csv"))
+    upload_folder(gcs_bucket, "raw/lap_times", str(local_dir))
+    table_id = f"{bigquery_dataset}.native_table_lap_times"
+
+    # The table doesn't exist yet, so every partition is loaded, not only the ones uploaded in this run
+    load_to_bigquery(gcs_bucket, "raw/lap_times", table_id, partitioning="year",
+                     clustering=LAP_TIMES["clustering"], upload_task_id="local_to_gcs_lap_times",
+                     ti=TaskInstance([]))
+    table = bigquery.Client().get_table(table_id)
+    assert table.range_partitioning.field == "year"
+    assert table.clustering_fields == LAP_TIMES["clustering"]
+    assert count_rows(table_id) == rows
+
+
+def test_reload_truncates_the_uploaded_partitions_only(gcs_bucket, bigquery_dataset, zip_path, tmp_path):
+    local_dir = tmp_path / "lap_times"
+    rows = format_to_parquet(zip_path, str(local_dir), member="lap_times.csv", schema=LAP_TIMES["schema"],
+                             race_years=read_race_years(zip_path, "races.csv"))
+    upload_folder(gcs_bucket, "raw/lap_times", str(local_dir))
+    table_id = f"{bigquery_dataset}.native_table_lap_times"
+    load_to_bigquery(gcs_bucket, "raw/lap_times", table_id, partitioning="year", ti=TaskInstance([]))
+
+    # The next release corrects the last season: half of its laps are left
+    year = sorted(os.listdir(local_dir))[-1]
+    files = [local_dir / year / name for name in os.listdir(local_dir / year)]
+    year_rows = sum(pq.read_metadata(path).num_rows for path in files)
+    corrected = pq.read_table(files[0])
+    for path in files:
+        os.remove(path)
+    pq.write_table(corrected.slice(0, corrected.num_rows // 2), files[0])
+    uploaded = upload_folder(gcs_bucket, "raw/lap_times", str(local_dir))
+    load_to_bigquery(gcs_bucket, "raw/lap_times", table_id, partitioning="year",
+                     upload_task_id="local_to_gcs_lap_times",
+                     ti=TaskInstance([name for name in uploaded if f"/{year}/" in name]))
+
+    year_value = year.split("=")[1]
+    assert count_rows(table_id, f"year = {year_value}") == corrected.num_rows // 2
+    assert count_rows(table_id, f"year != {year_value}") == rows - year_rows
+
+
+def test_unpartitioned_table_is_truncated(gcs_bucket, bigquery_dataset, zip_path, tmp_path):
+    local_file = str(tmp_path / "races.parquet")
+    rows = format_to_parquet(zip_path, local_file, member="races.csv", schema=RACES["schema"])
+    upload_file(gcs_bucket, "raw/races.parquet", local_file)
+    table_id = f"{bigquery_dataset}.native_table_races"
+    for _ in range(2):
+        load_to_bigquery(gcs_bucket, "raw/races.parquet", table_id, clustering=RACES["clustering"])
+    assert count_rows(table_id) == rows
+
+
+def test_modes_are_compared_per_model():
+    from benchmark_load_modes import compare_modes
+
+    results = {"external": {"fact_table": {"bytes_processed": 4000, "latency_seconds": 2.0},
+                            "stg_results": {"bytes_processed": 0, "latency_seconds": 1.0}},
+               "native": {"fact_table": {"bytes_processed": 1000, "latency_seconds": 0.5},
+                          "stg_lap_times": {"bytes_processed": 500, "latency_seconds": 0.2}}}
+    assert compare_modes(results) == {"fact_table": {"bytes_ratio": 0.25, "latency_ratio": 0.25},
+                                      "stg_lap_times": {"bytes_ratio": None, "latency_ratio": None},
+                                      "stg_results": {"bytes_ratio": None, "latency_ratio": None}}
@@ -0,0 +1,141 @@
+"""
+f1_race_pace_mart and f1_season_pace_mart built with dbt-duckdb (local/profiles.yml) from the per-race
+intermediate models, checked against the same dominance computed on the raw laps of a synthetic archive
+"""
+import os
+import shutil
+import statistics
+import subprocess
+
+import pytest
+
+pytest.importorskip("airflow.providers.google")
+pytest.importorskip("dbt.adapters.duckdb")
+duckdb = pytest.importorskip("duckdb")
+import pyarrow.compute as pc  # noqa: E402
+import pyarrow.parquet as pq  # noqa: E402
+
+from conftest import ROOT_DIR  # noqa: E402
+from f1_tables import TABLES  # noqa: E402
+from generate_f1db import generate  # noqa: E402
+from benchmark_pipeline import PACE_MODELS  # noqa: E402
+from data_ingestion_gcs_dag import format_to_parquet  # noqa: E402
+
+SOURCE_TABLES = ["lap_times", "pit_stops", "results", "races", "constructors"]
+MODELS = ["int_race_constructor_laps", "int_race_constructor_pit_stops", "f1_race_pace_mart", "f1_season_pace_mart"]
+MIN_LAPS = 10
+
+if shutil.which("dbt") is None:
+    pytest.skip("dbt is not installed", allow_module_level=True)
+
+
+@pytest.fixture(scope="module")
+def source_dir(tmp_path_factory):
+    tmp_path = tmp_path_factory.mktemp("sources")
+    zip_path = str(tmp_path / "f1db_csv.zip")
+    generate(zip_path, scale=0.05)
+    for table in TABLES:
+        if table["name"] in SOURCE_TABLES:
+            format_to_parquet(zip_path, str(tmp_path / "parquet" / f"{table['name']}.parquet"),
+                              member=table["member"], schema=table["schema"])
+    return tmp_path / "parquet"
+
+
+@pytest.fixture
+def parquet_dir(source_dir, tmp_path):
+    parquet_dir = tmp_path / "parquet"
+    shutil.copytree(source_dir, parquet_dir)
+    return parquet_dir
+
+
+def dbt_run(parquet_dir, database, work_dir, full_refresh=False):
+    command = ["dbt", "run", "--profiles-dir", "local", "--select", *PACE_MODELS,
+               "--target-path", str(work_dir / "target"), "--log-path", str(work_dir / "logs")]
+    if full_refresh:
+        command.append("--full-refresh")
+    env = dict(os.environ, F1_PARQUET_PATH=str(parquet_dir), F1_DUCKDB_PATH=str(database),
+               DBT_SEND_ANONYMOUS_USAGE_STATS="false")
+    process = subprocess.run(command, cwd=ROOT_DIR, env=env, capture_output=True, text=True)
+    assert process.returncode == 0, process.stdout
+
+
+def read_models(database, models=MODELS):
+    """
+    :return: model -> rows in a stable order
+    """
+    connection = duckdb.connect(str(database), read_only=True)
+    try:
+        return {model: connection.execute(f"SELECT * FROM f1_data_all.{model} ORDER BY ALL").fetchall()
+                for model in models}
+    finally:
+        connection.close()
+
+
+def read_rows(parquet_dir, table, columns):
+    return pq.read_table(parquet_dir / f"{table}.parquet", columns=columns).to_pylist()
+
+
+def get_race_pace(parquet_dir):
+    """
+    :return: raceId -> (leading team, second team, leader's median lap ms, lap advantage ms),
+             from the raw laps of the teams with at least MIN_LAPS laps in the race
+    """
+    constructor_ids = {(row["raceId"], row["driverId"]): row["constructorId"]
+                       for row in read_rows(parquet_dir, "results", ["raceId", "driverId", "constructorId"])}
+    names = {row["constructorId"]: row["name"]
+             for row in read_rows(parquet_dir, "constructors", ["constructorId", "name"])}
+    laps = {}
+    for row in read_rows(parquet_dir, "lap_times", ["raceId", "driverId", "milliseconds"]):
+        constructor_id = constructor_ids.get((row["raceId"], row["driverId"]))
+        if constructor_id is not None:
+            laps.setdefault(row["raceId"], {}).setdefault(constructor_id, []).append(row["milliseconds"])
+    pace = {}
+    for race_id, teams in laps.items():
+        ranked = sorted((statistics.median(times), names[constructor_id]) for constructor_id, times in teams.items()
+                        if len(times) >= MIN_LAPS)
+        if not ranked:
+            continue
+        (median_ms, name), second = ranked[0], ranked[1] if len(ranked) > 1 else (None, None)
+        pace[race_id] = (name, second[1], median_ms, second[0] - median_ms if second[0] is not None else None)
+    return pace
+
+
+def test_race_pace_matches_the_raw_laps(parquet_dir, tmp_path):
+    database = tmp_path / "f1.duckdb"
+    dbt_run(parquet_dir, database, tmp_path, full_refresh=True)
+    connection = duckdb.connect(str(database), read_only=True)
+    try:
+        rows = connection.execute("SELECT raceid, name, second_name, median_lap_ms, lap_advantage_ms "
+                                  "FROM f1_data_all.f1_race_pace_mart").fetchall()
+        season_years = connection.execute("SELECT year FROM f1_data_all.f1_season_pace_mart").fetchall()
+    finally:
+        connection.close()
+
+    expected = get_race_pace(parquet_dir)
+    assert len(expected) > 10
+    assert {row[0]: tuple(row[1:]) for row in rows} == expected
+    race_years = {row["raceId"]: row["year"] for row in read_rows(parquet_dir, "races", ["raceId", "year"])}
+    assert {year for (year,) in season_years} == {race_years[race_id] for race_id in expected}
+
+
+def test_incremental_run_after_a_lap_correction_equals_full_refresh(parquet_dir, tmp_path):
+    incremental_db, full_db = tmp_path / "incremental.duckdb", tmp_path / "full.duckdb"
+    dbt_run(parquet_dir, incremental_db, tmp_path, full_refresh=True)
+    before = read_models(incremental_db)
+
+    # The new release corrects the lap times of the last season
+    races = pq.read_table(parquet_dir / "races.parquet", columns=["raceId", "year"])
+    last_season = races.filter(pc.equal(races.column("year"), pc.max(races.column("year")))).column("raceId")
+    path = parquet_dir / "lap_times.parquet"
+    laps = pq.read_table(path)
+    corrected = pc.if_else(pc.is_in(laps.column("raceId"), value_set=last_season),
+                           pc.multiply(laps.column("milliseconds"), laps.column("driverId")),
+                           laps.column("milliseconds")).cast(laps.schema.field("milliseconds").type)
+    pq.write_table(laps.set_column(laps.schema.get_field_index("milliseconds"), "milliseconds", corrected), path)
+
+    dbt_run(parquet_dir, incremental_db, tmp_path)
+    dbt_run(parquet_dir, full_db, tmp_path, full_refresh=True)
+    incremental, full = read_models(incremental_db), read_models(full_db)
+    for model in MODELS:
+        assert incremental[model] == full[model], model
+    assert incremental["f1_race_pace_mart"] != before["f1_race_pace_mart"]
@@ -0,0 +1,96 @@
+"""
+Tests of the stage metrics: measure_stage, the sinks of emit_metrics and the per-run summary
+"""
+import json
+import logging
+import itertools
+
+import pytest
+
+import pipeline_metrics
+from pipeline_metrics import emit_metrics, measure_stage, summarize_metrics
+
+SINK_METRICS = []
+
+
+def collect(metrics):
+    """Custom sink of the tests"""
+    SINK_METRICS.append(metrics)
+
+
+class TaskInstance:
+    def __init__(self):
+        self.xcom = {}
+
+    def xcom_push(self, key, value):
+        self.xcom[key] = value
+
+
+@pytest.fixture(autouse=True)
+def log_sink(monkeypatch):
+    monkeypatch.setattr(pipeline_metrics, "METRICS_SINK", "log")
+    SINK_METRICS.clear()
+
+
+def test_stage_metrics_are_measured_and_pushed(monkeypatch):
+    # Peak RSS of the process before and after the stage
+    peaks = iter([300.0, 364.25])
+    monkeypatch.setattr(pipeline_metrics, "get_peak_rss_mb", lambda: next(peaks))
+    # 2 s between the start and the end of the stage
+    clock = itertools.count(10.0, 2.0)
+    monkeypatch.setattr(pipeline_metrics.time, "perf_counter", lambda: next(clock))
+    ti = TaskInstance()
+    with measure_stage("convert", "results", ti) as metrics:
+        metrics.update(rows=1000, input_bytes=4 * 1024 * 1024, output_bytes=1024 * 1024)
+
+    assert ti.xcom["metrics"] is metrics
+    assert metrics["error"] is None
+    assert metrics["compression_ratio"] == 4.0
+    assert metrics["wall_seconds"] == 2.0
+    # Of the output bytes, the input of a stage that writes nothing
+    assert metrics["throughput_mb_s"] == 0.5
+    assert metrics["process_peak_rss_mb"] == 364.2
+    assert metrics["peak_rss_growth_mb"] == 64.2
+
+
+def test_failed_stage_still_emits_its_metrics(caplog):
+    ti = TaskInstance()
+    caplog.set_level(logging.INFO)
+    with pytest.raises(OSError, match="disk full"):
+        with measure_stage("upload", "lap_times", ti) as metrics:
+            metrics["input_bytes"] = 1024
+            raise OSError("disk full")
+
+    assert ti.xcom["metrics"]["error"] == "OSError: disk full"
+    assert ti.xcom["metrics"]["input_bytes"] == 1024 and "wall_seconds" in ti.xcom["metrics"]
+    emitted = [json.loads(record.getMessage().split(": ", 1)[1]) for record in caplog.records
+               if record.getMessage().startswith("Stage metrics")]
+    assert emitted == [ti.xcom["metrics"]]
+
+
+def test_metrics_are_sent_to_a_custom_sink(monkeypatch):
+    monkeypatch.setattr(pipeline_metrics, "METRICS_SINK", f"{__name__}.collect")
+    with measure_stage("download", "dataset") as metrics:
+        metrics["output_bytes"] = 10
+    assert SINK_METRICS == [metrics]
+    emit_metrics({"stage": "convert"}, sink="log")
+    assert len(SINK_METRICS) == 1
+
+
+def test_summary_totals_every_stage_type():
+    stages = [
+        {"stage": "convert", "table": "results", "wall_seconds": 1.5, "cpu_seconds": 1.0, "rows": 100,
+         "input_bytes": 400, "output_bytes": 100, "error": None},
+        {"stage": "convert", "table": "lap_times", "wall_seconds": 2.5, "cpu_seconds": 2.0, "rows": None,
+         "input_bytes": 800, "output_bytes": None, "error": "ValueError: bad row"},
+        {"stage": "upload", "table": "results", "wall_seconds": 0.5, "cpu_seconds": 0.1, "rows": None,
+         "input_bytes": None, "output_bytes": 100},
+    ]
+    summary = summarize_metrics(stages)
+    assert summary["stages"] is stages
+    assert summary["totals"] == {
+        "convert": {"tables": 2, "failed": 1, "wall_seconds": 4.0, "cpu_seconds": 3.0, "rows": 100,
+                    "input_bytes": 1200, "output_bytes": 100},
+        "upload": {"tables": 1, "failed": 0, "wall_seconds": 0.5, "cpu_seconds": 0.1, "rows": 0,
+                   "input_bytes": 0, "output_bytes": 100},
+    }
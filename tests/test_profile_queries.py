@@ -0,0 +1,94 @@
+"""
+Tests of scripts/profile_queries.py on DuckDB: the models are compiled with the Parquet path given to the script,
+and a model scanning more bytes than at the last profiled commit fails the run
+"""
+import os
+import sys
+import json
+import shutil
+import subprocess
+
+import pytest
+
+pytest.importorskip("airflow.providers.google")
+pytest.importorskip("dbt.adapters.duckdb")
+pytest.importorskip("duckdb")
+
+from conftest import ROOT_DIR  # noqa: E402
+from f1_tables import TABLES  # noqa: E402
+from generate_f1db import generate  # noqa: E402
+from profile_queries import find_growth  # noqa: E402
+from data_ingestion_gcs_dag import format_to_parquet  # noqa: E402
+
+PROFILE_SCRIPT = os.path.join(ROOT_DIR, 'airflow', 'scripts', 'profile_queries.py')
+MODELS = ["f1_stage", "f1_mart"]
+SOURCE_TABLES = ["constructor_results", "races", "constructors"]
+
+if shutil.which("dbt") is None:
+    pytest.skip("dbt is not installed", allow_module_level=True)
+
+
+@pytest.fixture(scope="module")
+def work_dir(tmp_path_factory):
+    """
+    :return: folder with the Parquet files under sources/ and the DuckDB database f1.duckdb built from them
+    """
+    work_dir = tmp_path_factory.mktemp("profile")
+    zip_path = str(work_dir / "f1db_csv.zip")
+    generate(zip_path, scale=0.05)
+    for table in TABLES:
+        if table["name"] in SOURCE_TABLES:
+            format_to_parquet(zip_path, str(work_dir / "sources" / f"{table['name']}.parquet"),
+                              member=table["member"], schema=table["schema"])
+    env = dict(os.environ, F1_PARQUET_PATH=str(work_dir / "sources"), F1_DUCKDB_PATH=str(work_dir / "f1.duckdb"),
+               DBT_SEND_ANONYMOUS_USAGE_STATS="false")
+    subprocess.run(["dbt", "run", "--profiles-dir", "local", "--select", *MODELS,
+                    "--target-path", str(work_dir / "target"), "--log-path", str(work_dir / "logs")],
+                   cwd=ROOT_DIR, env=env, check=True, capture_output=True)
+    return work_dir
+
+
+def profile(work_dir, profile_file):
+    """
+    Runs the script from work_dir with the Parquet path and the database relative to it,
+    the Parquet folder is not the default parquet/ of the dbt sources
+    """
+    env = dict(os.environ, DBT_SEND_ANONYMOUS_USAGE_STATS="false")
+    env.pop("F1_PARQUET_PATH", None)
+    env.pop("F1_DUCKDB_PATH", None)
+    return subprocess.run([sys.executable, PROFILE_SCRIPT, "--engine", "duckdb", "--select", *MODELS,
+                           "--parquet-path", "sources", "--database", "f1.duckdb", "--repeat", "1",
+                           "--profile-file", str(profile_file)],
+                          cwd=work_dir, env=env, capture_output=True, text=True)
+
+
+def test_models_are_compiled_with_the_given_parquet_path(work_dir, tmp_path):
+    profile_file = tmp_path / "query_profile.json"
+    process = profile(work_dir, profile_file)
+    assert process.returncode == 0, process.stdout + process.stderr
+
+    models = json.loads(profile_file.read_text())["duckdb"][-1]["models"]
+    # The scans of the Parquet files under work_dir/sources are estimated, so the sources pointed at them
+    assert models["f1_stage"]["estimated_bytes"] > 0
+    assert models["fact_table"]["estimated_bytes"] > 0
+    assert all(metrics["latency_seconds"] is not None for metrics in models.values())
+
+
+def test_bytes_growth_past_the_threshold_fails_the_run(work_dir, tmp_path):
+    profile_file = tmp_path / "query_profile.json"
+    profile_file.write_text(json.dumps({"duckdb": [
+        {"commit": "0000000", "models": {"f1_stage": {"estimated_bytes": 1}}},
+    ]}))
+    process = profile(work_dir, profile_file)
+    assert process.returncode == 1
+    assert "f1_stage estimated_bytes grew past 20% since 0000000" in process.stdout
+    # The profile of the current commit is saved all the same
+    assert len(json.loads(profile_file.read_text())["duckdb"]) == 2
+
+
+def test_growth_is_flagged_per_metric():
+    previous = {"f1_stage": {"estimated_bytes": 1000, "actual_bytes": 1000}, "f1_mart": {"estimated_bytes": 100}}
+    current = {"f1_stage": {"estimated_bytes": 1100, "actual_bytes": 1300}, "f1_mart": {"estimated_bytes": 150},
+               "fact_table": {"estimated_bytes": 10 ** 9}}
+    assert find_growth(current, previous, 0.2) == [("f1_stage", "actual_bytes", 1000, 1300),
+                                                  ("f1_mart", "estimated_bytes", 100, 150)]
@@ -0,0 +1,129 @@
+"""
+Tests of the release diff (RELEASE_DIFF=true): diff_tables on in-memory releases, the key and row hash reads
+of the Parquet releases, and diff_release against fake GCS (see the gcs_bucket fixture)
+"""
+import io
+
+import pytest
+
+pa = pytest.importorskip("pyarrow")
+pytest.importorskip("duckdb")
+import pyarrow.parquet as pq  # noqa: E402
+
+from release_diff import (DELTAS_PREFIX, diff_tables, get_changed_keys, read_row_hashes,  # noqa: E402
+                          read_rows)
+
+KEY = ["resultId"]
+
+
+def make_table(rows):
+    """
+    :param rows: (resultId, year, points, status) tuples
+    """
+    names = ["resultId", "year", "points", "status"]
+    types = [pa.int32(), pa.int32(), pa.float64(), pa.string()]
+    return pa.table([pa.array([row[index] for row in rows], type=type_) for index, type_ in enumerate(types)],
+                    names=names)
+
+
+PREVIOUS = make_table([
+    (1, 2020, 25.0, "Finished"),
+    (2, 2020, 18.0, "Finished"),
+    (3, 2020, None, "Engine"),
+    (4, 2021, 15.0, None),
+    (5, 2021, 12.0, "Finished"),
+])
+CURRENT = make_table([
+    (1, 2020, 25.0, "Finished"),     # unchanged
+    (2, 2020, 19.0, "Finished"),     # corrected points
+    (3, 2020, None, "Engine"),       # unchanged with a null on both sides
+    (4, 2021, 15.0, "Finished"),     # null -> value
+    (6, 2021, 10.0, "+1 Lap"),       # inserted, 5 is deleted
+])
+
+
+def test_releases_are_diffed_on_the_key():
+    changes = diff_tables(PREVIOUS, CURRENT, KEY)
+    assert changes["insert"].to_pylist() == [{"resultId": 6, "year": 2021, "points": 10.0, "status": "+1 Lap"}]
+    assert changes["delete"].to_pylist() == [{"resultId": 5, "year": 2021, "points": 12.0, "status": "Finished"}]
+    assert changes["update"].to_pylist() == [
+        {"resultId": 2, "year": 2020, "points": 19.0, "status": "Finished",
+         "year_previous": 2020, "points_previous": 18.0, "status_previous": "Finished"},
+        {"resultId": 4, "year": 2021, "points": 15.0, "status": "Finished",
+         "year_previous": 2021, "points_previous": 15.0, "status_previous": None},
+    ]
+
+
+def test_value_to_null_is_an_update():
+    current = make_table([(1, 2020, None, "Finished")])
+    changes = diff_tables(make_table([(1, 2020, 25.0, "Finished")]), current, KEY)
+    assert changes["update"].column("points_previous").to_pylist() == [25.0]
+    assert changes["insert"].num_rows == changes["delete"].num_rows == 0
+
+
+def test_unchanged_release_has_no_changes():
+    changes = diff_tables(PREVIOUS, PREVIOUS.select(["status", "points", "year", "resultId"]), KEY)
+    assert all(rows.num_rows == 0 for rows in changes.values())
+
+
+@pytest.mark.parametrize("previous, current", [
+    (PREVIOUS, pa.concat_tables([CURRENT, CURRENT.slice(1, 1)])),
+    (pa.concat_tables([PREVIOUS, PREVIOUS.slice(0, 1)]), CURRENT),
+], ids=["current", "previous"])
+def test_duplicated_keys_are_rejected(previous, current):
+    with pytest.raises(ValueError, match="1 key values"):
+        diff_tables(previous, current, KEY)
+
+
+@pytest.mark.parametrize("partitioned", [False, True], ids=["file", "partitioned"])
+def test_only_the_changed_rows_are_read(tmp_path, partitioned):
+    paths = {}
+    for name, table in (("previous", PREVIOUS), ("current", CURRENT)):
+        if partitioned:
+            paths[name] = str(tmp_path / name)
+            pq.write_to_dataset(table, paths[name], partition_cols=["year"])
+        else:
+            paths[name] = str(tmp_path / f"{name}.parquet")
+            pq.write_table(table, paths[name])
+
+    previous_keys, current_keys = get_changed_keys(read_row_hashes(paths["previous"], KEY),
+                                                   read_row_hashes(paths["current"], KEY), KEY)
+    assert sorted(previous_keys.column("resultId").to_pylist()) == [2, 4, 5]
+    assert sorted(current_keys.column("resultId").to_pylist()) == [2, 4, 6]
+    previous, current = read_rows(paths["previous"], previous_keys), read_rows(paths["current"], current_keys)
+    assert previous.num_rows == current.num_rows == 3
+
+    changes = diff_tables(previous, current, KEY)
+    expected = diff_tables(PREVIOUS, CURRENT, KEY)
+    for change_type, rows in changes.items():
+        # The hive partition column is read back as its own type
+        assert rows.select(KEY + ["points", "status"]).equals(expected[change_type].select(KEY + ["points", "status"]))
+
+
+def test_release_change_sets_are_uploaded(gcs_bucket, tmp_path):
+    from gcs_uploader import get_storage_client, upload_file
+    from release_diff import diff_release
+
+    pq.write_table(PREVIOUS, tmp_path / "previous.parquet")
+    upload_file(gcs_bucket, "raw/results.parquet", str(tmp_path / "previous.parquet"))
+    pq.write_table(CURRENT, tmp_path / "results.parquet")
+
+    summary = diff_release(gcs_bucket, "raw/results.parquet", str(tmp_path / "results.parquet"), "results", KEY,
+                           release="20240101T000000")
+    assert {key: summary[key] for key in ("rows", "insert", "update", "delete")} == \
+        {"rows": 5, "insert": 1, "update": 2, "delete": 1}
+    bucket = get_storage_client().bucket(gcs_bucket)
+    prefix = f"{DELTAS_PREFIX}/results/release=20240101T000000"
+    deleted = pq.read_table(io.BytesIO(bucket.blob(f"{prefix}/delete.parquet").download_as_bytes()))
+    assert deleted.column("resultId").to_pylist() == [5]
+
+
+def test_release_with_duplicated_keys_is_not_diffed(gcs_bucket, tmp_path):
+    from gcs_uploader import upload_file
+    from release_diff import diff_release
+
+    pq.write_table(PREVIOUS, tmp_path / "previous.parquet")
+    upload_file(gcs_bucket, "raw/results.parquet", str(tmp_path / "previous.parquet"))
+    pq.write_table(pa.concat_tables([CURRENT, CURRENT.slice(0, 1)]), tmp_path / "results.parquet")
+    assert diff_release(gcs_bucket, "raw/results.parquet", str(tmp_path / "results.parquet"), "results", KEY,
+                        release="20240101T000000") is None
@@ -0,0 +1,103 @@
+"""
+Tests of the task history the DAG reads its priorities from when it is parsed: the Variable and its local copy
+"""
+import os
+import json
+import time
+
+import pytest
+
+airflow_models = pytest.importorskip("airflow.models")
+
+import scheduling  # noqa: E402
+from scheduling import read_cached_history, save_history  # noqa: E402
+
+
+@pytest.fixture
+def variables(monkeypatch):
+    """
+    :return: Airflow Variables set by the test, without a metadata database
+    """
+    variables = {}
+
+    def get(key, default_var=None, deserialize_json=False):
+        if key not in variables:
+            raise KeyError(f"Variable {key} does not exist")
+        return variables[key]
+
+    monkeypatch.setattr(airflow_models.Variable, "set",
+                        lambda key, value, serialize_json=False: variables.__setitem__(key, value))
+    monkeypatch.setattr(airflow_models.Variable, "get", get)
+    return variables
+
+
+def make_stale(path):
+    stale = time.time() - 2 * scheduling.HISTORY_CACHE_SECONDS
+    os.utime(path, (stale, stale))
+
+
+def test_history_is_saved_in_the_variable_only(variables, tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    history = {"local_to_gcs_lap_times": {"duration": 123.456, "input_bytes": 1000}}
+    save_history(history)
+    assert variables["f1_task_history"] == history
+    assert os.listdir(tmp_path) == []
+
+
+def test_history_is_cached_with_rounded_durations(variables, tmp_path):
+    path = str(tmp_path / "cache" / "history.json")
+    save_history({"local_to_gcs_lap_times": {"duration": 123.456, "input_bytes": 1000},
+                  "format_to_parquet_races": {"duration": 0.734}})
+    expected = {"local_to_gcs_lap_times": {"duration": 120.0}, "format_to_parquet_races": {"duration": 0.73}}
+    assert read_cached_history(path) == expected
+    with open(path) as f:
+        assert json.load(f) == expected
+
+
+def test_fresh_cache_is_read_without_the_variable(variables, tmp_path):
+    path = str(tmp_path / "history.json")
+    save_history({"local_to_gcs_lap_times": {"duration": 123.4}})
+    read_cached_history(path)
+    # Read from the file until it is stale
+    save_history({"local_to_gcs_lap_times": {"duration": 150.2}})
+    assert read_cached_history(path) == {"local_to_gcs_lap_times": {"duration": 120.0}}
+    make_stale(path)
+    assert read_cached_history(path) == {"local_to_gcs_lap_times": {"duration": 150.0}}
+
+
+def test_cache_is_kept_while_the_rounded_durations_are_unchanged(variables, tmp_path):
+    path = tmp_path / "history.json"
+    save_history({"local_to_gcs_lap_times": {"duration": 123.4}})
+    read_cached_history(str(path))
+    path.write_text(json.dumps({"local_to_gcs_lap_times": {"duration": 120.0}}, indent=4))
+    make_stale(path)
+    save_history({"local_to_gcs_lap_times": {"duration": 118.9}})
+    read_cached_history(str(path))
+    # Not rewritten, so the serialized DAG doesn't change, but fresh again
+    assert path.read_text() == json.dumps({"local_to_gcs_lap_times": {"duration": 120.0}}, indent=4)
+    assert time.time() - path.stat().st_mtime < scheduling.HISTORY_CACHE_SECONDS
+
+
+def test_stale_cache_is_kept_without_the_variable(variables, tmp_path):
+    path = tmp_path / "history.json"
+    path.write_text(json.dumps({"local_to_gcs_lap_times": {"duration": 120.0}}))
+    make_stale(path)
+    # No run saved the history yet, or the metadata database is unreachable
+    assert read_cached_history(str(path)) == {"local_to_gcs_lap_times": {"duration": 120.0}}
+
+
+def test_missing_or_broken_cache_gives_no_history(variables, tmp_path):
+    assert read_cached_history(str(tmp_path / "missing.json")) == {}
+    (tmp_path / "broken.json").write_text('{"local_to_gcs_lap_times": ')
+    make_stale(tmp_path / "broken.json")
+    assert read_cached_history(str(tmp_path / "broken.json")) == {}
+
+
+def test_read_only_cache_folder_still_gives_the_history(variables, tmp_path, monkeypatch):
+    save_history({"local_to_gcs_lap_times": {"duration": 123.4}})
+
+    def replace(*args):
+        raise PermissionError("Read-only file system")
+
+    monkeypatch.setattr(scheduling.os, "replace", replace)
+    assert read_cached_history(str(tmp_path / "history.json")) == {"local_to_gcs_lap_times": {"duration": 120.0}}
@@ -0,0 +1,130 @@
+"""
+Tests of the change detection of SKIP_UNCHANGED_TABLES: the table fingerprints, the manifest in fake GCS
+(see the gcs_bucket fixture) and the skip of the unchanged tables
+"""
+import os
+import zipfile
+
+import pytest
+
+pytest.importorskip("airflow.providers.google")
+pytest.importorskip("google.cloud.storage")
+
+from airflow.exceptions import AirflowSkipException  # noqa: E402
+
+import data_ingestion_gcs_dag  # noqa: E402
+from generate_f1db import generate  # noqa: E402
+from gcs_uploader import get_storage_client  # noqa: E402
+from data_ingestion_gcs_dag import (format_to_parquet_if_changed, get_table_fingerprints,  # noqa: E402
+                                    read_manifest, skip_if_unchanged, update_manifest)
+
+RACES = next(table for table in data_ingestion_gcs_dag.TABLES if table["name"] == "races")
+LAP_TIMES = next(table for table in data_ingestion_gcs_dag.TABLES if table["name"] == "lap_times")
+
+
+@pytest.fixture(autouse=True)
+def skip_unchanged_tables(monkeypatch):
+    monkeypatch.setattr(data_ingestion_gcs_dag, "skip_unchanged_tables", True)
+    monkeypatch.setattr(data_ingestion_gcs_dag, "hive_partitioning", False)
+
+
+@pytest.fixture
+def zip_path(tmp_path):
+    zip_path = str(tmp_path / "f1db_csv.zip")
+    generate(zip_path, scale=0.05)
+    return zip_path
+
+
+def rewrite_member(zip_path, member, edit):
+    """
+    Rewrites the archive with edit(CSV text) as the content of member
+    """
+    with zipfile.ZipFile(zip_path) as archive:
+        members = {info.filename: archive.read(info) for info in archive.infolist()}
+    members[member] = edit(members[member].decode()).encode()
+    with zipfile.ZipFile(zip_path, "w", zipfile.ZIP_DEFLATED) as archive:
+        for name, data in members.items():
+            archive.writestr(name, data)
+
+
+def upload_object(bucket, object_name):
+    get_storage_client().bucket(bucket).blob(object_name).upload_from_string(b"PAR1")
+
+
+def test_unchanged_member_is_skipped(gcs_bucket, zip_path):
+    update_manifest(gcs_bucket, zip_path)
+    upload_object(gcs_bucket, "raw/races.parquet")
+    assert read_manifest(gcs_bucket) == get_table_fingerprints(zip_path)
+    with pytest.raises(AirflowSkipException):
+        skip_if_unchanged(gcs_bucket, "raw/races.parquet", zip_path, "races.csv")
+
+
+def test_changed_member_is_converted(gcs_bucket, zip_path, tmp_path):
+    update_manifest(gcs_bucket, zip_path)
+    upload_object(gcs_bucket, "raw/races.parquet")
+    # A correction of the last race, the other members are unchanged
+    rewrite_member(zip_path, "races.csv", lambda text: text.rstrip("\n").rsplit("\n", 1)[0] + "\n")
+
+    dest_file = str(tmp_path / "races.parquet")
+    format_to_parquet_if_changed(None, dest_file, gcs_bucket, "raw/races.parquet", zip_path, "races.csv",
+                                 schema=RACES["schema"])
+    assert os.path.exists(dest_file)
+    # The other members of the rewritten archive are still skipped
+    upload_object(gcs_bucket, "raw/results.parquet")
+    with pytest.raises(AirflowSkipException):
+        skip_if_unchanged(gcs_bucket, "raw/results.parquet", zip_path, "results.csv")
+
+
+@pytest.mark.parametrize("change", ["schema", "partitioning", "compression", "load_mode"])
+def test_conversion_change_reconverts_the_same_bytes(gcs_bucket, zip_path, monkeypatch, change):
+    update_manifest(gcs_bucket, zip_path)
+    upload_object(gcs_bucket, "raw/lap_times.parquet")
+    upload_object(gcs_bucket, "raw/lap_times/year=2020/part-0.parquet")
+    if change == "schema":
+        tables = [dict(table, schema=dict(table["schema"], milliseconds="int64")) if table is LAP_TIMES else table
+                  for table in data_ingestion_gcs_dag.TABLES]
+        monkeypatch.setattr(data_ingestion_gcs_dag, "TABLES", tables)
+    elif change == "partitioning":
+        monkeypatch.setattr(data_ingestion_gcs_dag, "hive_partitioning", True)
+    elif change == "compression":
+        monkeypatch.setattr(data_ingestion_gcs_dag, "PARQUET_COMPRESSION", "snappy")
+    else:
+        monkeypatch.setattr(data_ingestion_gcs_dag, "bigquery_load_mode", "native")
+
+    object_name = "raw/lap_times" if change == "partitioning" else "raw/lap_times.parquet"
+    # Not raised: the CSV is the same, but it is written or loaded differently
+    skip_if_unchanged(gcs_bucket, object_name, zip_path, "lap_times.csv")
+
+
+def test_member_without_its_object_is_not_skipped(gcs_bucket, zip_path):
+    update_manifest(gcs_bucket, zip_path)
+    # The manifest lists races, but its object was deleted from the bucket
+    skip_if_unchanged(gcs_bucket, "raw/races.parquet", zip_path, "races.csv")
+
+
+def test_failed_table_task_keeps_the_manifest(gcs_bucket, zip_path, tmp_path, monkeypatch):
+    update_manifest(gcs_bucket, zip_path)
+    manifest = read_manifest(gcs_bucket)
+    upload_object(gcs_bucket, "raw/races.parquet")
+    rewrite_member(zip_path, "races.csv", lambda text: text.rstrip("\n").rsplit("\n", 1)[0] + "\n")
+
+    def convert_table(*args, **kwargs):
+        raise OSError("No space left on device")
+
+    monkeypatch.setattr(data_ingestion_gcs_dag, "convert_table", convert_table)
+    with pytest.raises(OSError):
+        format_to_parquet_if_changed(None, str(tmp_path / "races.parquet"), gcs_bucket, "raw/races.parquet",
+                                     zip_path, "races.csv", schema=RACES["schema"])
+    assert read_manifest(gcs_bucket) == manifest
+    # The next run converts the table again
+    skip_if_unchanged(gcs_bucket, "raw/races.parquet", zip_path, "races.csv")
+
+
+def test_manifest_is_updated_only_without_failed_table_tasks():
+    dag = data_ingestion_gcs_dag.dag
+    if not hasattr(dag, "get_task"):
+        pytest.skip("needs the Airflow DAG model")
+    task = dag.get_task("update_tables_manifest")
+    # A failed table task leaves the manifest upstream_failed, skipped tables don't
+    assert task.trigger_rule == "none_failed"
+    assert set(data_ingestion_gcs_dag.table_task_ids) <= task.get_flat_relative_ids(upstream=True)